@@ -49,6 +49,37 @@ const Dashboard = ({ currentUser, allowDemoMode = true }) => {
     fetchDashboardData();
   }, [fetchDashboardData]);
 
+  // Load the next page of recent events when the activity table is scrolled to the bottom
+  const [loadingMoreEvents, setLoadingMoreEvents] = useState(false);
+  const nextEventsCursor = dashboardData?.events?.next_cursor;
+
+  const loadMoreEvents = useCallback(async () => {
+    if (!nextEventsCursor || loadingMoreEvents) return;
+
+    try {
+      setLoadingMoreEvents(true);
+      const page = await dataService.getEvents(currentUser.package, 50, nextEventsCursor);
+      setDashboardData((previous) => ({
+        ...previous,
+        events: {
+          ...page,
+          events: [...(previous?.events?.events || []), ...page.events],
+        },
+      }));
+    } catch (err) {
+      console.error("❌ Error loading more events:", err);
+    } finally {
+      setLoadingMoreEvents(false);
+    }
+  }, [currentUser.package, nextEventsCursor, loadingMoreEvents]);
+
+  const handleActivityScroll = (e) => {
+    const { scrollTop, scrollHeight, clientHeight } = e.currentTarget;
+    if (scrollHeight - scrollTop - clientHeight < 40) {
+      loadMoreEvents();
+    }
+  };
+
   useEffect(() => {
     // When switching to a user without demo mode access, force live mode
     if (!allowDemoMode && isDemoMode) {
@@ -625,7 +656,10 @@ const Dashboard = ({ currentUser, allowDemoMode = true }) => {
                 ? "Latest user interactions and events"
                 : "Real-time events from your app"}
             </p>
-            <div className="overflow-x-auto max-h-64">
+            <div
+              className="overflow-x-auto overflow-y-auto max-h-64"
+              onScroll={handleActivityScroll}
+            >
               {(() => {
                 const recentEvents = dashboardData?.events?.events;
 
@@ -651,7 +685,7 @@ const Dashboard = ({ currentUser, allowDemoMode = true }) => {
                       </tr>
                     </thead>
                     <tbody className="bg-white divide-y divide-gray-200">
-                      {recentEvents.slice(0, 8).map((event, index) => (
+                      {recentEvents.map((event, index) => (
                         <tr
                           key={event._id || index}
                           className="hover:bg-gray-50 cursor-pointer"
@@ -674,6 +708,13 @@ const Dashboard = ({ currentUser, allowDemoMode = true }) => {
                           </td>
                         </tr>
                       ))}
+                      {loadingMoreEvents && (
+                        <tr>
+                          <td colSpan={5} className="px-3 py-2 text-sm text-gray-400 text-center">
+                            Loading more events...
+                          </td>
+                        </tr>
+                      )}
                     </tbody>
                   </table>
                 ) : (
@@ -53,11 +53,11 @@ export const analyticsAPI = {
 
   // ===== EVENTS API =====
   
-  // Get events for a specific package
-  async getEvents(packageName, limit = 100) {
+  // Get events for a specific package (pass the previous page's next_cursor to get the next page)
+  async getEvents(packageName, limit = 100, cursor = null) {
     try {
       const response = await apiClient.get(`/analytics/events/${packageName}`, {
-        params: { limit }
+        params: cursor ? { limit, cursor } : { limit }
       });
       return response.data;
     } catch (error) {
@@ -78,10 +78,10 @@ export const analyticsAPI = {
   // ===== USERS API =====
   
   // Get users for a specific package
-  async getUsers(packageName, limit = 100) {
+  async getUsers(packageName, limit = 100, cursor = null) {
     try {
       const response = await apiClient.get(`/analytics/users/${packageName}`, {
-        params: { limit }
+        params: cursor ? { limit, cursor } : { limit }
       });
       return response.data;
     } catch (error) {
@@ -102,10 +102,10 @@ export const analyticsAPI = {
   // ===== SESSIONS API =====
   
   // Get sessions for a specific package
-  async getSessions(packageName, limit = 100) {
+  async getSessions(packageName, limit = 100, cursor = null) {
     try {
       const response = await apiClient.get(`/analytics/sessions/${packageName}`, {
-        params: { limit }
+        params: cursor ? { limit, cursor } : { limit }
       });
       return response.data;
     } catch (error) {
@@ -126,10 +126,10 @@ export const analyticsAPI = {
   // ===== CRASHES API =====
   
   // Get crash reports for a specific package
-  async getCrashes(packageName, limit = 50) {
+  async getCrashes(packageName, limit = 50, cursor = null) {
     try {
       const response = await apiClient.get(`/analytics/crashes/${packageName}`, {
-        params: { limit }
+        params: cursor ? { limit, cursor } : { limit }
       });
       return response.data;
     } catch (error) {
@@ -147,6 +147,20 @@ export const analyticsAPI = {
     }
   },
 
+  // ===== DASHBOARD API =====
+
+  // Get every dashboard section in one request (optionally only some sections)
+  async getDashboard(packageName, sections = null) {
+    try {
+      const response = await apiClient.get(`/analytics/dashboard/${packageName}`, {
+        params: sections ? { sections: sections.join(',') } : {}
+      });
+      return response.data;
+    } catch (error) {
+      throw new Error(`Failed to fetch dashboard: ${error.message}`);
+    }
+  },
+
   // ===== UTILITY METHODS =====
 
 // Get all packages from the backend
@@ -55,12 +55,12 @@ class DataService {
   }
 
   /**
-   * Get recent events
+   * Get recent events (pass the previous page's next_cursor for the next page)
    */
-  async getEvents(packageName, limit = 100) {
+  async getEvents(packageName, limit = 100, cursor = null) {
     try {
       const service = this.getCurrentService();
-      const result = await service.getEvents(packageName, limit);
+      const result = await service.getEvents(packageName, limit, cursor);
       
       return {
         ...result,
@@ -210,6 +210,30 @@ async getCrashReports(packageName) {
     try {
       console.log(`📊 Fetching dashboard data in ${this.isDemoMode ? 'DEMO' : 'LIVE'} mode...`);
       
+      const metadata = {
+        mode: this.isDemoMode ? 'demo' : 'live',
+        package: packageName,
+        loadedAt: new Date().toISOString()
+      };
+
+      if (!this.isDemoMode) {
+        // One request - the backend computes every section concurrently
+        const dashboard = await analyticsAPI.getDashboard(packageName);
+        if (dashboard.errors) {
+          // Failed sections fall back to their own endpoints (which have error placeholders)
+          console.warn('⚠️ Some dashboard sections failed:', dashboard.errors);
+        }
+
+        return {
+          eventStats: dashboard.event_stats ?? await this.getEventStats(packageName),
+          events: dashboard.events ?? await this.getEvents(packageName, 50),
+          userStats: dashboard.user_stats ?? await this.getUserStats(packageName),
+          sessionStats: dashboard.session_stats ?? await this.getSessionStats(packageName),
+          crashReports: dashboard.crash_stats ?? await this.getCrashReports(packageName),
+          metadata: { ...metadata, timings: dashboard.timings_ms }
+        };
+      }
+
       // Fetch all data in parallel
       const [eventStats, events, userStats, sessionStats, crashReports] = await Promise.all([
         this.getEventStats(packageName),
@@ -225,11 +249,7 @@ async getCrashReports(packageName) {
         userStats,
         sessionStats,
         crashReports,
-        metadata: {
-          mode: this.isDemoMode ? 'demo' : 'live',
-          package: packageName,
-          loadedAt: new Date().toISOString()
-        }
+        metadata
       };
     } catch (error) {
       console.error(`❌ Error fetching dashboard data:`, error);
@@ -46,7 +46,7 @@ export const mockDataService = {
   /**
    * Get mock recent events
    */
-  async getEvents(packageName, limit = 100) {
+  async getEvents(packageName, limit = 100, cursor = null) {
     await simulateDelay();
 
     const eventTypes = [
@@ -164,6 +164,8 @@ export const mockDataService = {
       package_name: packageName,
       events: events,
       count: events.length,
+      next_cursor: null,
+      has_more: false,
     };
   },
 
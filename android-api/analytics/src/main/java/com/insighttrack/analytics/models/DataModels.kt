@@ -1,7 +1,12 @@
 package com.insighttrack.analytics.models
 
+import java.util.UUID
+
 /**
  * Data class for sending events to the API
+ *
+ * request_id is generated once and stored with the offline copy, so every
+ * retry of the same event sends the same idempotency key in batches.
  */
 data class EventRequest(
     val package_name: String,
@@ -10,7 +15,8 @@ data class EventRequest(
     val session_id: String?,
     val timestamp: Long,
     val properties: Map<String, Any> = emptyMap(),
-    val device_info: Map<String, String> = emptyMap()
+    val device_info: Map<String, String> = emptyMap(),
+    val request_id: String? = UUID.randomUUID().toString() // null only for items stored by older SDK versions
 )
 
 /**
@@ -45,6 +51,8 @@ data class UserRegistrationResponse(
 
 /**
  * Data class for session tracking requests
+ *
+ * request_id works like EventRequest.request_id.
  */
 data class SessionRequest(
     val package_name: String,
@@ -52,7 +60,8 @@ data class SessionRequest(
     val action: String, // "start" or "end"
     val user_id: String?,
     val timestamp: Long,
-    val device_info: Map<String, String> = emptyMap()
+    val device_info: Map<String, String> = emptyMap(),
+    val request_id: String? = UUID.randomUUID().toString() // null only for items stored by older SDK versions
 )
 
 /**
@@ -89,6 +98,43 @@ data class CrashResponse(
     val count: Int? = null // How many times this crash has occurred
 )
 
+/**
+ * A single item in a batch request
+ */
+data class BatchItem(
+    val type: String, // "event", "session" or "crash"
+    val data: Any,
+    val id: String? = null // Idempotency key: a replayed item is reported as "duplicate" instead of stored twice
+)
+
+/**
+ * Data class for batch ingestion requests (mixed events, sessions and crashes)
+ */
+data class BatchRequest(
+    val items: List<BatchItem>
+)
+
+/**
+ * Result for one item of a batch request
+ */
+data class BatchItemResult(
+    val index: Int,
+    val type: String?,
+    val status: String, // "ok", "duplicate" (already stored by an earlier attempt) or "error"
+    val error: String? = null,
+    val retryable: Boolean = false
+)
+
+/**
+ * Data class for batch ingestion responses
+ */
+data class BatchResponse(
+    val message: String,
+    val accepted: Int,
+    val failed: Int,
+    val results: List<BatchItemResult> = emptyList()
+)
+
 /**
  * Generic API response wrapper
  */
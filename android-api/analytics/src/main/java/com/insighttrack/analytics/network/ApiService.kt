@@ -1,5 +1,7 @@
 package com.insighttrack.analytics.network
 
+import com.insighttrack.analytics.models.BatchRequest
+import com.insighttrack.analytics.models.BatchResponse
 import com.insighttrack.analytics.models.CrashRequest
 import com.insighttrack.analytics.models.CrashResponse
 import com.insighttrack.analytics.models.EventRequest
@@ -49,6 +51,12 @@ interface ApiService {
     @POST("analytics/crashes")
     fun sendCrash(@Body crashRequest: CrashRequest): Call<CrashResponse>
 
+    /**
+     * Send a mixed batch of events, sessions and crashes in one request
+     */
+    @POST("analytics/batch")
+    fun sendBatch(@Body batchRequest: BatchRequest): Call<BatchResponse>
+
     /**
      * Health check endpoint to test if API is working
      */
@@ -1,6 +1,9 @@
 package com.insighttrack.analytics.network
 
 import android.content.Context
+import com.insighttrack.analytics.models.BatchItem
+import com.insighttrack.analytics.models.BatchRequest
+import com.insighttrack.analytics.models.BatchResponse
 import com.insighttrack.analytics.models.CrashRequest
 import com.insighttrack.analytics.models.CrashResponse
 import com.insighttrack.analytics.models.EventRequest
@@ -73,50 +76,101 @@ class NetworkManager(private val context: Context, private val baseUrl: String)
 
     /**
      * Send any events and sessions that were stored offline
+     *
+     * Pending items are sent together through the batch endpoint, so draining
+     * the queue costs one request per batch instead of one per item.
      */
     private fun sendPendingEvents() {
-        // Send pending events
         val pendingEvents = offlineStorage.getPendingEvents()
-        if (pendingEvents.isNotEmpty()) {
-            println("📤 Found ${pendingEvents.size} pending offline events, attempting to send...")
+        val pendingSessions = offlineStorage.getPendingSessions()
+
+        if (pendingEvents.isEmpty() && pendingSessions.isEmpty()) {
+            println("📭 No pending data to send")
+            return
+        }
+
+        println("📤 Found ${pendingEvents.size} pending offline events and ${pendingSessions.size} pending offline sessions, attempting to send...")
+
+        val pendingItems: List<Any> = pendingSessions + pendingEvents
+        pendingItems.chunked(MAX_BATCH_SIZE).forEach { chunk ->
+            sendPendingBatch(chunk)
+        }
+    }
 
-            pendingEvents.forEach { event ->
-                sendEventDirect(event, object : EventCallback<EventResponse> {
+    /**
+     * Send one chunk of pending items as a single batch request
+     *
+     * Each item carries its stored request_id, so if this batch was already
+     * stored (e.g. the response was lost) the server reports its items as
+     * "duplicate" instead of inserting them again.
+     */
+    private fun sendPendingBatch(chunk: List<Any>) {
+        val items = chunk.map { item ->
+            when (item) {
+                is EventRequest -> BatchItem("event", item, item.request_id)
+                else -> BatchItem("session", item, (item as SessionRequest).request_id)
+            }
+        }
+
+        val call = apiService.sendBatch(BatchRequest(items))
+
+        call.enqueue(object : Callback<BatchResponse> {
+            override fun onResponse(call: Call<BatchResponse>, response: Response<BatchResponse>) {
+                val batchResponse = response.body()
+
+                if (response.isSuccessful && batchResponse != null) {
+                    // Drop items that were stored, or that would be rejected again on retry
+                    val finishedItems = batchResponse.results
+                        .filter { it.status != "error" || !it.retryable }
+                        .mapNotNull { chunk.getOrNull(it.index) }
+
+                    offlineStorage.removeEvents(finishedItems.filterIsInstance<EventRequest>())
+                    offlineStorage.removeSessions(finishedItems.filterIsInstance<SessionRequest>())
+
+                    println("✅ Sent pending batch: ${batchResponse.accepted} accepted, ${batchResponse.failed} failed")
+                } else if (response.code() == 404) {
+                    // Older backend without the batch endpoint
+                    println("⚠️ Batch endpoint not available - sending pending items one by one")
+                    sendPendingItemsIndividually(chunk)
+                } else {
+                    println("❌ Failed to send pending batch: ${response.code()} ${response.message()} - keeping in storage for later retry")
+                }
+            }
+
+            override fun onFailure(call: Call<BatchResponse>, t: Throwable) {
+                println("❌ Pending batch network error: ${t.message} - keeping in storage for later retry")
+            }
+        })
+    }
+
+    /**
+     * Send pending items with one request each (fallback for servers without batch support)
+     */
+    private fun sendPendingItemsIndividually(chunk: List<Any>) {
+        chunk.forEach { item ->
+            when (item) {
+                is EventRequest -> sendEventDirect(item, object : EventCallback<EventResponse> {
                     override fun onSuccess(data: EventResponse?) {
-                        offlineStorage.removeEvent(event)
-                        println("✅ Sent pending event: ${event.event_type}")
+                        offlineStorage.removeEvent(item)
+                        println("✅ Sent pending event: ${item.event_type}")
                     }
 
                     override fun onError(error: String) {
-                        println("❌ Failed to send pending event: ${event.event_type} - keeping in storage for later retry")
+                        println("❌ Failed to send pending event: ${item.event_type} - keeping in storage for later retry")
                     }
                 })
-            }
-        }
-
-        // Send pending sessions
-        val pendingSessions = offlineStorage.getPendingSessions()
-        if (pendingSessions.isNotEmpty()) {
-            println("📤 Found ${pendingSessions.size} pending offline sessions, attempting to send...")
 
-            pendingSessions.forEach { session ->
-                sendSessionDirect(session, object : EventCallback<SessionResponse> {
+                is SessionRequest -> sendSessionDirect(item, object : EventCallback<SessionResponse> {
                     override fun onSuccess(data: SessionResponse?) {
-                        offlineStorage.removeSession(session)
-                        println("✅ Sent pending session: ${session.action} ${session.session_id}")
+                        offlineStorage.removeSession(item)
+                        println("✅ Sent pending session: ${item.action} ${item.session_id}")
                     }
 
                     override fun onError(error: String) {
-                        println("❌ Failed to send pending session: ${session.action} ${session.session_id} - keeping in storage for later retry")
+                        println("❌ Failed to send pending session: ${item.action} ${item.session_id} - keeping in storage for later retry")
                     }
                 })
             }
-        } else {
-            println("📭 No pending sessions to send")
-        }
-
-        if (pendingEvents.isEmpty() && pendingSessions.isEmpty()) {
-            println("📭 No pending data to send")
         }
     }
 
@@ -379,6 +433,11 @@ class NetworkManager(private val context: Context, private val baseUrl: String)
         println("🔄 Manually triggering retry of pending events...")
         sendPendingEvents()
     }
+
+    companion object {
+        // Maximum number of pending items sent in one batch request
+        private const val MAX_BATCH_SIZE = 100
+    }
 }
 
 /**
@@ -6,6 +6,7 @@ import com.insighttrack.analytics.models.EventRequest
 import com.insighttrack.analytics.models.SessionRequest
 import com.google.gson.Gson
 import com.google.gson.reflect.TypeToken
+import java.util.UUID
 
 /**
  * Offline storage for events AND sessions when network is unavailable
@@ -51,7 +52,17 @@ class OfflineEventStorage(context: Context) {
 
         return try {
             val type = object : TypeToken<List<EventRequest>>() {}.type
-            gson.fromJson(eventsJson, type) ?: emptyList()
+            val events: List<EventRequest> = gson.fromJson(eventsJson, type) ?: emptyList()
+
+            // Events stored by older SDK versions have no request_id: give them one
+            // and save it, so every later retry sends the same key
+            if (events.any { it.request_id == null }) {
+                val keyedEvents = events.map { if (it.request_id == null) it.copy(request_id = UUID.randomUUID().toString()) else it }
+                prefs.edit().putString(eventsKey, gson.toJson(keyedEvents)).apply()
+                keyedEvents
+            } else {
+                events
+            }
         } catch (e: Exception) {
             println("❌ Error reading offline events: ${e.message}")
             emptyList()
@@ -66,7 +77,16 @@ class OfflineEventStorage(context: Context) {
 
         return try {
             val type = object : TypeToken<List<SessionRequest>>() {}.type
-            gson.fromJson(sessionsJson, type) ?: emptyList()
+            val sessions: List<SessionRequest> = gson.fromJson(sessionsJson, type) ?: emptyList()
+
+            // Same backfill as for events
+            if (sessions.any { it.request_id == null }) {
+                val keyedSessions = sessions.map { if (it.request_id == null) it.copy(request_id = UUID.randomUUID().toString()) else it }
+                prefs.edit().putString(sessionsKey, gson.toJson(keyedSessions)).apply()
+                keyedSessions
+            } else {
+                sessions
+            }
         } catch (e: Exception) {
             println("❌ Error reading offline sessions: ${e.message}")
             emptyList()
@@ -94,7 +114,7 @@ class OfflineEventStorage(context: Context) {
      */
     fun removeEvent(event: EventRequest) {
         val events = getPendingEvents().toMutableList()
-        events.removeAll { it.timestamp == event.timestamp && it.event_type == event.event_type }
+        events.removeAll { isSameEvent(it, event) }
 
         val eventsJson = gson.toJson(events)
         prefs.edit().putString(eventsKey, eventsJson).apply()
@@ -107,7 +127,7 @@ class OfflineEventStorage(context: Context) {
      */
     fun removeSession(session: SessionRequest) {
         val sessions = getPendingSessions().toMutableList()
-        sessions.removeAll { it.timestamp == session.timestamp && it.session_id == session.session_id && it.action == session.action }
+        sessions.removeAll { isSameSession(it, session) }
 
         val sessionsJson = gson.toJson(sessions)
         prefs.edit().putString(sessionsKey, sessionsJson).apply()
@@ -115,6 +135,56 @@ class OfflineEventStorage(context: Context) {
         println("✅ Removed sent session: ${session.action} ${session.session_id}")
     }
 
+    /**
+     * Remove several events at once after a successful batch send
+     */
+    fun removeEvents(sentEvents: List<EventRequest>) {
+        if (sentEvents.isEmpty()) return
+
+        val events = getPendingEvents().toMutableList()
+        events.removeAll { event ->
+            sentEvents.any { isSameEvent(it, event) }
+        }
+
+        val eventsJson = gson.toJson(events)
+        prefs.edit().putString(eventsKey, eventsJson).apply()
+
+        println("✅ Removed ${sentEvents.size} sent events")
+    }
+
+    /**
+     * Remove several sessions at once after a successful batch send
+     */
+    fun removeSessions(sentSessions: List<SessionRequest>) {
+        if (sentSessions.isEmpty()) return
+
+        val sessions = getPendingSessions().toMutableList()
+        sessions.removeAll { session ->
+            sentSessions.any { isSameSession(it, session) }
+        }
+
+        val sessionsJson = gson.toJson(sessions)
+        prefs.edit().putString(sessionsKey, sessionsJson).apply()
+
+        println("✅ Removed ${sentSessions.size} sent sessions")
+    }
+
+    /**
+     * Match stored events by request_id, falling back to timestamp and type for keyless ones
+     */
+    private fun isSameEvent(a: EventRequest, b: EventRequest): Boolean {
+        if (a.request_id != null && b.request_id != null) return a.request_id == b.request_id
+        return a.timestamp == b.timestamp && a.event_type == b.event_type
+    }
+
+    /**
+     * Match stored sessions by request_id, falling back to timestamp, session and action for keyless ones
+     */
+    private fun isSameSession(a: SessionRequest, b: SessionRequest): Boolean {
+        if (a.request_id != null && b.request_id != null) return a.request_id == b.request_id
+        return a.timestamp == b.timestamp && a.session_id == b.session_id && a.action == b.action
+    }
+
     /**
      * Get count of pending events
      */
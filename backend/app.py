@@ -5,6 +5,9 @@ import os
 
 # Import route registration
 from routes import register_routes
+from json_provider import FastJSONProvider
+from session_cleanup import session_cleanup_service
+from heavy_hitters import top_event_tracker
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +17,9 @@ def create_app():
     """Application factory pattern for Flask app"""
     app = Flask(__name__)
 
+    # Serialize JSON responses with orjson (falls back to the standard encoder)
+    app.json = FastJSONProvider(app)
+
     # Enable CORS for frontend integration
     CORS(app, origins=["http://localhost:3000", "http://localhost:5173"])
 
@@ -23,6 +29,12 @@ def create_app():
     # Register all routes
     register_routes(app)
 
+    # Start background jobs lazily in the process that serves requests
+    @app.before_request
+    def start_background_jobs():
+        session_cleanup_service.ensure_started()
+        top_event_tracker.ensure_started()
+
     # Basic health check endpoint
     @app.route('/health')
     def health_check():
@@ -37,4 +49,5 @@ app = create_app()
 if __name__ == '__main__':
     print("🚀 Starting Analytics API server...")
     print("📡 API will be available at: http://localhost:5001")
+    print("ℹ️ Development server - in production run: gunicorn -c gunicorn.conf.py app:app")
     app.run(debug=True, host='127.0.0.1', port=5001)  # Added host parameter
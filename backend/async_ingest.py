@@ -0,0 +1,458 @@
+"""
+Async Ingestion Server for Analytics API
+
+An asyncio (ASGI) server for the SDK's write routes - POST /analytics/events,
+/sessions, /users and /crashes - that runs alongside the Flask app, which
+keeps serving the dashboard's read API.
+
+In the Flask app every in-flight ingest request holds a thread while it
+waits on MongoDB, and a user registration holds one for up to 6 s while the
+external geolocation services answer. Here those waits are coroutines on
+one event loop, so a process keeps thousands of device connections open
+with a bounded MongoDB pool (Motor) and a shared HTTP client (httpx).
+
+Requests are validated and stored exactly like the Flask routes: the same
+required fields, timestamp parsing, document builders, rollups, user
+sketches, cohorts and top event types, and the same responses.
+The Flask response cache lives in the Flask processes, so dashboard reads
+pick up ingested data when their cached entries expire
+(STATS_CACHE_TTL_SECONDS).
+
+Configuration (environment):
+    ASYNC_INGEST_HOST / ASYNC_INGEST_PORT   bind address (default 0.0.0.0:5002)
+    ASYNC_INGEST_WORKERS                    server processes (default 1)
+    ASYNC_MONGO_POOL_SIZE                   MongoDB connections per process (default 100)
+    ASYNC_HTTP_MAX_CONNECTIONS              geolocation HTTP connections per process (default 100)
+
+Usage (from the backend directory):
+    python async_ingest.py
+    uvicorn async_ingest:app --port 5002 --workers 4
+"""
+
+import os
+from contextlib import asynccontextmanager
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.server_api import ServerApi
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from dotenv import load_dotenv
+
+# Load environment variables before the shared modules read their settings
+load_dotenv()
+
+from index_manager import get_package_collection_async
+from cohorts import cohort_tracker
+from rollups import RollupAccumulator, write_rollups_async
+from hyperloglog import SketchAccumulator, write_sketches_async
+from heavy_hitters import top_event_tracker
+from ip_geolocation import ip_geo_service
+from geo_enrichment import geo_enrichment_service
+from crash_occurrences import build_occurrence_bucket_upsert
+from controllers.events import build_event_document
+from controllers.sessions import build_session_document, build_session_end_update
+from controllers.crashes import build_crash_upsert, build_crash_occurrence
+from controllers.users import build_location_fields, build_user_update
+from validation_utils import get_missing_fields, convert_timestamp, to_utc_naive
+
+
+class AsyncConnectionHolder:
+    """Per-process Motor client, created when the server starts"""
+    __client = None
+    __db = None
+
+    @staticmethod
+    async def initialize_db():
+        """Connect to MongoDB (same settings as AnalyticsConnectionHolder)"""
+        if AsyncConnectionHolder.__db is None:
+            try:
+                connection_string = os.getenv("DB_CONNECTION_STRING")
+                db_name = os.getenv("DB_NAME", "analytics_api_db")
+
+                if not connection_string:
+                    raise ValueError("DB_CONNECTION_STRING environment variable not set")
+
+                print("🔗 Connecting to MongoDB (async)...")
+
+                client = AsyncIOMotorClient(
+                    connection_string,
+                    server_api=ServerApi('1'),
+                    maxPoolSize=int(os.getenv("ASYNC_MONGO_POOL_SIZE", "100"))
+                )
+                await client.admin.command('ping')
+                print("✅ Successfully connected to MongoDB!")
+
+                AsyncConnectionHolder.__client = client
+                AsyncConnectionHolder.__db = client[db_name]
+
+            except Exception as e:
+                print(f"❌ Database connection error: {e}")
+                AsyncConnectionHolder.__db = None
+
+        return AsyncConnectionHolder.__db
+
+    @staticmethod
+    async def get_db():
+        """Get database instance, initialize if needed"""
+        if AsyncConnectionHolder.__db is None:
+            await AsyncConnectionHolder.initialize_db()
+        return AsyncConnectionHolder.__db
+
+    @staticmethod
+    def close_connection():
+        """Close the Motor client"""
+        if AsyncConnectionHolder.__client is not None:
+            AsyncConnectionHolder.__client.close()
+            AsyncConnectionHolder.__client = None
+            AsyncConnectionHolder.__db = None
+            print("🔒 Database connection closed")
+
+
+# Shared HTTP client for the geolocation services (created at startup)
+http_client = None
+
+
+def create_success_response(message, data=None, status_code=200):
+    """Same body as validation_utils.create_success_response"""
+    response_data = {"message": message}
+    if data:
+        response_data.update(data)
+
+    return JSONResponse(response_data, status_code=status_code)
+
+
+def create_error_response(error_message, status_code=500):
+    """Same body as validation_utils.create_error_response"""
+    return JSONResponse({"error": error_message}, status_code=status_code)
+
+
+async def parse_request(request, required_fields):
+    """
+    Read the JSON payload and apply the Flask routes' validation rules
+
+    Returns:
+        tuple: (data, timestamp, error_response) - error_response is None if valid
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        return None, None, create_error_response("Request body must be valid JSON", 400)
+
+    if not isinstance(data, dict):
+        return None, None, create_error_response("Request body must be a JSON object", 400)
+
+    missing_fields = get_missing_fields(data, required_fields)
+    if missing_fields:
+        return None, None, create_error_response(f"Missing required fields: {', '.join(missing_fields)}", 400)
+
+    try:
+        timestamp = convert_timestamp(data.get('timestamp'))
+    except ValueError as e:
+        return None, None, create_error_response(str(e), 400)
+
+    return data, timestamp, None
+
+
+async def get_connected_db():
+    """Get the database, or the Flask routes' 500 response if it is unavailable"""
+    db = await AsyncConnectionHolder.get_db()
+    if db is None:
+        return None, create_error_response("Could not connect to the database")
+    return db, None
+
+
+async def log_event(request):
+    """Log a new analytics event from SDK"""
+
+    try:
+        db, error_response = await get_connected_db()
+        if error_response:
+            return error_response
+
+        data, timestamp, error_response = await parse_request(request, ['package_name', 'event_type'])
+        if error_response:
+            return error_response
+
+        package_name = data['package_name']
+        event_doc = build_event_document(data, timestamp)
+
+        events_collection = await get_package_collection_async(db, package_name, "events")
+        await events_collection.insert_one(event_doc)
+
+        rollups = RollupAccumulator()
+        rollups.add_event(event_doc['event_type'], timestamp)
+        await write_rollups_async(db, package_name, rollups)
+
+        sketches = SketchAccumulator()
+        sketches.add_event(event_doc['event_type'], event_doc['user_id'], timestamp)
+        await write_sketches_async(db, package_name, sketches)
+        top_event_tracker.record(package_name, [event_doc['event_type']])
+
+        await cohort_tracker.record_activity_async(db, package_name, [(event_doc['user_id'], timestamp)])
+
+        return create_success_response(
+            "Event logged successfully",
+            {
+                "event_id": event_doc['_id'],
+                "timestamp": timestamp.isoformat()
+            },
+            201
+        )
+
+    except Exception as e:
+        return create_error_response(f"Failed to log event: {str(e)}")
+
+
+async def log_session(request):
+    """Log a session start or end event"""
+
+    try:
+        db, error_response = await get_connected_db()
+        if error_response:
+            return error_response
+
+        data, timestamp, error_response = await parse_request(request, ['package_name', 'session_id', 'action'])
+        if error_response:
+            return error_response
+
+        package_name = data['package_name']
+        session_id = data['session_id']
+        action = data['action']
+
+        sessions_collection = await get_package_collection_async(db, package_name, "sessions")
+
+        if action == 'start':
+            session_doc = build_session_document(data, timestamp)
+            await sessions_collection.insert_one(session_doc)
+
+            rollups = RollupAccumulator()
+            rollups.add_session_start(timestamp)
+            await write_rollups_async(db, package_name, rollups)
+            await cohort_tracker.record_activity_async(db, package_name, [(session_doc['user_id'], timestamp)])
+
+            return create_success_response(
+                "Session started successfully",
+                {"session_id": session_id, "action": "started"},
+                201
+            )
+
+        elif action == 'end':
+            # The pre-image keeps the rollups exact, see controllers/sessions.py
+            previous_session = await sessions_collection.find_one_and_update(
+                {"session_id": session_id},
+                build_session_end_update(timestamp),
+                projection={"start_time": 1, "duration_seconds": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+
+            if not previous_session:
+                return create_error_response("Session not found", 404)
+
+            duration_seconds = int((to_utc_naive(timestamp) - previous_session['start_time']).total_seconds())
+
+            rollups = RollupAccumulator()
+            rollups.add_session_end(duration_seconds, previous_session.get('duration_seconds'))
+            await write_rollups_async(db, package_name, rollups)
+
+            return create_success_response(
+                "Session ended successfully",
+                {
+                    "session_id": session_id,
+                    "action": "ended",
+                    "duration_seconds": duration_seconds
+                }
+            )
+
+        else:
+            return create_error_response("Invalid action. Must be 'start' or 'end'", 400)
+
+    except Exception as e:
+        return create_error_response(f"Failed to log session: {str(e)}")
+
+
+async def register_user(request):
+    """Register or update a user in the analytics system"""
+
+    try:
+        db, error_response = await get_connected_db()
+        if error_response:
+            return error_response
+
+        data, timestamp, error_response = await parse_request(request, ['package_name', 'user_id'])
+        if error_response:
+            return error_response
+
+        package_name = data['package_name']
+        user_id = data['user_id']
+        client_country = data.get('country', 'Unknown')
+        client_ip = ip_geo_service.resolve_client_ip(request.headers, request.client.host if request.client else None)
+
+        if geo_enrichment_service.enabled:
+            # Resolved later by the background workers
+            location_fields = geo_enrichment_service.build_pending_location(client_ip, client_country)
+        else:
+            ip_country = await ip_geo_service.get_country_from_ip_async(client_ip, http_client)
+            location_fields = build_location_fields(ip_geo_service.build_location_result(ip_country, client_country))
+
+        users_collection = await get_package_collection_async(db, package_name, "users")
+        user_update = build_user_update(data, timestamp, location_fields)
+
+        try:
+            existing_user = await upsert_user(users_collection, user_id, user_update)
+        except DuplicateKeyError:
+            # A concurrent request created this user first - retrying now updates it
+            existing_user = await upsert_user(users_collection, user_id, user_update)
+
+        await cohort_tracker.record_activity_async(db, package_name, [(user_id, timestamp)])
+
+        if existing_user:
+            return create_success_response(
+                "User updated successfully",
+                {"user_id": user_id, "action": "updated"}
+            )
+
+        if geo_enrichment_service.enabled:
+            geo_enrichment_service.enqueue(package_name, user_id, client_ip, client_country)
+
+        return create_success_response(
+            "User registered successfully",
+            {"user_id": user_id, "action": "created"},
+            201
+        )
+
+    except Exception as e:
+        print(f"❌ Error in user registration: {str(e)}")
+        return create_error_response(f"Failed to register user: {str(e)}")
+
+
+async def upsert_user(users_collection, user_id, user_update):
+    """Apply a user upsert, returning the user as it was before (None if just created)"""
+    return await users_collection.find_one_and_update(
+        {"user_id": user_id},
+        user_update,
+        projection={"_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+
+
+async def log_crash(request):
+    """Log a crash or error report from the app"""
+
+    try:
+        db, error_response = await get_connected_db()
+        if error_response:
+            return error_response
+
+        data, timestamp, error_response = await parse_request(request, ['package_name', 'error_type'])
+        if error_response:
+            return error_response
+
+        package_name = data['package_name']
+        error_type = data['error_type']
+
+        crashes_collection = await get_package_collection_async(db, package_name, "crashes")
+        crash_filter, crash_update = build_crash_upsert(data, timestamp)
+
+        try:
+            crash = await upsert_crash(crashes_collection, crash_filter, crash_update)
+        except DuplicateKeyError:
+            # A concurrent request created this crash first - retrying now updates it
+            crash = await upsert_crash(crashes_collection, crash_filter, crash_update)
+
+        bucket_filter, bucket_update = build_occurrence_bucket_upsert(
+            crash_filter['crash_signature'], error_type, build_crash_occurrence(data, timestamp)
+        )
+        occurrences_collection = await get_package_collection_async(db, package_name, "crash_occurrences")
+        await occurrences_collection.update_one(bucket_filter, bucket_update, upsert=True)
+
+        rollups = RollupAccumulator()
+        rollups.add_crash(crash_filter['crash_signature'], timestamp)
+        await write_rollups_async(db, package_name, rollups)
+
+        sketches = SketchAccumulator()
+        sketches.add_crash(crash_filter['crash_signature'], data.get('user_id'), timestamp)
+        await write_sketches_async(db, package_name, sketches)
+
+        if crash['count'] > 1:
+            return create_success_response(
+                "Crash report updated successfully",
+                {
+                    "crash_id": crash['_id'],
+                    "action": "updated",
+                    "count": crash['count']
+                }
+            )
+
+        return create_success_response(
+            "Crash report logged successfully",
+            {
+                "crash_id": crash['_id'],
+                "action": "created"
+            },
+            201
+        )
+
+    except Exception as e:
+        return create_error_response(f"Failed to log crash: {str(e)}")
+
+
+async def upsert_crash(crashes_collection, crash_filter, crash_update):
+    """Apply a crash upsert and return the crash's _id and new count"""
+    return await crashes_collection.find_one_and_update(
+        crash_filter,
+        crash_update,
+        projection={"_id": 1, "count": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def health_check(request):
+    return JSONResponse({"status": "healthy", "service": "analytics-ingest"})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Create the per-process clients when a server process starts, close them on shutdown"""
+    global http_client
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "100")))
+    )
+    await AsyncConnectionHolder.initialize_db()
+    top_event_tracker.ensure_started()
+
+    yield
+
+    top_event_tracker.stop()
+    await http_client.aclose()
+    AsyncConnectionHolder.close_connection()
+
+
+app = Starlette(
+    routes=[
+        Route('/analytics/events', log_event, methods=['POST']),
+        Route('/analytics/sessions', log_session, methods=['POST']),
+        Route('/analytics/users', register_user, methods=['POST']),
+        Route('/analytics/crashes', log_crash, methods=['POST']),
+        Route('/health', health_check, methods=['GET'])
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    host = os.getenv("ASYNC_INGEST_HOST", "0.0.0.0")
+    port = int(os.getenv("ASYNC_INGEST_PORT", "5002"))
+
+    print("🚀 Starting Analytics ingestion server (async)...")
+    print(f"📡 Ingest API will be available at: http://{host}:{port}/analytics")
+    uvicorn.run("async_ingest:app", host=host, port=port,
+                workers=int(os.getenv("ASYNC_INGEST_WORKERS", "1")), log_level="warning")
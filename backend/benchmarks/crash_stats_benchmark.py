@@ -0,0 +1,420 @@
+"""
+Crash Statistics Benchmark
+
+Compares the crash stats sections built from one $facet aggregation over
+the occurrence buckets with the previous approach (a separate query per
+section, unwinding the buckets again each time), on a synthetic package
+with 1M crash occurrences. Also checks that both return the same sections.
+
+Needs a MongoDB configured through DB_CONNECTION_STRING / DB_NAME (.env).
+The synthetic crashes go to the "benchmark.crashes" package collections and
+are dropped afterwards unless --keep is given.
+
+Usage (from the backend directory):
+    python benchmarks/crash_stats_benchmark.py --occurrences 1000000
+    python benchmarks/crash_stats_benchmark.py --occurrences 1000000 --signatures 2000 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection
+from crash_occurrences import build_buckets, UNKNOWN_DEVICE
+from rollups import get_rollup_total, get_rollup_time_series
+from time_series import parse_series_args
+from controllers.crashes import (
+    build_crash_stats,
+    RECENT_CRASH_OCCURRENCES,
+    build_crash_signature,
+    calculate_crash_rate,
+    get_crash_trend_indicator,
+    format_time_ago
+)
+
+BENCHMARK_PACKAGE = "benchmark.crashes"
+DEVICE_MODELS = ["Pixel 7", "Pixel 8", "Galaxy S23", "Galaxy A54", "OnePlus 11", "Xperia 5", "Moto G84", None]
+ERROR_TYPES = ["NullPointerException", "IllegalStateException", "OutOfMemoryError",
+               "IndexOutOfBoundsException", "NetworkOnMainThreadException"]
+
+
+# Days the synthetic occurrences are spread over
+SEED_DAYS = 90
+
+
+def seed_crashes(db, occurrence_count, signature_count, user_count):
+    """Insert synthetic crashes: a few signatures account for most occurrences, spread over SEED_DAYS days"""
+    now = datetime.now()
+    random.seed(42)
+
+    crashes_collection = get_package_collection(db, BENCHMARK_PACKAGE, "crashes")
+    occurrences_collection = get_package_collection(db, BENCHMARK_PACKAGE, "crash_occurrences")
+
+    # Heavy-tailed share of occurrences per signature
+    weights = [1 / (rank + 1) for rank in range(signature_count)]
+    total_weight = sum(weights)
+
+    inserted = 0
+    for rank, weight in enumerate(weights):
+        count = max(1, round(occurrence_count * weight / total_weight))
+        error_type = ERROR_TYPES[rank % len(ERROR_TYPES)]
+        error_message = f"Synthetic crash {rank}"
+        crash_signature = build_crash_signature(error_type, error_message)
+
+        occurrences = []
+        for _ in range(count):
+            model = random.choice(DEVICE_MODELS)
+            occurrences.append({
+                "timestamp": now - timedelta(seconds=random.uniform(0, SEED_DAYS * 24 * 3600)),
+                "user_id": f"user-{random.randint(1, user_count)}" if random.random() < 0.95 else None,
+                "session_id": str(uuid.uuid4()),
+                "device_info": {"model": model} if model else {}
+            })
+
+        buckets = build_buckets(crash_signature, error_type, occurrences)
+        for i in range(0, len(buckets), 1000):
+            occurrences_collection.insert_many(buckets[i:i + 1000], ordered=False)
+
+        timestamps = [occurrence['timestamp'] for occurrence in occurrences]
+        crashes_collection.insert_one({
+            "_id": str(uuid.uuid4()),
+            "crash_signature": crash_signature,
+            "error_type": error_type,
+            "error_message": error_message,
+            "stack_trace": f"java.lang.{error_type}\n\tat com.example.app.Screen{rank}.onCreate(Screen{rank}.java:42)",
+            "device_info": occurrences[0]['device_info'],
+            "count": count,
+            "first_seen": min(timestamps),
+            "last_seen": max(timestamps),
+            "created_at": now,
+            "updated_at": now
+        })
+
+        inserted += count
+        print(f"🌱 Seeded {inserted}/{occurrence_count} occurrences", end="\r")
+
+    print()
+
+
+def legacy_crash_stats(db, package_name, start, end, granularity="day", timezone_name=None):
+    """The previous implementation (one query per section), kept here for comparison"""
+    crashes_collection = get_package_collection(db, package_name, "crashes")
+    occurrences_collection = get_package_collection(db, package_name, "crash_occurrences")
+    rollups_collection = get_package_collection(db, package_name, "rollups")
+
+    total_crashes = get_rollup_total(rollups_collection, "crashes")
+    total_sessions = get_rollup_total(rollups_collection, "sessions")
+
+    return {
+        "total_crash_types": crashes_collection.estimated_document_count(),
+        "total_crashes": total_crashes,
+        "crash_rate": calculate_crash_rate(total_crashes, total_sessions),
+        "daily_crash_trends": legacy_get_daily_crash_trends(rollups_collection, start, end, granularity, timezone_name),
+        "crash_rate_trends": legacy_get_crash_rate_trends(rollups_collection, start, end, granularity, timezone_name),
+        "device_crash_patterns": legacy_get_device_crash_patterns(occurrences_collection),
+        "top_crashes_by_impact": legacy_get_top_crashes_by_impact(crashes_collection, occurrences_collection),
+        "recent_crashes": legacy_get_recent_crashes_formatted(crashes_collection, occurrences_collection)
+    }
+
+
+# ===== PREVIOUS IMPLEMENTATION =====
+
+def legacy_get_daily_crash_trends(rollups_collection, start, end, granularity="day", timezone_name=None):
+    """
+    Get crash trends per period over the chart range INCLUDING the current period
+    """
+
+    # Crash occurrences per period from the rollups, with empty periods as 0
+    crash_series = get_rollup_time_series(rollups_collection, "crashes", start, end, granularity, timezone_name)
+
+    trend_data = [
+        {"date": item['period'], "crashes": item['count']}
+        for item in crash_series
+    ]
+
+    return trend_data
+
+
+def legacy_get_crash_rate_trends(rollups_collection, start, end, granularity="day", timezone_name=None):
+    """
+    Calculate crash rate trends over time
+
+    This shows crash rate percentage per period
+
+    Helps identify if app stability is improving or declining
+    """
+
+    # Get session and crash counts per period (same periods in both series)
+    session_series = get_rollup_time_series(rollups_collection, "sessions", start, end, granularity, timezone_name)
+    crash_series = get_rollup_time_series(rollups_collection, "crashes", start, end, granularity, timezone_name)
+
+    # Calculate crash rate for each period
+    rate_trends = []
+    for session_item, crash_item in zip(session_series, crash_series):
+        crashes = crash_item['count']
+        sessions = session_item['count']
+
+        crash_rate = (crashes / sessions * 100) if sessions > 0 else 0
+
+        rate_trends.append({
+            "date": session_item['period'],
+            "crash_rate": round(crash_rate, 2)
+        })
+
+    return rate_trends
+
+
+def legacy_get_device_crash_patterns(occurrences_collection):
+    """
+    Analyze which devices/OS versions crash most
+
+    This helps identify problematic device configurations
+    """
+
+    # Crashes by device model, from the per-bucket device counters
+    device_pipeline = [
+        {"$project": {"error_type": 1, "devices": {"$objectToArray": "$device_counts"}}},
+        {"$unwind": "$devices"},
+        {
+            "$group": {
+                "_id": "$devices.k",
+                "crash_count": {"$sum": "$devices.v"},
+                "unique_crashes": {"$addToSet": "$error_type"}
+            }
+        },
+        {"$sort": {"crash_count": -1}},
+        {"$limit": 10}
+    ]
+
+    device_results = list(occurrences_collection.aggregate(device_pipeline))
+
+    # Format for frontend charts
+    device_patterns = [
+        {
+            "name": item['_id'] or UNKNOWN_DEVICE,
+            "value": item['crash_count'],
+            "unique_types": len(item['unique_crashes'])
+        }
+        for item in device_results
+    ]
+
+    return device_patterns
+
+
+def legacy_get_users_affected(occurrences_collection, crash_signatures=None):
+    """
+    Count unique users per crash signature across all of its buckets
+
+    Args:
+        crash_signatures: Optional list of signatures to restrict the count to
+
+    Returns:
+        dict: crash_signature -> number of unique users
+    """
+    pipeline = []
+    if crash_signatures is not None:
+        pipeline.append({"$match": {"crash_signature": {"$in": crash_signatures}}})
+
+    pipeline += [
+        {"$unwind": "$user_ids"},
+        {"$group": {"_id": "$crash_signature", "users": {"$addToSet": "$user_ids"}}},
+        {"$project": {"users_affected": {"$size": "$users"}}}
+    ]
+
+    return {item['_id']: item['users_affected'] for item in occurrences_collection.aggregate(pipeline)}
+
+
+def legacy_get_top_crashes_by_impact(crashes_collection, occurrences_collection):
+    """
+    Get top crashes ranked by impact (frequency + affected users)
+
+    This prioritizes which crashes developers should fix first
+    """
+
+    users_affected = legacy_get_users_affected(occurrences_collection)
+
+    crashes = crashes_collection.find({}, {"crash_signature": 1, "error_type": 1, "count": 1})
+
+    ranked = []
+    for crash in crashes:
+        unique_users = users_affected.get(crash['crash_signature'], 0)
+        ranked.append({
+            "name": f"{crash['error_type'][:30]}...",
+            "value": crash['count'],
+            "users_affected": unique_users,
+            "impact_score": crash['count'] * unique_users
+        })
+
+    top_crashes = sorted(ranked, key=lambda item: item['impact_score'], reverse=True)[:10]
+
+    return top_crashes
+
+
+def legacy_get_recent_crashes_formatted(crashes_collection, occurrences_collection):
+    """Get recent crashes formatted for table display with enhanced details"""
+
+    top_crashes = list(crashes_collection.find({})
+                       .sort("last_seen", -1)
+                       .limit(10))
+
+    crash_signatures = [crash['crash_signature'] for crash in top_crashes]
+    users_affected_by_crash = legacy_get_users_affected(occurrences_collection, crash_signatures)
+    weekly_counts = legacy_get_weekly_occurrence_counts(occurrences_collection, crash_signatures)
+    latest_occurrences = legacy_get_latest_occurrences(occurrences_collection, crash_signatures)
+
+    # Format for frontend display
+    recent_crashes = []
+    for crash in top_crashes:
+        crash_signature = crash['crash_signature']
+        occurrences = latest_occurrences.get(crash_signature, [])
+
+        device_model = "Unknown"
+        if crash.get('device_info') and crash['device_info'].get('model'):
+            device_model = crash['device_info']['model']
+        elif occurrences:
+            latest_occurrence = occurrences[-1]
+            if latest_occurrence.get('device_info') and latest_occurrence['device_info'].get('model'):
+                device_model = latest_occurrence['device_info']['model']
+
+        users_affected = users_affected_by_crash.get(crash_signature, 0)
+
+        # Calculate impact score (frequency × unique users)
+        impact_score = crash['count'] * users_affected
+
+        recent_crashes.append({
+            "error": crash['error_type'],
+            "message": crash.get('error_message', '')[:100],
+            "full_message": crash.get('error_message', ''),
+            "stack_trace": crash.get('stack_trace', ''),
+            "device": device_model,
+            "count": crash['count'],
+            "lastSeen": format_time_ago(crash['last_seen']),
+            "first_seen": crash['first_seen'].isoformat() if crash.get('first_seen') else None,
+            "trend": get_crash_trend_indicator(*weekly_counts.get(crash_signature, (0, 0))),
+            "crash_id": crash['_id'],
+            "users_affected": users_affected,
+            "impact_score": impact_score,
+            "occurrences": occurrences
+        })
+
+    return recent_crashes
+
+
+def legacy_get_weekly_occurrence_counts(occurrences_collection, crash_signatures):
+    """
+    Count occurrences in the last 7 days and the 7 days before, per crash
+
+    Returns:
+        dict: crash_signature -> (recent_count, previous_count)
+    """
+    now = datetime.now()
+    week_ago = now - timedelta(days=7)
+    two_weeks_ago = now - timedelta(days=14)
+
+    pipeline = [
+        {"$match": {"crash_signature": {"$in": crash_signatures}, "bucket_start": {"$gte": two_weeks_ago}}},
+        {
+            "$group": {
+                "_id": "$crash_signature",
+                "recent": {"$sum": {"$cond": [{"$gte": ["$bucket_start", week_ago]}, "$count", 0]}},
+                "previous": {"$sum": {"$cond": [{"$lt": ["$bucket_start", week_ago]}, "$count", 0]}}
+            }
+        }
+    ]
+
+    return {item['_id']: (item['recent'], item['previous']) for item in occurrences_collection.aggregate(pipeline)}
+
+
+def legacy_get_latest_occurrences(occurrences_collection, crash_signatures):
+    """
+    Get the occurrences in the most recent bucket of each crash
+
+    Returns:
+        dict: crash_signature -> list of occurrences (oldest first)
+    """
+    pipeline = [
+        {"$match": {"crash_signature": {"$in": crash_signatures}}},
+        {"$sort": {"crash_signature": 1, "bucket_start": -1}},
+        {"$group": {"_id": "$crash_signature", "occurrences": {"$first": "$occurrences"}}}
+    ]
+
+    return {item['_id']: item['occurrences'] for item in occurrences_collection.aggregate(pipeline)}
+
+
+def measure(label, function, repeat):
+    """Run a crash stats function `repeat` times, printing the mean wall time"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = (time.perf_counter() - started) / repeat
+
+    print(f"⏱️ {label:<12} {elapsed:8.2f} s")
+    return result, elapsed
+
+
+def sort_ties(stats):
+    """
+    Order tied entries by name so both implementations compare equal
+
+    The stats now show only the last RECENT_CRASH_OCCURRENCES occurrences of
+    each recent crash; the legacy lists are trimmed the same way.
+    """
+    for section in ("device_crash_patterns", "top_crashes_by_impact"):
+        stats[section] = sorted(stats[section], key=lambda item: (-item['value'], item['name']))
+    for crash in stats["recent_crashes"]:
+        crash["occurrences"] = crash["occurrences"][-RECENT_CRASH_OCCURRENCES:]
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the crash statistics calculation")
+    parser.add_argument("--occurrences", type=int, default=1000000, help="Number of synthetic crash occurrences")
+    parser.add_argument("--signatures", type=int, default=500, help="Number of distinct crashes")
+    parser.add_argument("--users", type=int, default=100000, help="Number of distinct users")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic crashes afterwards")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = AnalyticsConnectionHolder.get_db()
+    if db is None:
+        sys.exit(1)
+
+    collection_types = ("crashes", "crash_occurrences", "rollups")
+    crashes_collection = db[f"{BENCHMARK_PACKAGE}_crashes"]
+
+    if crashes_collection.estimated_document_count() != args.signatures:
+        for collection_type in collection_types:
+            db[f"{BENCHMARK_PACKAGE}_{collection_type}"].drop()
+        seed_crashes(db, args.occurrences, args.signatures, args.users)
+
+    # The previous implementation reads every bucket: compare over a range covering all of them
+    chart_range = parse_series_args({"periods": str(SEED_DAYS + 1)})
+
+    try:
+        legacy, legacy_time = measure(
+            "legacy", lambda: legacy_crash_stats(db, BENCHMARK_PACKAGE, *chart_range), args.repeat
+        )
+        faceted, faceted_time = measure(
+            "$facet", lambda: build_crash_stats(db, BENCHMARK_PACKAGE, *chart_range, exact=True), args.repeat
+        )
+
+        print(f"🚀 {legacy_time / faceted_time:.1f}x faster" if faceted_time > 0 else "")
+
+        legacy, faceted = sort_ties(legacy), sort_ties(faceted)
+        differing = [section for section in legacy if legacy[section] != faceted.get(section)]
+        print("✅ Results match" if not differing else f"⚠️ Sections differ: {', '.join(differing)}")
+
+    finally:
+        if not args.keep:
+            for collection_type in collection_types:
+                db[f"{BENCHMARK_PACKAGE}_{collection_type}"].drop()
@@ -0,0 +1,183 @@
+"""
+Ingestion Load Benchmark
+
+Fires the SDK's write traffic - a mix of events, session starts/ends, user
+registrations and crashes - at an ingest server with many concurrent
+connections, and reports throughput, latency percentiles and errors.
+Run it once against the Flask app and once against the async ingestion
+server (async_ingest.py) to compare them under the same load.
+
+Both servers must already be running against the same MongoDB. The
+synthetic data goes to the "benchmark.ingest" package collections; drop
+them afterwards with --cleanup (needs DB_CONNECTION_STRING / DB_NAME).
+
+Usage (from the backend directory):
+    python app.py                      # Flask, port 5001
+    python async_ingest.py             # async, port 5002
+    python benchmarks/ingest_load_benchmark.py --targets http://localhost:5001 http://localhost:5002
+    python benchmarks/ingest_load_benchmark.py --targets http://localhost:5002 --requests 200000 --concurrency 10000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+BENCHMARK_PACKAGE = "benchmark.ingest"
+EVENT_TYPES = ["login", "screen_view", "button_click", "product_view", "add_to_cart", "purchase", "search"]
+ERROR_TYPES = ["NullPointerException", "IllegalStateException", "OutOfMemoryError"]
+
+# Share of each request kind in the traffic mix (SDKs send mostly events)
+TRAFFIC_MIX = [("event", 0.85), ("session", 0.08), ("user", 0.05), ("crash", 0.02)]
+
+
+def build_request(user_count):
+    """Pick a request from the traffic mix: (kind, path, payload)"""
+    kind = random.choices([kind for kind, _ in TRAFFIC_MIX], weights=[weight for _, weight in TRAFFIC_MIX])[0]
+    user_id = f"user-{random.randint(1, user_count)}"
+    timestamp = int(time.time() * 1000)
+    device_info = {"model": "Pixel 7", "os_version": "14", "app_version": "2.3.1"}
+
+    if kind == "event":
+        return kind, "/analytics/events", {
+            "package_name": BENCHMARK_PACKAGE,
+            "event_type": random.choice(EVENT_TYPES),
+            "user_id": user_id,
+            "timestamp": timestamp,
+            "properties": {"screen": f"screen_{random.randint(1, 20)}"},
+            "device_info": device_info
+        }
+
+    if kind == "session":
+        return kind, "/analytics/sessions", {
+            "package_name": BENCHMARK_PACKAGE,
+            "session_id": str(uuid.uuid4()),
+            "action": "start",
+            "user_id": user_id,
+            "timestamp": timestamp,
+            "device_info": device_info
+        }
+
+    if kind == "user":
+        return kind, "/analytics/users", {
+            "package_name": BENCHMARK_PACKAGE,
+            "user_id": user_id,
+            "country": "Israel",
+            "timestamp": timestamp,
+            "device_info": device_info
+        }
+
+    return kind, "/analytics/crashes", {
+        "package_name": BENCHMARK_PACKAGE,
+        "error_type": random.choice(ERROR_TYPES),
+        "error_message": f"Crash #{random.randint(1, 50)}",
+        "user_id": user_id,
+        "timestamp": timestamp,
+        "device_info": device_info
+    }
+
+
+async def run_load(base_url, request_count, concurrency, user_count, timeout_seconds):
+    """
+    Send request_count requests with at most `concurrency` in flight
+
+    Returns:
+        dict: elapsed seconds, latencies (ms) of successful requests, error counts
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies = []
+    errors = {}
+    remaining = iter(range(request_count))
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout_seconds) as client:
+        async def connection():
+            # One simulated device connection sending requests back to back
+            for _ in remaining:
+                kind, path, payload = build_request(user_count)
+                started = time.perf_counter()
+                try:
+                    response = await client.post(path, json=payload)
+                    if response.status_code in (200, 201):
+                        latencies.append((time.perf_counter() - started) * 1000)
+                    else:
+                        key = f"{kind}: HTTP {response.status_code}"
+                        errors[key] = errors.get(key, 0) + 1
+                except httpx.HTTPError as e:
+                    key = f"{kind}: {type(e).__name__}"
+                    errors[key] = errors.get(key, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {"elapsed": elapsed, "latencies": latencies, "errors": errors}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def print_report(base_url, result, request_count):
+    latencies = sorted(result["latencies"])
+    error_count = sum(result["errors"].values())
+
+    print(f"\n{base_url}")
+    print(f"  {len(latencies)}/{request_count} succeeded in {result['elapsed']:.1f}s "
+          f"-> {len(latencies) / result['elapsed']:.0f} requests/s")
+    print(f"  latency ms: p50 {percentile(latencies, 0.5):.1f}  p95 {percentile(latencies, 0.95):.1f}  "
+          f"p99 {percentile(latencies, 0.99):.1f}  max {percentile(latencies, 1.0):.1f}")
+    if error_count:
+        print(f"  errors: {error_count}")
+        for key, count in sorted(result["errors"].items(), key=lambda item: -item[1]):
+            print(f"    {key}: {count}")
+
+
+def drop_benchmark_collections():
+    from dotenv import load_dotenv
+    from mongodb_connection_manager import AnalyticsConnectionHolder
+
+    load_dotenv()
+    db = AnalyticsConnectionHolder.get_db()
+    if db is None:
+        return
+
+    for name in db.list_collection_names():
+        if name.startswith(f"{BENCHMARK_PACKAGE}_"):
+            db.drop_collection(name)
+    print(f"\n🧹 Dropped the {BENCHMARK_PACKAGE} collections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", default=["http://localhost:5001", "http://localhost:5002"],
+                        help="Base URLs of the ingest servers to load, one after the other")
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per target")
+    parser.add_argument("--concurrency", type=int, default=1000, help="Concurrent connections")
+    parser.add_argument("--users", type=int, default=5000, help="Distinct synthetic users")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--cleanup", action="store_true", help="Drop the benchmark collections afterwards")
+    args = parser.parse_args()
+
+    random.seed(42)
+    print(f"Sending {args.requests} requests per target over {args.concurrency} connections "
+          f"({', '.join(f'{kind} {weight:.0%}' for kind, weight in TRAFFIC_MIX)})")
+
+    for base_url in args.targets:
+        result = asyncio.run(run_load(base_url, args.requests, args.concurrency, args.users, args.timeout))
+        print_report(base_url, result, args.requests)
+
+    if args.cleanup:
+        drop_benchmark_collections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+JSON Serialization Benchmark
+
+Compares building a list-endpoint response the previous way (convert each
+document's datetimes with isoformat() in Python, then Flask's default
+jsonify) with the orjson-based FastJSONProvider, for event and crash
+payloads of 100 and 1000 documents. Also checks that both produce the same
+bytes.
+
+Needs no database; the documents are synthetic.
+
+Usage (from the backend directory):
+    python benchmarks/json_benchmark.py
+    python benchmarks/json_benchmark.py --sizes 100 1000 5000 --repeat 200
+"""
+
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider
+
+
+def build_events(count):
+    """Synthetic documents shaped like get_events results"""
+    now = datetime.now()
+    return [
+        {
+            "_id": str(uuid.uuid4()),
+            "event_type": random.choice(["login", "product_view", "add_to_cart", "purchase", "search"]),
+            "user_id": f"user-{random.randint(1, 5000)}",
+            "timestamp": now - timedelta(seconds=i * 37),
+            "properties": {"product_id": f"p{i % 50}", "price": round(random.uniform(1, 500), 2), "quantity": i % 4},
+            "session_id": str(uuid.uuid4()),
+            "device_info": {"model": "Pixel 7", "os_version": "14", "app_version": "2.3.1"},
+            "created_at": now - timedelta(seconds=i * 37 - 1),
+            "full_date": (now - timedelta(seconds=i * 37)).strftime("%Y-%m-%d"),
+            "time_only": (now - timedelta(seconds=i * 37)).strftime("%H:%M"),
+            "user_display": "user-123...",
+            "properties_preview": f"product_id: p{i % 50}, price: 12.5"
+        }
+        for i in range(count)
+    ]
+
+
+def build_crashes(count):
+    """Synthetic documents shaped like get_crashes results"""
+    now = datetime.now()
+    return [
+        {
+            "_id": str(uuid.uuid4()),
+            "crash_signature": f"NullPointerException:Attempt to invoke method {i}",
+            "error_type": "NullPointerException",
+            "error_message": f"Attempt to invoke method {i}",
+            "stack_trace": "java.lang.NullPointerException\n\tat com.example.app.MainActivity.onCreate(MainActivity.java:42)\n" * 5,
+            "device_info": {"model": "Galaxy S23", "os_version": "13"},
+            "count": random.randint(1, 10000),
+            "first_seen": now - timedelta(days=i % 90),
+            "last_seen": now - timedelta(minutes=i),
+            "created_at": now - timedelta(days=i % 90),
+            "updated_at": now - timedelta(minutes=i)
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_response(app, documents, timestamp_fields):
+    """The previous path: per-document isoformat() loop, then Flask's default provider"""
+    for document in documents:
+        for field in timestamp_fields:
+            if field in document and document[field]:
+                document[field] = document[field].isoformat()
+
+    return app.json.response({"documents": documents, "count": len(documents)})
+
+
+def fast_response(app, documents):
+    return app.json.response({"documents": documents, "count": len(documents)})
+
+
+def measure(label, function, repeat):
+    """Run a function `repeat` times and print the mean time per call"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = (time.perf_counter() - started) / repeat
+
+    print(f"⏱️ {label:<28} {elapsed * 1000:8.3f} ms")
+    return result, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark JSON response serialization")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="Documents per response")
+    parser.add_argument("--repeat", type=int, default=100, help="Runs per measurement")
+    args = parser.parse_args()
+
+    random.seed(42)
+
+    legacy_app = Flask("legacy")
+    legacy_app.json = DefaultJSONProvider(legacy_app)
+
+    fast_app = Flask("fast")
+    fast_app.json = FastJSONProvider(fast_app)
+
+    payloads = [
+        ("events", build_events, ['timestamp', 'created_at']),
+        ("crashes", build_crashes, ['first_seen', 'last_seen', 'created_at', 'updated_at'])
+    ]
+
+    for name, build, timestamp_fields in payloads:
+        for size in args.sizes:
+            documents = build(size)
+            print(f"\n📦 {size} {name}")
+
+            with legacy_app.app_context():
+                # The legacy loop mutates documents, so each run gets a fresh copy (copying is timed separately)
+                _, copy_time = measure("copy only", lambda: copy.deepcopy(documents), args.repeat)
+                legacy, legacy_time = measure(
+                    "legacy (loop + jsonify)",
+                    lambda: legacy_response(legacy_app, copy.deepcopy(documents), timestamp_fields),
+                    args.repeat
+                )
+
+            with fast_app.app_context():
+                fast, fast_time = measure("orjson provider", lambda: fast_response(fast_app, documents), args.repeat)
+
+            speedup = (legacy_time - copy_time) / fast_time if fast_time > 0 else 0
+            print(f"🚀 {speedup:.1f}x faster (excluding the copy)")
+            print("✅ Same bytes" if legacy.get_data() == fast.get_data() else "⚠️ Output differs")
@@ -0,0 +1,125 @@
+"""
+Retention Benchmark
+
+Compares the dashboard retention calculation (one server-side $group) with
+the previous approach (load every cohort user into Python and loop once per
+period) on a synthetic package, reporting wall time and the peak memory
+allocated in the API process.
+
+Needs a MongoDB configured through DB_CONNECTION_STRING / DB_NAME (.env).
+The synthetic users go to the "benchmark.retention_users" collection and are
+dropped afterwards unless --keep is given.
+
+Usage (from the backend directory):
+    python benchmarks/retention_benchmark.py --users 1000000
+    python benchmarks/retention_benchmark.py --users 10000000 --skip-legacy
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from controllers.users import calculate_user_retention, RETENTION_PERIODS
+
+BENCHMARK_PACKAGE = "benchmark.retention"
+INSERT_CHUNK_SIZE = 10000
+
+
+def seed_users(users_collection, user_count):
+    """Insert synthetic users: signed up over the last 180 days, active up to 60 days later"""
+    now = datetime.now()
+    random.seed(42)
+
+    inserted = 0
+    while inserted < user_count:
+        chunk = []
+        for i in range(inserted, min(inserted + INSERT_CHUNK_SIZE, user_count)):
+            first_seen = now - timedelta(days=random.uniform(0, 180))
+            last_active = min(now, first_seen + timedelta(days=random.expovariate(1 / 10)))
+            chunk.append({"user_id": f"user-{i}", "first_seen": first_seen, "last_active": last_active})
+
+        users_collection.insert_many(chunk, ordered=False)
+        inserted += len(chunk)
+        print(f"🌱 Seeded {inserted}/{user_count} users", end="\r")
+
+    print()
+    users_collection.create_index("first_seen")
+
+
+def legacy_user_retention(users_collection):
+    """The previous implementation, kept here for comparison"""
+    thirty_days_ago = datetime.now() - timedelta(days=30)
+    cohort_users = list(users_collection.find({"first_seen": {"$lt": thirty_days_ago}}))
+
+    if len(cohort_users) == 0:
+        return []
+
+    retention_data = []
+    for period in RETENTION_PERIODS:
+        retained_count = 0
+        for user in cohort_users:
+            if user['last_active'] >= user['first_seen'] + timedelta(days=period['days']):
+                retained_count += 1
+
+        retention_data.append({
+            "day": period['name'],
+            "retention": round(retained_count / len(cohort_users) * 100, 1)
+        })
+
+    return retention_data
+
+
+def measure(label, function, users_collection):
+    """Run a retention function once, printing wall time and peak Python memory"""
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    result = function(users_collection)
+
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"⏱️ {label:<12} {elapsed:8.2f} s   peak memory {peak / 1024 / 1024:9.1f} MiB")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the user retention calculation")
+    parser.add_argument("--users", type=int, default=1000000, help="Number of synthetic users")
+    parser.add_argument("--skip-legacy", action="store_true", help="Don't run the previous implementation")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic users afterwards")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = AnalyticsConnectionHolder.get_db()
+    if db is None:
+        sys.exit(1)
+
+    collection = db[f"{BENCHMARK_PACKAGE}_users"]
+
+    if collection.estimated_document_count() != args.users:
+        collection.drop()
+        seed_users(collection, args.users)
+
+    try:
+        aggregated = measure("aggregation", calculate_user_retention, collection)
+
+        if not args.skip_legacy:
+            legacy = measure("legacy", legacy_user_retention, collection)
+            print("✅ Results match" if legacy == aggregated else f"⚠️ Results differ: {legacy} vs {aggregated}")
+
+        print(aggregated)
+
+    finally:
+        if not args.keep:
+            collection.drop()
@@ -0,0 +1,525 @@
+"""
+Cohort Retention for Analytics API
+
+Maintains a cohort x day-N retention matrix incrementally at ingest time.
+
+Per package:
+    {package}_user_activity   one document per user: signup_day plus an
+                              integer bitmask of the days since signup on
+                              which the user was active (bit N = day N)
+    {package}_cohorts         one document per signup day: cohort size and
+                              the number of users active on each day N
+
+A user's signup day is the earliest day they were seen (registration,
+event or session start), whatever order the activity arrives in (offline
+queues and batch replays deliver old days late). Activity is recorded by
+reading the users' activity documents, working out each user's new state
+and writing them all with one bulk of conditional upserts. The difference
+between the old and the new state - new days, or an earlier signup day that
+moves the user to another cohort - says how the matrix cells change. Days
+are UTC.
+
+Usage (rebuild from raw users, events and sessions):
+    python cohorts.py rebuild [package_name]
+"""
+
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection, get_package_collection_async
+from validation_utils import to_utc_naive
+
+# Days tracked per cohort: Day 0 (signup day) to Day 30. The bitmask stays
+# below 2^53 so the server-side arithmetic is exact.
+COHORT_DAYS = 31
+
+MILLISECONDS_PER_DAY = 24 * 60 * 60 * 1000
+
+# Cohort updates kept per package for the next write after a failed one
+MAX_UNWRITTEN_COHORT_UPDATES = 10000
+
+# Rounds of reading and writing users whose activity document another writer changed meanwhile
+MAX_ACTIVITY_WRITE_ATTEMPTS = 5
+
+ACTIVITY_PROJECTION = {"signup_day": 1, "active_days": 1}
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def get_activity_day(timestamp):
+    """UTC day (midnight) a timestamp falls on"""
+    return to_utc_naive(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def apply_activity_days(state, days):
+    """
+    Add active days to a user's activity state
+
+    signup_day becomes the earliest day seen. If a day is before the stored
+    signup_day, the bitmask is re-based onto it first: every bit moves up by
+    the days between the two, and bits pushed past the tracked range are
+    dropped (the rebuild drops them too). Then the bit of every day within
+    the tracked range is set.
+
+    Args:
+        state (tuple): (signup_day, active_days) or None for a new user
+        days (iterable): UTC days the user was active
+
+    Returns:
+        tuple: The new (signup_day, active_days)
+    """
+    earliest_day = min(days)
+    signup_day, mask = state if state is not None else (earliest_day, 0)
+
+    if earliest_day < signup_day:
+        mask = (mask << (signup_day - earliest_day).days) & ((1 << COHORT_DAYS) - 1)
+        signup_day = earliest_day
+
+    for day in days:
+        offset = (day - signup_day).days
+        if offset < COHORT_DAYS:
+            mask |= 1 << offset
+
+    return signup_day, mask
+
+
+def get_cohort_updates(previous_state, state):
+    """
+    Work out how a change of a user's activity state changes the cohort matrix
+
+    Returns:
+        list: Cohort upserts - one for new days in the same cohort (or a new
+              user), two when an earlier signup day moves the user from one
+              cohort to another
+    """
+    signup_day, mask = state
+    offsets = [offset for offset in range(COHORT_DAYS) if (mask >> offset) & 1]
+
+    if previous_state is None:
+        return [build_cohort_increment(signup_day, dict.fromkeys(offsets, 1), size=1)]
+
+    previous_signup_day, previous_mask = previous_state
+
+    if previous_signup_day == signup_day:
+        new_offsets = [offset for offset in offsets if not (previous_mask >> offset) & 1]
+        return [build_cohort_increment(signup_day, dict.fromkeys(new_offsets, 1))] if new_offsets else []
+
+    # Re-based: take the user out of the old cohort and count all their days in the new one
+    previous_offsets = [offset for offset in range(COHORT_DAYS) if (previous_mask >> offset) & 1]
+    return [
+        build_cohort_increment(previous_signup_day, dict.fromkeys(previous_offsets, -1), size=-1),
+        build_cohort_increment(signup_day, dict.fromkeys(offsets, 1), size=1)
+    ]
+
+
+def build_cohort_increment(signup_day, retained, size=0):
+    """
+    Build the upsert applying changes to one cohort's cells
+
+    Args:
+        signup_day (datetime): The cohort
+        retained (dict): day N -> change of the users active on day N
+        size (int): Change of the cohort size
+    """
+    increments = {f"retained.{offset}": amount for offset, amount in retained.items()}
+    if size:
+        increments["size"] = size
+
+    return UpdateOne(
+        {"_id": signup_day.strftime("%Y-%m-%d")},
+        {"$inc": increments, "$setOnInsert": {"cohort_start": signup_day}},
+        upsert=True
+    )
+
+
+def build_activity_write(user_id, previous_state, state):
+    """
+    Build the conditional upsert moving a user's activity document to `state`
+
+    The filter matches only the state the update was computed from. If
+    another writer changed the document in the meantime, the upsert tries to
+    insert a second document with the same _id and fails with a duplicate key
+    error, so the user is read and planned again.
+    """
+    if previous_state is None:
+        activity_filter = {"_id": user_id, "signup_day": None}
+    else:
+        activity_filter = {"_id": user_id, "signup_day": previous_state[0], "active_days": previous_state[1]}
+
+    return UpdateOne(activity_filter, {"$set": {"signup_day": state[0], "active_days": state[1]}}, upsert=True)
+
+
+def plan_activity_writes(documents, days_by_user):
+    """
+    Work out the activity writes and cohort updates for a set of users
+
+    Args:
+        documents (iterable): The users' current activity documents
+        days_by_user (dict): user_id -> set of UTC days to record
+
+    Returns:
+        tuple: (planned, unchanged) - planned lists (user_id, activity write,
+               cohort updates) for users whose activity changes; unchanged
+               lists the users whose days were all recorded already
+    """
+    states = {
+        document['_id']: (document['signup_day'], int(document.get('active_days', 0)))
+        for document in documents if document.get('signup_day') is not None
+    }
+
+    planned = []
+    unchanged = []
+    for user_id, days in days_by_user.items():
+        previous_state = states.get(user_id)
+        state = apply_activity_days(previous_state, days)
+
+        if state == previous_state:
+            unchanged.append(user_id)
+        else:
+            planned.append((
+                user_id,
+                build_activity_write(user_id, previous_state, state),
+                get_cohort_updates(previous_state, state)
+            ))
+
+    return planned, unchanged
+
+
+class CohortTracker:
+    """Records user activity days and keeps the cohort matrix up to date"""
+
+    def __init__(self, max_recent_entries=100000):
+        # (package, user, day) already recorded by this process - skips the
+        # database entirely for a user's repeat activity on the same day
+        self.max_recent_entries = max_recent_entries
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+        # package_name -> cohort updates not written yet. Their days are
+        # already set on the activity documents, so dropping them would leave
+        # the matrix short until a rebuild.
+        self._unwritten = defaultdict(list)
+
+    def record_activity(self, db, package_name, activities):
+        """
+        Record user activity
+
+        Costs one read and one unordered bulk upsert of the users' activity
+        documents (plus a round per lost race with another writer), then one
+        bulk write of the cohort cells. The cohort updates of every activity
+        write that went through are queued before anything else can fail, and
+        retried with the next write if the cohort write fails.
+
+        Failures are logged but never fail the ingest request;
+        `python cohorts.py rebuild` repairs any drift.
+
+        Args:
+            db: Database instance
+            package_name (str): App package name
+            activities (iterable): (user_id, timestamp) pairs; user_id may be None
+        """
+        days_by_user = self._get_pending(package_name, activities)
+        if not days_by_user and not self._unwritten.get(package_name):
+            return
+
+        try:
+            activity_collection = get_package_collection(db, package_name, "user_activity")
+            cohort_operations = []
+
+            try:
+                for _ in range(MAX_ACTIVITY_WRITE_ATTEMPTS):
+                    if not days_by_user:
+                        break
+
+                    documents = activity_collection.find({"_id": {"$in": list(days_by_user)}}, ACTIVITY_PROJECTION)
+                    planned, unchanged = plan_activity_writes(documents, days_by_user)
+
+                    write_error = None
+                    if planned:
+                        try:
+                            activity_collection.bulk_write([write for _, write, _ in planned], ordered=False)
+                        except BulkWriteError as e:
+                            write_error = e
+
+                    days_by_user = self._collect_written(
+                        package_name, days_by_user, planned, unchanged, write_error, cohort_operations
+                    )
+            finally:
+                self._keep_unwritten(package_name, cohort_operations)
+
+            self._warn_if_conflicting(package_name, days_by_user)
+
+            cohort_operations = self._take_unwritten(package_name)
+            if cohort_operations:
+                try:
+                    get_package_collection(db, package_name, "cohorts").bulk_write(cohort_operations, ordered=False)
+                except Exception as e:
+                    self._keep_unwritten(package_name, cohort_operations, e)
+                    raise
+
+        except Exception as e:
+            print(f"⚠️ Failed to record cohort activity for {package_name}: {str(e)}")
+
+    async def record_activity_async(self, db, package_name, activities):
+        """Same as record_activity, for an async (Motor) database"""
+        days_by_user = self._get_pending(package_name, activities)
+        if not days_by_user and not self._unwritten.get(package_name):
+            return
+
+        try:
+            activity_collection = await get_package_collection_async(db, package_name, "user_activity")
+            cohort_operations = []
+
+            try:
+                for _ in range(MAX_ACTIVITY_WRITE_ATTEMPTS):
+                    if not days_by_user:
+                        break
+
+                    documents = await activity_collection.find(
+                        {"_id": {"$in": list(days_by_user)}}, ACTIVITY_PROJECTION
+                    ).to_list(length=None)
+                    planned, unchanged = plan_activity_writes(documents, days_by_user)
+
+                    write_error = None
+                    if planned:
+                        try:
+                            await activity_collection.bulk_write([write for _, write, _ in planned], ordered=False)
+                        except BulkWriteError as e:
+                            write_error = e
+
+                    days_by_user = self._collect_written(
+                        package_name, days_by_user, planned, unchanged, write_error, cohort_operations
+                    )
+            finally:
+                self._keep_unwritten(package_name, cohort_operations)
+
+            self._warn_if_conflicting(package_name, days_by_user)
+
+            cohort_operations = self._take_unwritten(package_name)
+            if cohort_operations:
+                cohorts_collection = await get_package_collection_async(db, package_name, "cohorts")
+                try:
+                    await cohorts_collection.bulk_write(cohort_operations, ordered=False)
+                except Exception as e:
+                    self._keep_unwritten(package_name, cohort_operations, e)
+                    raise
+
+        except Exception as e:
+            print(f"⚠️ Failed to record cohort activity for {package_name}: {str(e)}")
+
+    def _get_pending(self, package_name, activities):
+        """user_id -> UTC days not recently recorded by this process"""
+        days_by_user = defaultdict(set)
+        for user_id, timestamp in activities:
+            if user_id and timestamp:
+                day = get_activity_day(timestamp)
+                if not self._is_recent((package_name, user_id, day)):
+                    days_by_user[user_id].add(day)
+
+        return dict(days_by_user)
+
+    def _collect_written(self, package_name, days_by_user, planned, unchanged, write_error, cohort_operations):
+        """
+        Queue the cohort updates of every activity write that went through
+
+        Returns:
+            dict: user_id -> days for the users whose write lost a race with
+                  another writer, to read and plan again
+
+        Raises:
+            BulkWriteError: If a write failed for another reason (after the
+                            applied writes are collected)
+        """
+        failed_writes = {}
+        if write_error is not None:
+            failed_writes = {error['index']: error for error in write_error.details.get('writeErrors', [])}
+
+        recorded = list(unchanged)
+        conflicting = {}
+
+        for position, (user_id, _, updates) in enumerate(planned):
+            failed_write = failed_writes.get(position)
+            if failed_write is None:
+                cohort_operations.extend(updates)
+                recorded.append(user_id)
+            elif failed_write.get('code') == DUPLICATE_KEY_ERROR:
+                conflicting[user_id] = days_by_user[user_id]
+
+        # Their cohort updates are queued, so the database can be skipped next time
+        for user_id in recorded:
+            for day in days_by_user[user_id]:
+                self._remember((package_name, user_id, day))
+
+        if len(conflicting) < len(failed_writes):
+            raise write_error
+
+        return conflicting
+
+    def _warn_if_conflicting(self, package_name, days_by_user):
+        if days_by_user:
+            print(f"⚠️ Gave up recording cohort activity for {len(days_by_user)} users of {package_name} after "
+                  f"{MAX_ACTIVITY_WRITE_ATTEMPTS} conflicting writes - run `python cohorts.py rebuild {package_name}`")
+
+    def _take_unwritten(self, package_name):
+        with self._lock:
+            return self._unwritten.pop(package_name, [])
+
+    def _keep_unwritten(self, package_name, cohort_operations, error=None):
+        """Queue cohort updates for the next write (after a failed bulk write, only the ones it did not apply)"""
+        if not cohort_operations:
+            return
+
+        if isinstance(error, BulkWriteError):
+            failed_positions = {write_error['index'] for write_error in error.details.get('writeErrors', [])}
+            cohort_operations = [operation for i, operation in enumerate(cohort_operations) if i in failed_positions]
+
+        with self._lock:
+            unwritten = cohort_operations + self._unwritten.get(package_name, [])
+            if len(unwritten) > MAX_UNWRITTEN_COHORT_UPDATES:
+                print(f"⚠️ Dropping {len(unwritten) - MAX_UNWRITTEN_COHORT_UPDATES} cohort updates for "
+                      f"{package_name} - run `python cohorts.py rebuild {package_name}`")
+                unwritten = unwritten[:MAX_UNWRITTEN_COHORT_UPDATES]
+            self._unwritten[package_name] = unwritten
+
+    def _is_recent(self, key):
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                return True
+            return False
+
+    def _remember(self, key):
+        with self._lock:
+            self._recent[key] = True
+            while len(self._recent) > self.max_recent_entries:
+                self._recent.popitem(last=False)
+
+
+cohort_tracker = CohortTracker()
+
+
+def get_cohort_matrix(cohorts_collection, cohort_count=30):
+    """
+    Read the most recent cohorts
+
+    Args:
+        cohorts_collection: The package's cohorts collection
+        cohort_count (int): Number of signup days to return
+
+    Returns:
+        list: One row per signup day, oldest first:
+              {"cohort": "2024-05-01", "size": int, "retained": [int, ...],
+               "retention": [float, ...]}
+              Each list has an entry per day N that has already started (UTC).
+    """
+    cohorts = list(cohorts_collection.find({}, {"cohort_start": 1, "size": 1, "retained": 1})
+                   .sort("cohort_start", -1)
+                   .limit(cohort_count))
+    cohorts.reverse()
+
+    today = get_activity_day(datetime.now(timezone.utc))
+
+    matrix = []
+    for cohort in cohorts:
+        size = cohort.get('size', 0)
+        retained_by_day = cohort.get('retained', {})
+        days_elapsed = max(0, min((today - cohort['cohort_start']).days + 1, COHORT_DAYS))
+
+        retained = [retained_by_day.get(str(offset), 0) for offset in range(days_elapsed)]
+
+        matrix.append({
+            "cohort": cohort['_id'],
+            "size": size,
+            "retained": retained,
+            "retention": [round(count / size * 100, 1) if size > 0 else 0 for count in retained]
+        })
+
+    return matrix
+
+
+# ===== REBUILD =====
+
+def rebuild_package_cohorts(db, package_name):
+    """Recompute a package's user activity and cohort matrix from raw data"""
+    activity_days = defaultdict(set)
+    signup_days = {}
+
+    def add(user_id, timestamp):
+        if not user_id or not timestamp:
+            return
+        day = get_activity_day(timestamp)
+        activity_days[user_id].add(day)
+        if user_id not in signup_days or day < signup_days[user_id]:
+            signup_days[user_id] = day
+
+    for user in db[f"{package_name}_users"].find({}, {"user_id": 1, "first_seen": 1}):
+        add(user.get('user_id'), user.get('first_seen'))
+    for event in db[f"{package_name}_events"].find({"user_id": {"$ne": None}}, {"user_id": 1, "timestamp": 1}):
+        add(event['user_id'], event.get('timestamp'))
+    for session in db[f"{package_name}_sessions"].find({"user_id": {"$ne": None}}, {"user_id": 1, "start_time": 1}):
+        add(session['user_id'], session.get('start_time'))
+
+    activity_documents = []
+    cohorts = defaultdict(lambda: {"size": 0, "retained": defaultdict(int)})
+
+    for user_id, days in activity_days.items():
+        signup_day = signup_days[user_id]
+        mask = 0
+        for day in days:
+            offset = (day - signup_day).days
+            if offset < COHORT_DAYS:
+                mask |= 1 << offset
+                cohorts[signup_day]["retained"][str(offset)] += 1
+
+        cohorts[signup_day]["size"] += 1
+        activity_documents.append({"_id": user_id, "signup_day": signup_day, "active_days": mask})
+
+    activity_collection = get_package_collection(db, package_name, "user_activity")
+    cohorts_collection = get_package_collection(db, package_name, "cohorts")
+    activity_collection.delete_many({})
+    cohorts_collection.delete_many({})
+
+    for i in range(0, len(activity_documents), 1000):
+        activity_collection.insert_many(activity_documents[i:i + 1000], ordered=False)
+
+    cohort_documents = [
+        {
+            "_id": signup_day.strftime("%Y-%m-%d"),
+            "cohort_start": signup_day,
+            "size": cohort["size"],
+            "retained": dict(cohort["retained"])
+        }
+        for signup_day, cohort in cohorts.items()
+    ]
+    if cohort_documents:
+        cohorts_collection.insert_many(cohort_documents, ordered=False)
+
+    print(f"✅ Rebuilt {len(cohort_documents)} cohorts ({len(activity_documents)} users) for {package_name}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) in (2, 3) and sys.argv[1] == 'rebuild':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        database = AnalyticsConnectionHolder.get_db()
+        if database is None:
+            sys.exit(1)
+
+        if len(sys.argv) == 3:
+            package_names = [sys.argv[2]]
+        else:
+            package_names = sorted(name[:-len('_users')] for name in database.list_collection_names()
+                                   if name.endswith('_users'))
+
+        for name in package_names:
+            rebuild_package_cohorts(database, name)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,427 @@
+"""
+Columnar Export for Analytics API
+
+Writes a package's events and sessions as Parquet or Arrow IPC files, one
+file per UTC day:
+
+    {COLUMNAR_EXPORT_DIR}/{package}/{table}/date=2024-05-01/part.parquet
+
+`properties` and `device_info` are flattened into typed columns
+("properties.price", "device_info.model", ...). The column types of a day
+are discovered with one aggregation before its documents are streamed, so
+every cursor batch becomes an Arrow record batch with the same schema and
+memory stays bounded by the batch size. Keys with mixed or nested values
+become JSON string columns.
+
+Exports are incremental by default: only days with documents added or
+changed since the last run (events by created_at, sessions by updated_at)
+are rewritten. The run state is kept in a _manifest.json next to the
+partitions.
+
+Requires the optional `pyarrow` package (pip install pyarrow).
+
+Usage:
+    python columnar_export.py export <package_name> [--format parquet|arrow] [--full]
+                                     [--start 2024-05-01] [--end 2024-06-01]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection
+from exports import serialize_value
+from validation_utils import convert_timestamp, to_utc_naive
+
+COLUMNAR_EXPORT_DIR = os.getenv("COLUMNAR_EXPORT_DIR", "exports")
+COLUMNAR_BATCH_SIZE = int(os.getenv("COLUMNAR_BATCH_SIZE", "10000"))
+
+# Documents written shortly before the previous run started (e.g. still in
+# the event buffer) are picked up by the next run
+CHANGE_MARGIN = timedelta(minutes=5)
+
+FILE_EXTENSIONS = {
+    "parquet": "parquet",
+    "arrow": "arrow"
+}
+
+# Time field, change-tracking field, top-level columns and flattened objects per table
+COLUMNAR_TABLES = {
+    "events": {
+        "time_field": "timestamp",
+        "changed_field": "created_at",
+        "columns": [
+            ("_id", "string"),
+            ("event_type", "string"),
+            ("user_id", "string"),
+            ("session_id", "string"),
+            ("timestamp", "timestamp"),
+            ("created_at", "timestamp")
+        ],
+        "flatten": ["properties", "device_info"]
+    },
+    "sessions": {
+        "time_field": "start_time",
+        "changed_field": "updated_at",
+        "columns": [
+            ("_id", "string"),
+            ("session_id", "string"),
+            ("user_id", "string"),
+            ("start_time", "timestamp"),
+            ("end_time", "timestamp"),
+            ("duration_seconds", "int"),
+            ("closed_by", "string"),
+            ("created_at", "timestamp"),
+            ("updated_at", "timestamp")
+        ],
+        "flatten": ["device_info"]
+    }
+}
+
+# BSON type names (from $type) that map onto one column type
+BSON_COLUMN_TYPES = {
+    frozenset(["int"]): "int",
+    frozenset(["long"]): "int",
+    frozenset(["int", "long"]): "int",
+    frozenset(["double"]): "float",
+    frozenset(["int", "double"]): "float",
+    frozenset(["long", "double"]): "float",
+    frozenset(["int", "long", "double"]): "float",
+    frozenset(["bool"]): "bool",
+    frozenset(["date"]): "timestamp",
+    frozenset(["string"]): "string"
+}
+
+
+def import_pyarrow():
+    """Import pyarrow (an optional dependency)"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Columnar export requires the 'pyarrow' package (pip install pyarrow)")
+
+    return pyarrow
+
+
+def get_table_dir(package_name, table):
+    return os.path.join(COLUMNAR_EXPORT_DIR, package_name, table)
+
+
+def is_inside_export_dir(path):
+    """Check a path built from a package name (e.g. from a URL) stays inside COLUMNAR_EXPORT_DIR"""
+    return os.path.abspath(path).startswith(os.path.abspath(COLUMNAR_EXPORT_DIR) + os.sep)
+
+
+def get_partition_path(package_name, table, day, export_format):
+    """Path of the file holding one day of a table"""
+    return os.path.join(get_table_dir(package_name, table), f"date={day:%Y-%m-%d}",
+                        f"part.{FILE_EXTENSIONS[export_format]}")
+
+
+def load_manifest(package_name, table):
+    """Read the export state of a table (empty if never exported)"""
+    path = os.path.join(get_table_dir(package_name, table), "_manifest.json")
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(package_name, table, manifest):
+    path = os.path.join(get_table_dir(package_name, table), "_manifest.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    temp_path = create_temp_path(path)
+    try:
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+    except Exception:
+        remove_temp_file(temp_path)
+        raise
+
+
+def create_temp_path(path):
+    """Create a uniquely named temp file next to `path`, so concurrent exports never share one"""
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.",
+                                     suffix=".tmp", delete=False) as temp_file:
+        return temp_file.name
+
+
+def remove_temp_file(temp_path):
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+# ===== PARTITION DISCOVERY =====
+
+def get_day_expression(time_field):
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": f"${time_field}"}}
+
+
+def find_changed_days(collection, table, changed_since, start=None, end=None):
+    """
+    Days of a table that need to be (re)written
+
+    Args:
+        collection: The table's collection
+        table (str): "events" or "sessions"
+        changed_since (datetime): Only days with documents changed since then (None = all days)
+        start, end (datetime): Optional range of days (end exclusive)
+
+    Returns:
+        list: Day start datetimes, oldest first
+    """
+    config = COLUMNAR_TABLES[table]
+    time_field = config["time_field"]
+
+    query_filter = {time_field: {"$ne": None}}
+    if start or end:
+        query_filter[time_field] = {**({"$gte": start} if start else {}), **({"$lt": end} if end else {})}
+    if changed_since is not None:
+        query_filter[config["changed_field"]] = {"$gte": changed_since}
+
+    pipeline = [
+        {"$match": query_filter},
+        {"$group": {"_id": get_day_expression(time_field)}},
+        {"$sort": {"_id": 1}}
+    ]
+
+    return [datetime.strptime(day['_id'], "%Y-%m-%d") for day in collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+def discover_flattened_columns(collection, table, day_start, day_end):
+    """
+    Find the flattened property columns of one day and their column types
+
+    Returns:
+        list: (column_name, column_type) pairs, sorted by name
+    """
+    config = COLUMNAR_TABLES[table]
+    time_field = config["time_field"]
+
+    nested_fields = [
+        {
+            "$map": {
+                "input": {"$objectToArray": {"$ifNull": [f"${field}", {}]}},
+                "as": "entry",
+                "in": {"k": {"$concat": [f"{field}.", "$$entry.k"]}, "t": {"$type": "$$entry.v"}}
+            }
+        }
+        for field in config["flatten"]
+    ]
+
+    pipeline = [
+        {"$match": {time_field: {"$gte": day_start, "$lt": day_end}}},
+        {"$project": {"_id": 0, "fields": {"$concatArrays": nested_fields}}},
+        {"$unwind": "$fields"},
+        {"$group": {"_id": "$fields.k", "types": {"$addToSet": "$fields.t"}}},
+        {"$sort": {"_id": 1}}
+    ]
+
+    columns = []
+    for field in collection.aggregate(pipeline, allowDiskUse=True):
+        bson_types = frozenset(field['types']) - {"null"}
+        columns.append((field['_id'], BSON_COLUMN_TYPES.get(bson_types, "string")))
+
+    return columns
+
+
+# ===== ARROW CONVERSION =====
+
+def build_schema(pa, columns):
+    arrow_types = {
+        "string": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("ms", tz="UTC")
+    }
+    return pa.schema([(name, arrow_types[column_type]) for name, column_type in columns])
+
+
+def get_column_value(document, column_name):
+    """Value of a top-level or flattened ("properties.price") column"""
+    if column_name in document:
+        return document[column_name]
+
+    parent, _, key = column_name.partition(".")
+    nested = document.get(parent)
+    return nested.get(key) if isinstance(nested, dict) else None
+
+
+def convert_value(value, column_type):
+    """Coerce a value to its column type (objects and arrays are JSON-encoded in string columns)"""
+    if value is None:
+        return None
+    if column_type == "string":
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, default=serialize_value)
+        return value if isinstance(value, str) else serialize_value(value)
+    if column_type == "int":
+        return int(value)
+    if column_type == "float":
+        return float(value)
+    return value
+
+
+def to_record_batch(pa, schema, columns, documents):
+    """Turn a list of documents into an Arrow record batch"""
+    arrays = [
+        pa.array([convert_value(get_column_value(document, name), column_type) for document in documents],
+                 type=schema.field(name).type)
+        for name, column_type in columns
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_document_batches(collection, time_field, day_start, day_end, batch_size):
+    """Read one day of documents in lists of batch_size"""
+    cursor = (collection.find({time_field: {"$gte": day_start, "$lt": day_end}})
+              .sort([(time_field, 1), ("_id", 1)])
+              .batch_size(batch_size))
+
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+# ===== EXPORT =====
+
+def write_partition(collection, package_name, table, day, export_format="parquet", batch_size=COLUMNAR_BATCH_SIZE):
+    """
+    Write (or rewrite) the file of one day
+
+    Returns:
+        int: Rows written
+    """
+    pa = import_pyarrow()
+
+    config = COLUMNAR_TABLES[table]
+    day_end = day + timedelta(days=1)
+
+    columns = config["columns"] + discover_flattened_columns(collection, table, day, day_end)
+    schema = build_schema(pa, columns)
+
+    path = get_partition_path(package_name, table, day, export_format)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    temp_path = create_temp_path(path)
+    try:
+        if export_format == "arrow":
+            writer = pa.ipc.new_file(temp_path, schema)
+        else:
+            writer = pa.parquet.ParquetWriter(temp_path, schema, compression="zstd")
+
+        rows = 0
+        try:
+            for documents in iter_document_batches(collection, config["time_field"], day, day_end, batch_size):
+                writer.write_table(pa.Table.from_batches([to_record_batch(pa, schema, columns, documents)]))
+                rows += len(documents)
+        finally:
+            writer.close()
+
+        # Readers never see a half-written partition
+        os.replace(temp_path, path)
+    except Exception:
+        remove_temp_file(temp_path)
+        raise
+
+    return rows
+
+
+def export_table(db, package_name, table, export_format="parquet", full=False, start=None, end=None):
+    """
+    Export the changed (or all) days of a table
+
+    Args:
+        db: Database instance
+        package_name (str): App package name
+        table (str): "events" or "sessions"
+        export_format (str): "parquet" or "arrow"
+        full (bool): Rewrite every day instead of only the changed ones
+        start, end (datetime): Optional range of days (end exclusive)
+
+    Returns:
+        dict: {"table", "partitions_written": [{"date", "rows", "path"}, ...]}
+    """
+    import_pyarrow()
+
+    run_started = datetime.now()
+    collection = get_package_collection(db, package_name, table)
+    manifest = load_manifest(package_name, table)
+
+    # A format change means every partition has to be rewritten
+    changed_since = None
+    if not full and manifest.get("format") == export_format and manifest.get("last_run_started_at"):
+        changed_since = datetime.fromisoformat(manifest["last_run_started_at"]) - CHANGE_MARGIN
+
+    written = []
+    partitions = manifest.get("partitions", {}) if manifest.get("format") == export_format else {}
+
+    for day in find_changed_days(collection, table, changed_since, start, end):
+        rows = write_partition(collection, package_name, table, day, export_format)
+        day_label = day.strftime("%Y-%m-%d")
+        partitions[day_label] = {"rows": rows, "written_at": datetime.now().isoformat()}
+        written.append({"date": day_label, "rows": rows,
+                        "path": get_partition_path(package_name, table, day, export_format)})
+        print(f"🧱 Wrote {rows} {table} rows for {day_label}")
+
+    # A run limited to a range of days doesn't cover changes outside it
+    last_run_started_at = manifest.get("last_run_started_at") if start or end else run_started.isoformat()
+
+    save_manifest(package_name, table, {
+        "format": export_format,
+        "last_run_started_at": last_run_started_at,
+        "partitions": partitions
+    })
+
+    return {"table": table, "partitions_written": written}
+
+
+def export_package(db, package_name, tables=None, export_format="parquet", full=False, start=None, end=None):
+    """Export several tables of a package (all columnar tables by default)"""
+    return [
+        export_table(db, package_name, table, export_format, full, start, end)
+        for table in (tables or list(COLUMNAR_TABLES))
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export events and sessions as Parquet / Arrow IPC day partitions")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("package_name")
+    parser.add_argument("--format", choices=list(FILE_EXTENSIONS), default="parquet")
+    parser.add_argument("--table", choices=list(COLUMNAR_TABLES), action="append",
+                        help="Table to export (repeatable, default: all)")
+    parser.add_argument("--full", action="store_true", help="Rewrite every partition, not only changed ones")
+    parser.add_argument("--start", help="First day to export (ISO date)")
+    parser.add_argument("--end", help="Day after the last day to export (ISO date)")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    database = AnalyticsConnectionHolder.get_db()
+    if database is None:
+        sys.exit(1)
+
+    range_start = to_utc_naive(convert_timestamp(args.start)) if args.start else None
+    range_end = to_utc_naive(convert_timestamp(args.end)) if args.end else None
+
+    results = export_package(database, args.package_name, args.table, args.format, args.full, range_start, range_end)
+    for result in results:
+        print(f"✅ {result['table']}: {len(result['partitions_written'])} partitions written")
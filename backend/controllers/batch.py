@@ -0,0 +1,324 @@
+"""
+Batch ingestion endpoint for Analytics API
+
+Lets the SDK send a mixed array of events, session actions and crash reports
+in a single request (e.g. when draining its offline queue) instead of one
+HTTP round trip per item.
+"""
+
+import os
+from collections import defaultdict
+
+from flask import Blueprint, request, jsonify
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import index_manager
+from controllers.events import build_event_document
+from controllers.sessions import build_session_document, build_session_end_update
+from controllers.crashes import build_crash_upsert, build_crash_occurrence, build_crash_signature
+from crash_occurrences import build_occurrence_bucket_upsert
+from rollups import RollupAccumulator, write_rollups
+from hyperloglog import SketchAccumulator, write_sketches
+from heavy_hitters import top_event_tracker
+from response_cache import response_cache
+from cohorts import cohort_tracker
+from validation_utils import (
+    get_missing_fields,
+    convert_timestamp,
+    to_utc_naive,
+    check_database_connection,
+    create_error_response
+)
+
+batch_blueprint = Blueprint('batch', __name__)
+
+# Upper bound on items per batch request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+
+# Required fields per item type (same rules as the single-item endpoints)
+REQUIRED_FIELDS = {
+    "event": ['package_name', 'event_type'],
+    "session": ['package_name', 'session_id', 'action'],
+    "crash": ['package_name', 'error_type']
+}
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+@batch_blueprint.route('/batch', methods=['POST'])
+def log_batch():
+    """
+    Ingest a mixed batch of events, session actions and crash reports
+
+    Request body:
+        {"items": [{"type": "event" | "session" | "crash", "id": "...", "data": {...}}, ...]}
+
+    "id" is an optional idempotency key for events and session starts: it is
+    stored as the document _id, so when a batch is replayed (e.g. after a
+    timeout) items that were already stored are reported as duplicates
+    instead of being inserted again. Session ends need no key, since closing
+    a session again recomputes the same duration. Crash items are not
+    deduplicated: their "id" is ignored and a replayed crash is counted
+    again (the SDK sends crashes directly and never batches them).
+
+    Each item is validated on its own and written with unordered bulk writes,
+    one per package collection. The response contains one result per item
+    (in request order) so the client can retry only the failed ones.
+    """
+
+    print("📦 Received batch from Android app...")
+
+    try:
+        data = request.json
+        db = AnalyticsConnectionHolder.get_db()
+
+        # Database connection check
+        is_connected, error_response = check_database_connection(db)
+        if not is_connected:
+            return error_response
+
+        items = data.get('items') if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            return create_error_response("Request body must contain an 'items' array", 400)
+
+        if len(items) > MAX_BATCH_SIZE:
+            return create_error_response(f"Batch too large: maximum is {MAX_BATCH_SIZE} items", 400)
+
+        results = [None] * len(items)
+        timestamps = [None] * len(items)
+
+        # (duration_seconds, previous_duration_seconds) per session 'end' item, for the rollups
+        session_durations = {}
+
+        # Write operations grouped by target collection. Session 'end' actions
+        # go in a second phase so a start and end in the same batch apply in order.
+        operations = defaultdict(list)
+        session_end_operations = defaultdict(list)
+
+        for index, item in enumerate(items):
+            try:
+                item_operations, session_id, timestamps[index] = _build_item_operations(item)
+            except ValueError as e:
+                results[index] = _item_result(index, item, "error", str(e), retryable=False)
+                continue
+
+            for collection_type, operation in item_operations:
+                collection_name = f"{item['data']['package_name']}_{collection_type}"
+
+                if session_id is not None:
+                    session_end_operations[collection_name].append((index, operation, session_id))
+                else:
+                    operations[collection_name].append((index, operation))
+
+        for collection_name, indexed_operations in operations.items():
+            index_manager.ensure_indexes(db, collection_name)
+            _execute_bulk(db[collection_name], indexed_operations, items, results)
+
+        for collection_name, indexed_operations in session_end_operations.items():
+            index_manager.ensure_indexes(db, collection_name)
+            sessions_collection = db[collection_name]
+
+            # One lookup per collection to find which sessions can be closed
+            session_ids = list({session_id for _, _, session_id in indexed_operations})
+            known_sessions = {
+                session['session_id']: session
+                for session in sessions_collection.find(
+                    {"session_id": {"$in": session_ids}},
+                    {"session_id": 1, "start_time": 1, "duration_seconds": 1}
+                )
+            }
+
+            pending = []
+            for index, operation, session_id in indexed_operations:
+                session = known_sessions.get(session_id)
+                if session is not None:
+                    pending.append((index, operation))
+
+                    # Same arithmetic as the pipeline update
+                    duration_seconds = int((to_utc_naive(timestamps[index]) - session['start_time']).total_seconds())
+                    session_durations[index] = (duration_seconds, session.get('duration_seconds'))
+                    session['duration_seconds'] = duration_seconds
+                else:
+                    results[index] = _item_result(index, items[index], "error", "Session not found", retryable=True)
+
+            _execute_bulk(sessions_collection, pending, items, results)
+
+        # Items with no recorded error had every one of their writes succeed
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = _item_result(index, items[index], "ok")
+
+        # The writes above are committed: an aggregate failure must not turn
+        # the response into a 500, or the client would replay the whole batch
+        try:
+            _update_aggregates(db, items, results, timestamps, session_durations)
+        except Exception as e:
+            print(f"⚠️ Failed to update aggregates for batch: {str(e)}")
+
+        failed = sum(1 for result in results if result['status'] == "error")
+        accepted = len(results) - failed
+
+        print(f"✅ Batch processed: {accepted} accepted, {failed} failed")
+
+        return jsonify({
+            "message": "Batch processed",
+            "accepted": accepted,
+            "failed": failed,
+            "results": results
+        }), 200 if failed == 0 else 207
+
+    except Exception as e:
+        return create_error_response(f"Failed to process batch: {str(e)}")
+
+
+def _build_item_operations(item):
+    """
+    Validate a batch item and turn it into bulk write operations
+
+    Returns:
+        tuple: (operations, session_id, timestamp)
+               operations is a list of (collection_type, operation) pairs
+               session_id is only set for session 'end' actions
+               timestamp is the item's parsed timestamp
+
+    Raises:
+        ValueError: If the item is invalid
+    """
+    if not isinstance(item, dict) or not isinstance(item.get('data'), dict):
+        raise ValueError("Item must be an object with 'type' and 'data'")
+
+    item_type = item.get('type')
+    if item_type not in REQUIRED_FIELDS:
+        raise ValueError("Invalid type. Must be 'event', 'session' or 'crash'")
+
+    data = item['data']
+
+    missing_fields = get_missing_fields(data, REQUIRED_FIELDS[item_type])
+    if missing_fields:
+        raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
+
+    item_id = item.get('id')
+    if item_id is not None and (not isinstance(item_id, str) or not item_id):
+        raise ValueError("Item 'id' must be a non-empty string")
+
+    timestamp = convert_timestamp(data.get('timestamp'))
+
+    if item_type == "event":
+        return [("events", InsertOne(_with_item_id(build_event_document(data, timestamp), item_id)))], None, timestamp
+
+    if item_type == "crash":
+        # No idempotency: the crash and bucket upserts increment counters
+        crash_filter, crash_update = build_crash_upsert(data, timestamp)
+        bucket_filter, bucket_update = build_occurrence_bucket_upsert(
+            crash_filter['crash_signature'], data['error_type'], build_crash_occurrence(data, timestamp)
+        )
+        return [
+            ("crashes", UpdateOne(crash_filter, crash_update, upsert=True)),
+            ("crash_occurrences", UpdateOne(bucket_filter, bucket_update, upsert=True))
+        ], None, timestamp
+
+    if data['action'] == 'start':
+        return [("sessions", InsertOne(_with_item_id(build_session_document(data, timestamp), item_id)))], None, timestamp
+
+    if data['action'] == 'end':
+        session_id = data['session_id']
+        operation = UpdateOne({"session_id": session_id}, build_session_end_update(timestamp))
+        return [("sessions", operation)], session_id, timestamp
+
+    raise ValueError("Invalid action. Must be 'start' or 'end'")
+
+
+def _with_item_id(document, item_id):
+    """Use the client's idempotency key as the document _id when one was sent"""
+    if item_id is not None:
+        document['_id'] = item_id
+    return document
+
+
+def _execute_bulk(collection, indexed_operations, items, results):
+    """Run one unordered bulk write and record an error result for every item that failed"""
+    if not indexed_operations:
+        return
+
+    failed_positions = {}
+
+    try:
+        collection.bulk_write([operation for _, operation in indexed_operations], ordered=False)
+
+    except BulkWriteError as e:
+        for write_error in e.details.get('writeErrors', []):
+            failed_positions[write_error['index']] = write_error
+
+    except Exception as e:
+        # The whole bulk failed (e.g. network error) - every item can be retried
+        for index, _ in indexed_operations:
+            results[index] = _item_result(index, items[index], "error", str(e), retryable=True)
+        return
+
+    for position, write_error in failed_positions.items():
+        index = indexed_operations[position][0]
+
+        if write_error.get('code') == DUPLICATE_KEY_ERROR and items[index].get('id') is not None:
+            # Stored by an earlier attempt of this item - accepted, but not counted again
+            results[index] = _item_result(index, items[index], "duplicate")
+            continue
+
+        # Duplicate key errors will fail again on retry
+        retryable = write_error.get('code') != DUPLICATE_KEY_ERROR
+        results[index] = _item_result(
+            index, items[index], "error", write_error.get('errmsg', "Write failed"), retryable
+        )
+
+
+def _update_aggregates(db, items, results, timestamps, session_durations):
+    """Count every accepted item in its package's rollups and user sketches (one bulk write each per package) and cohort activity"""
+    rollups = defaultdict(RollupAccumulator)
+    sketches = defaultdict(SketchAccumulator)
+    activities = defaultdict(list)
+    event_types = defaultdict(list)
+
+    for index, item in enumerate(items):
+        if results[index]['status'] != "ok":
+            continue
+
+        data = item['data']
+        accumulator = rollups[data['package_name']]
+
+        if item['type'] == "event":
+            accumulator.add_event(data['event_type'], timestamps[index])
+            sketches[data['package_name']].add_event(data['event_type'], data.get('user_id'), timestamps[index])
+            event_types[data['package_name']].append(data['event_type'])
+            activities[data['package_name']].append((data.get('user_id'), timestamps[index]))
+        elif item['type'] == "crash":
+            crash_signature = build_crash_signature(data['error_type'], data.get('error_message', 'No message provided'))
+            accumulator.add_crash(crash_signature, timestamps[index])
+            sketches[data['package_name']].add_crash(crash_signature, data.get('user_id'), timestamps[index])
+        elif data['action'] == 'start':
+            accumulator.add_session_start(timestamps[index])
+            activities[data['package_name']].append((data.get('user_id'), timestamps[index]))
+        elif index in session_durations:
+            accumulator.add_session_end(*session_durations[index])
+
+    for package_name, accumulator in rollups.items():
+        write_rollups(db, package_name, accumulator)
+        write_sketches(db, package_name, sketches[package_name])
+        top_event_tracker.record(package_name, event_types[package_name])
+        cohort_tracker.record_activity(db, package_name, activities[package_name])
+        response_cache.invalidate_package(package_name)
+
+
+def _item_result(index, item, status, error=None, retryable=False):
+    """Build the per-item result entry returned to the client"""
+    result = {
+        "index": index,
+        "type": item.get('type') if isinstance(item, dict) else None,
+        "status": status
+    }
+
+    if error:
+        result["error"] = error
+        result["retryable"] = retryable
+
+    return result
@@ -1,18 +1,40 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
+import os
 import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection
+from response_cache import response_cache
+from crash_occurrences import (
+    build_occurrence_bucket_upsert,
+    UNKNOWN_DEVICE
+)
+from rollups import RollupAccumulator, write_rollups, get_rollup_totals, get_rollup_time_series
+from hyperloglog import SketchAccumulator, write_sketches, get_unique_user_counts
+from time_series import parse_series_args
+from pagination import parse_page_args, paginate
 from validation_utils import (
     validate_required_fields,
     parse_timestamp,
+    to_utc_naive,
     check_database_connection,
-    format_timestamps_in_document,
     create_success_response,
     create_error_response
 )
 
 crashes_blueprint = Blueprint('crashes', __name__)
 
+# Sort orders of the crash list (each has a (field, _id) index)
+CRASH_SORT_FIELDS = ('last_seen', 'count', 'first_seen')
+
+# Bounds on the crash stats aggregation, whose $facet result is a single
+# document (16 MB): most frequent signatures considered for the impact
+# ranking, and occurrences shown per recent crash
+CRASH_STATS_MAX_SIGNATURES = int(os.getenv("CRASH_STATS_MAX_SIGNATURES", "1000"))
+RECENT_CRASH_OCCURRENCES = 5
+
 
 @crashes_blueprint.route('/crashes', methods=['POST'])
 def log_crash():
@@ -42,79 +64,53 @@ def log_crash():
 
         package_name = data['package_name']
         error_type = data['error_type']
-        error_message = data.get('error_message', 'No message provided')
 
-        # Check if this exact crash already exists (for grouping similar crashes)
-        crashes_collection = db[f"{package_name}_crashes"]
+        crashes_collection = get_package_collection(db, package_name, "crashes")
 
-        # Create a "signature" for similar crashes
-        crash_signature = f"{error_type}:{error_message}"
+        # Group into the crash with the same signature, creating it if needed (one round trip)
+        crash_filter, crash_update = build_crash_upsert(data, timestamp)
 
-        existing_crash = crashes_collection.find_one({"crash_signature": crash_signature})
+        try:
+            crash = upsert_crash(crashes_collection, crash_filter, crash_update)
+        except DuplicateKeyError:
+            # A concurrent request created this crash first - retrying now updates it
+            crash = upsert_crash(crashes_collection, crash_filter, crash_update)
 
-        if existing_crash:
-            # Increment count for existing crash type
-            crashes_collection.update_one(
-                {"crash_signature": crash_signature},
-                {
-                    "$inc": {"count": 1},
-                    "$set": {
-                        "last_seen": timestamp,
-                        "updated_at": datetime.now()
-                    },
-                    "$push": {
-                        "occurrences": {
-                            "timestamp": timestamp,
-                            "user_id": data.get('user_id'),
-                            "session_id": data.get('session_id'),
-                            "device_info": data.get('device_info', {})
-                        }
-                    }
-                }
-            )
+        # Record the occurrence in its hourly bucket
+        bucket_filter, bucket_update = build_occurrence_bucket_upsert(
+            crash_filter['crash_signature'], error_type, build_crash_occurrence(data, timestamp)
+        )
+        get_package_collection(db, package_name, "crash_occurrences").update_one(bucket_filter, bucket_update, upsert=True)
+
+        rollups = RollupAccumulator()
+        rollups.add_crash(crash_filter['crash_signature'], timestamp)
+        write_rollups(db, package_name, rollups)
+
+        sketches = SketchAccumulator()
+        sketches.add_crash(crash_filter['crash_signature'], data.get('user_id'), timestamp)
+        write_sketches(db, package_name, sketches)
+
+        response_cache.invalidate_package(package_name)
 
-            print(f"✅ Updated existing crash: {error_type} (Count: {existing_crash['count'] + 1})")
+        if crash['count'] > 1:
+            print(f"✅ Updated existing crash: {error_type} (Count: {crash['count']})")
 
             return create_success_response(
                 "Crash report updated successfully",
                 {
-                    "crash_id": existing_crash['_id'],
+                    "crash_id": crash['_id'],
                     "action": "updated",
-                    "count": existing_crash['count'] + 1
+                    "count": crash['count']
                 }
             )
 
         else:
-            # Create new crash document
-            crash_doc = {
-                "_id": str(uuid.uuid4()),
-                "crash_signature": crash_signature,
-                "error_type": error_type,
-                "error_message": error_message,
-                "stack_trace": data.get('stack_trace', ''),
-                "count": 1,
-                "first_seen": timestamp,
-                "last_seen": timestamp,
-                "device_info": data.get('device_info', {}),
-                "occurrences": [
-                    {
-                        "timestamp": timestamp,
-                        "user_id": data.get('user_id'),
-                        "session_id": data.get('session_id'),
-                        "device_info": data.get('device_info', {})
-                    }
-                ],
-                "created_at": datetime.now(),
-                "updated_at": datetime.now()
-            }
-
-            crashes_collection.insert_one(crash_doc)
             print(f"✅ Logged new crash: {error_type}")
 
             return create_success_response(
                 "Crash report logged successfully",
                 {
-                    "crash_id": crash_doc['_id'],
+                    "crash_id": crash['_id'],
                     "action": "created"
                 },
                 201
@@ -124,6 +120,63 @@ def log_crash():
         return create_error_response(f"Failed to log crash: {str(e)}")
 
 
+def build_crash_signature(error_type, error_message):
+    """Create the grouping key shared by all occurrences of the same crash"""
+    return f"{error_type}:{error_message}"
+
+
+def build_crash_occurrence(data, timestamp):
+    """Build a single crash occurrence entry from a crash payload"""
+    return {
+        "timestamp": timestamp,
+        "user_id": data.get('user_id'),
+        "session_id": data.get('session_id'),
+        "device_info": data.get('device_info', {})
+    }
+
+
+def build_crash_upsert(data, timestamp):
+    """
+    Build the (filter, update) pair that groups a crash payload into its crash document
+
+    A new crash document is created if the signature has not been seen yet,
+    otherwise the existing one is incremented in the same operation. The
+    occurrence itself goes to the bucketed occurrences collection.
+    """
+    error_type = data['error_type']
+    error_message = data.get('error_message', 'No message provided')
+    crash_signature = build_crash_signature(error_type, error_message)
+
+    crash_filter = {"crash_signature": crash_signature}
+    crash_update = {
+        "$inc": {"count": 1},
+        "$min": {"first_seen": timestamp},
+        "$max": {"last_seen": timestamp},
+        "$set": {"updated_at": datetime.now()},
+        "$setOnInsert": {
+            "_id": str(uuid.uuid4()),
+            "error_type": error_type,
+            "error_message": error_message,
+            "stack_trace": data.get('stack_trace', ''),
+            "device_info": data.get('device_info', {}),
+            "created_at": datetime.now()
+        }
+    }
+
+    return crash_filter, crash_update
+
+
+def upsert_crash(crashes_collection, crash_filter, crash_update):
+    """Apply a crash upsert and return the crash's _id and new count"""
+    return crashes_collection.find_one_and_update(
+        crash_filter,
+        crash_update,
+        projection={"_id": 1, "count": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
 @crashes_blueprint.route('/crashes/<package_name>', methods=['GET'])
 def get_crashes(package_name):
     """Get crash reports for a specific package"""
@@ -138,30 +191,26 @@ def get_crashes(package_name):
         if not is_connected:
             return error_response
 
-        # Get query parameters
-        limit = int(request.args.get('limit', 50))
-        sort_by = request.args.get('sort_by', 'last_seen')  # 'last_seen', 'count', 'first_seen'
+        # Get query parameters (pass next_cursor back as ?cursor= for the next page)
+        try:
+            limit, cursor = parse_page_args(request.args, default_limit=50)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
 
-        # Get crashes from package-specific collection
-        crashes_collection = db[f"{package_name}_crashes"]
-        crashes = list(crashes_collection.find({})
-                       .sort(sort_by, -1)
-                       .limit(limit))
+        sort_by = request.args.get('sort_by', 'last_seen')
+        if sort_by not in CRASH_SORT_FIELDS:
+            return create_error_response(f"sort_by must be one of: {', '.join(CRASH_SORT_FIELDS)}", 400)
 
-        # Convert timestamps to ISO format
-        timestamp_fields = ['first_seen', 'last_seen', 'created_at', 'updated_at']
-        for crash in crashes:
-            format_timestamps_in_document(crash, timestamp_fields)
-
-            # Also format timestamps in occurrences
-            for occurrence in crash.get('occurrences', []):
-                if 'timestamp' in occurrence:
-                    occurrence['timestamp'] = occurrence['timestamp'].isoformat()
+        # Get crashes from package-specific collection
+        crashes_collection = get_package_collection(db, package_name, "crashes")
+        crashes, next_cursor = paginate(crashes_collection, {}, sort_by, limit, cursor)
 
         return jsonify({
             "package_name": package_name,
             "crashes": crashes,
-            "count": len(crashes)
+            "count": len(crashes),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }), 200
 
     except Exception as e:
@@ -169,8 +218,20 @@ def get_crashes(package_name):
 
 
 @crashes_blueprint.route('/crashes/<package_name>/stats', methods=['GET'])
+@response_cache.cached("crash_stats")
 def get_crash_stats(package_name):
-    """Get crash statistics with trend analysis"""
+    """
+    Get crash statistics with trend analysis
+
+    Users affected are approximate (HyperLogLog sketches); pass exact=true
+    to count them exactly from the occurrences, e.g. for audits.
+
+    The device patterns, crash types, top crashes and recent crashes cover
+    the chart range (at least the last two weeks, for the recent crashes'
+    week-over-week trend). Top crashes by impact are ranked among the
+    CRASH_STATS_MAX_SIGNATURES most frequent crashes in that range, so a
+    rarer crash with many users affected can be left out.
+    """
 
     print(f"📊 Generating enhanced crash statistics for: {package_name}")
 
@@ -182,44 +243,80 @@ def get_crash_stats(package_name):
         if not is_connected:
             return error_response
 
-        crashes_collection = db[f"{package_name}_crashes"]
-        sessions_collection = db[f"{package_name}_sessions"]
+        # Chart range, e.g. ?periods=30&granularity=day&timezone=Europe/Berlin
+        try:
+            start, end, granularity, timezone_name = parse_series_args(request.args)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
 
-        total_crash_types = crashes_collection.count_documents({})
+        exact = request.args.get('exact', 'false').lower() == 'true'
 
-        # Get total crash occurrences
-        total_crashes_pipeline = [
-            {"$group": {"_id": None, "total": {"$sum": "$count"}}}
-        ]
-        total_crashes_result = list(crashes_collection.aggregate(total_crashes_pipeline))
-        total_crashes = total_crashes_result[0]['total'] if total_crashes_result else 0
+        crash_stats = build_crash_stats(db, package_name, start, end, granularity, timezone_name, exact)
 
-        # Calculate crash rate vs sessions
-        total_sessions = sessions_collection.count_documents({})
-        crash_rate = calculate_crash_rate(total_crashes, total_sessions)
+        return jsonify({"package_name": package_name, **crash_stats}), 200
 
-        # Enhanced analytics
-        daily_crash_trends = get_daily_crash_trends(crashes_collection)
-        crash_rate_trends = get_crash_rate_trends(crashes_collection, sessions_collection)
-        device_crash_patterns = get_device_crash_patterns(crashes_collection)
-        top_crashes_by_impact = get_top_crashes_by_impact(crashes_collection)
+    except Exception as e:
+        return create_error_response(f"Failed to get crash statistics: {str(e)}")
 
-        recent_crashes = get_recent_crashes_formatted(crashes_collection)
 
-        return jsonify({
-            "package_name": package_name,
-            "total_crash_types": total_crash_types,
-            "total_crashes": total_crashes,
-            "crash_rate": crash_rate,
-            "daily_crash_trends": daily_crash_trends,
-            "crash_rate_trends": crash_rate_trends,
-            "device_crash_patterns": device_crash_patterns,
-            "top_crashes_by_impact": top_crashes_by_impact,
-            "recent_crashes": recent_crashes
-        }), 200
+def build_crash_stats(db, package_name, start, end, granularity="day", timezone_name=None, exact=False):
+    """
+    Build the crash statistics payload for a chart range
 
-    except Exception as e:
-        return create_error_response(f"Failed to get crash statistics: {str(e)}")
+    Every occurrence-based section comes from one aggregation over the
+    occurrence buckets; totals and trends come from the rollups. Users
+    affected come from the user sketches unless exact is set.
+    """
+    crashes_collection = get_package_collection(db, package_name, "crashes")
+    occurrences_collection = get_package_collection(db, package_name, "crash_occurrences")
+    rollups_collection = get_package_collection(db, package_name, "rollups")
+
+    crash_facets = get_crash_facets(occurrences_collection, crashes_collection.name, start, exact)
+
+    # Recent crashes outside the most frequent signatures still need their users affected
+    signature_ids = [signature['_id'] for signature in crash_facets['signatures']]
+    known_ids = set(signature_ids)
+    recent_only_ids = [result['_id'] for result in crash_facets['recent'] if result['_id'] not in known_ids]
+
+    if exact:
+        users_affected = {signature['_id']: signature['users_affected'] for signature in crash_facets['signatures']}
+        if recent_only_ids:
+            users_affected.update(get_exact_crash_users(occurrences_collection, recent_only_ids))
+    else:
+        # Approximate unique users per crash, one small sketch read per signature
+        sketches_collection = get_package_collection(db, package_name, "user_sketches")
+        users_affected = get_unique_user_counts(sketches_collection, "crash_users", signature_ids + recent_only_ids)
+        for signature in crash_facets['signatures']:
+            signature['users_affected'] = users_affected[signature['_id']]
+
+    # Get total crash occurrences and sessions (for the crash rate) in one read
+    totals = get_rollup_totals(rollups_collection, ["crashes", "sessions"])
+    total_crashes = totals["crashes"]
+    crash_rate = calculate_crash_rate(total_crashes, totals["sessions"])
+
+    # Enhanced analytics (each series is read once and shared by both trend charts)
+    crash_series = get_rollup_time_series(rollups_collection, "crashes", start, end, granularity, timezone_name)
+    session_series = get_rollup_time_series(rollups_collection, "sessions", start, end, granularity, timezone_name)
+
+    daily_crash_trends = get_daily_crash_trends(crash_series)
+    crash_rate_trends = get_crash_rate_trends(session_series, crash_series)
+    device_crash_patterns = get_device_crash_patterns(crash_facets['devices'])
+    top_crashes_by_impact = get_top_crashes_by_impact(crash_facets['signatures'])
+
+    recent_crashes = get_recent_crashes_formatted(crash_facets['recent'], users_affected)
+
+    signature_count = crash_facets['signature_count'][0]['total'] if crash_facets['signature_count'] else 0
+
+    return {
+        "total_crash_types": signature_count,
+        "total_crashes": total_crashes,
+        "crash_rate": crash_rate,
+        "daily_crash_trends": daily_crash_trends,
+        "crash_rate_trends": crash_rate_trends,
+        "device_crash_patterns": device_crash_patterns,
+        "top_crashes_by_impact": top_crashes_by_impact,
+        "recent_crashes": recent_crashes
+    }
 
 
 def calculate_crash_rate(total_crashes, total_sessions):
@@ -231,134 +328,244 @@ def calculate_crash_rate(total_crashes, total_sessions):
         return "0%"
 
 
-def get_daily_crash_trends(crashes_collection):
+def get_crash_facets(occurrences_collection, crashes_collection_name, start, exact=False):
     """
-    Get daily crash trends over the last 30 days INCLUDING TODAY
+    Compute every occurrence-based crash section in one aggregation
+
+    Only buckets from `start` (or the last two weeks, if that is longer) are
+    read, through the bucket_start index, so the cost follows the chart range
+    rather than the package's whole crash history.
+
+    With exact, the buckets are unwound once by user to count unique users
+    per crash; each facet reads the unwound rows. A bucket's counters are
+    taken from its first row only (user_index 0, or null for a bucket without
+    users), so they are not multiplied by its number of users. Otherwise the
+    buckets are read as they are and users_affected is left out.
+
+    Every facet is limited and no facet carries whole occurrence arrays, so
+    the single result document stays small whatever the number of crashes.
+
+    Returns:
+        dict: Facet results -
+              devices: [{_id: device, crash_count, unique_crashes}] (top 10)
+              signatures: [{_id: crash_signature, error_type, count, users_affected (exact only)}]
+                          (the CRASH_STATS_MAX_SIGNATURES most frequent in the range)
+              signature_count: [{total}] (number of distinct signatures in the range)
+              recent: [{_id: crash_signature, recent, previous, crash: [crash document],
+                        latest_bucket: [{occurrences}]}] (10 most recently seen, with the
+                        last RECENT_CRASH_OCCURRENCES occurrences of their latest bucket)
     """
+    week_ago = datetime.now() - timedelta(days=7)
+    two_weeks_ago = week_ago - timedelta(days=7)
+
+    # Buckets start on the hour; the recent facet compares the last two weeks
+    range_start = min(to_utc_naive(start).replace(minute=0, second=0, microsecond=0), two_weeks_ago)
+
+    projection = {
+        "crash_signature": 1,
+        "error_type": 1,
+        "bucket_start": 1,
+        "count": 1,
+        "device_counts": 1,
+        # Kept up to date at ingest; buckets written before that fall back to their hour
+        "last_seen": {"$ifNull": ["$last_seen", "$bucket_start"]}
+    }
+    stages = [
+        {"$match": {"bucket_start": {"$gte": range_start}}},
+        {"$project": projection}
+    ]
 
-    # Count crash occurrences by day using the occurrences array
-    pipeline = [
-        {"$unwind": "$occurrences"},
+    if exact:
+        projection["user_ids"] = 1
+        stages.append(
+            {"$unwind": {"path": "$user_ids", "includeArrayIndex": "user_index", "preserveNullAndEmptyArrays": True}}
+        )
+
+        first_row_only = {"$lte": ["$user_index", 0]}  # null (no users) sorts before 0
+        bucket_count = {"$cond": [first_row_only, "$count", 0]}
+        first_rows_stage = [{"$match": {"user_index": {"$not": {"$gt": 0}}}}]
+        signature_stages = [
+            {
+                "$group": {
+                    "_id": {"crash_signature": "$crash_signature", "user_id": "$user_ids"},
+                    "error_type": {"$first": "$error_type"},
+                    "count": {"$sum": bucket_count}
+                }
+            },
+            {
+                "$group": {
+                    "_id": "$_id.crash_signature",
+                    "error_type": {"$first": "$error_type"},
+                    "count": {"$sum": "$count"},
+                    "users_affected": {"$sum": {"$cond": [{"$gt": ["$_id.user_id", None]}, 1, 0]}}
+                }
+            }
+        ]
+    else:
+        bucket_count = "$count"
+        first_rows_stage = []
+        signature_stages = [
+            {"$group": {"_id": "$crash_signature", "error_type": {"$first": "$error_type"}, "count": {"$sum": "$count"}}}
+        ]
+
+    pipeline = stages + [
         {
-            "$group": {
-                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$occurrences.timestamp"}},
-                "crash_count": {"$sum": 1}
+            "$facet": {
+                # Crashes by device model, from the per-bucket device counters
+                "devices": first_rows_stage + [
+                    {"$project": {"error_type": 1, "devices": {"$objectToArray": "$device_counts"}}},
+                    {"$unwind": "$devices"},
+                    {
+                        "$group": {
+                            "_id": "$devices.k",
+                            "crash_count": {"$sum": "$devices.v"},
+                            "unique_crashes": {"$addToSet": "$error_type"}
+                        }
+                    },
+                    {"$sort": {"crash_count": -1}},
+                    {"$limit": 10}
+                ],
+                # Occurrences (and exact unique users) per crash signature
+                "signatures": signature_stages + [
+                    {"$sort": {"count": -1, "_id": 1}},
+                    {"$limit": CRASH_STATS_MAX_SIGNATURES}
+                ],
+                "signature_count": first_rows_stage + [
+                    {"$group": {"_id": "$crash_signature"}},
+                    {"$count": "total"}
+                ],
+                # The 10 most recently seen crashes, with their details and latest bucket
+                "recent": [
+                    {
+                        "$group": {
+                            "_id": "$crash_signature",
+                            "last_seen": {"$max": "$last_seen"},
+                            "recent": {"$sum": {"$cond": [{"$gte": ["$bucket_start", week_ago]}, bucket_count, 0]}},
+                            "previous": {
+                                "$sum": {
+                                    "$cond": [
+                                        {"$and": [{"$gte": ["$bucket_start", two_weeks_ago]},
+                                                  {"$lt": ["$bucket_start", week_ago]}]},
+                                        bucket_count,
+                                        0
+                                    ]
+                                }
+                            }
+                        }
+                    },
+                    {"$sort": {"last_seen": -1}},
+                    {"$limit": 10},
+                    {
+                        "$lookup": {
+                            "from": crashes_collection_name,
+                            "let": {"crash_signature": "$_id"},
+                            "pipeline": [
+                                {"$match": {"$expr": {"$eq": ["$crash_signature", "$$crash_signature"]}}},
+                                # Leaves out any legacy embedded occurrences array
+                                {
+                                    "$project": {
+                                        "error_type": 1, "error_message": 1, "stack_trace": 1, "device_info": 1,
+                                        "count": 1, "first_seen": 1, "last_seen": 1
+                                    }
+                                }
+                            ],
+                            "as": "crash"
+                        }
+                    },
+                    {
+                        "$lookup": {
+                            "from": occurrences_collection.name,
+                            "let": {"crash_signature": "$_id"},
+                            "pipeline": [
+                                {"$match": {"$expr": {"$eq": ["$crash_signature", "$$crash_signature"]}}},
+                                {"$sort": {"bucket_start": -1}},
+                                {"$limit": 1},
+                                {"$project": {"_id": 0, "occurrences": {"$slice": ["$occurrences", -RECENT_CRASH_OCCURRENCES]}}}
+                            ],
+                            "as": "latest_bucket"
+                        }
+                    }
+                ]
             }
-        },
-        {"$sort": {"_id": 1}}
+        }
     ]
 
-    results = list(crashes_collection.aggregate(pipeline))
+    results = list(occurrences_collection.aggregate(pipeline, allowDiskUse=True))
+    return results[0] if results else {"devices": [], "signatures": [], "signature_count": [], "recent": []}
 
-    # Convert to dictionary for easy lookup
-    crash_counts_by_date = {item['_id']: item['crash_count'] for item in results}
 
-    # Fill in ALL days from 29 days ago to today
-    trend_data = []
-    for i in range(29, -1, -1):
-        date = datetime.now() - timedelta(days=i)
-        date_str = date.strftime("%Y-%m-%d")
+def get_exact_crash_users(occurrences_collection, crash_signatures):
+    """
+    Count the distinct users of some crashes from their occurrence buckets
+
+    Returns:
+        dict: crash_signature -> number of unique users
+    """
+    pipeline = [
+        {"$match": {"crash_signature": {"$in": crash_signatures}}},
+        {"$unwind": "$user_ids"},
+        {"$group": {"_id": {"crash_signature": "$crash_signature", "user_id": "$user_ids"}}},
+        {"$group": {"_id": "$_id.crash_signature", "users_affected": {"$sum": 1}}}
+    ]
 
-        # Get crash count for this date (0 if no crashes)
-        crash_count = crash_counts_by_date.get(date_str, 0)
+    users_affected = dict.fromkeys(crash_signatures, 0)
+    for item in occurrences_collection.aggregate(pipeline, allowDiskUse=True):
+        users_affected[item['_id']] = item['users_affected']
+    return users_affected
 
-        trend_data.append({
-            "date": date_str,
-            "crashes": crash_count
-        })
 
-    print(
-        f"📈 Daily crash trends calculated for {len(trend_data)} days (including today: {datetime.now().strftime('%Y-%m-%d')})")
+def get_daily_crash_trends(crash_series):
+    """
+    Get crash trends per period over the chart range INCLUDING the current period
+    """
+
+    # Crash occurrences per period from the rollups, with empty periods as 0
+    trend_data = [
+        {"date": item['period'], "crashes": item['count']}
+        for item in crash_series
+    ]
+
+    print(f"📈 Crash trends calculated for {len(trend_data)} periods")
     return trend_data
 
 
-def get_crash_rate_trends(crashes_collection, sessions_collection):
+def get_crash_rate_trends(session_series, crash_series):
     """
     Calculate crash rate trends over time
 
-    This shows crash rate percentage per day
+    This shows crash rate percentage per period
 
     Helps identify if app stability is improving or declining
     """
 
-    # Get daily session counts
-    session_pipeline = [
-        {
-            "$group": {
-                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$start_time"}},
-                "session_count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"_id": 1}},
-        {"$limit": 30}
-    ]
-
-    daily_sessions = {item['_id']: item['session_count']
-                      for item in sessions_collection.aggregate(session_pipeline)}
-
-    # Get daily crash counts
-    crash_pipeline = [
-        {"$unwind": "$occurrences"},
-        {
-            "$group": {
-                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$occurrences.timestamp"}},
-                "crash_count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"_id": 1}},
-        {"$limit": 30}
-    ]
-
-    daily_crashes = {item['_id']: item['crash_count']
-                     for item in crashes_collection.aggregate(crash_pipeline)}
-
-    # Calculate crash rate for each day
+    # Calculate crash rate for each period (same periods in both series)
     rate_trends = []
-    for i in range(30, 0, -1):
-        date = datetime.now() - timedelta(days=i)
-        date_str = date.strftime("%Y-%m-%d")
-
-        crashes = daily_crashes.get(date_str, 0)
-        sessions = daily_sessions.get(date_str, 0)
+    for session_item, crash_item in zip(session_series, crash_series):
+        crashes = crash_item['count']
+        sessions = session_item['count']
 
         crash_rate = (crashes / sessions * 100) if sessions > 0 else 0
 
         rate_trends.append({
-            "date": date_str,
+            "date": session_item['period'],
             "crash_rate": round(crash_rate, 2)
         })
 
-    print(f"📊 Crash rate trends calculated for {len(rate_trends)} days")
+    print(f"📊 Crash rate trends calculated for {len(rate_trends)} periods")
     return rate_trends
 
 
-def get_device_crash_patterns(crashes_collection):
+def get_device_crash_patterns(device_results):
     """
     Analyze which devices/OS versions crash most
 
     This helps identify problematic device configurations
     """
 
-    # Crashes by device model
-    device_pipeline = [
-        {"$unwind": "$occurrences"},
-        {
-            "$group": {
-                "_id": "$occurrences.device_info.model",
-                "crash_count": {"$sum": 1},
-                "unique_crashes": {"$addToSet": "$error_type"}
-            }
-        },
-        {"$sort": {"crash_count": -1}},
-        {"$limit": 10}
-    ]
-
-    device_results = list(crashes_collection.aggregate(device_pipeline))
-
     # Format for frontend charts
     device_patterns = [
         {
-            "name": item['_id'] or "Unknown Device",
+            "name": item['_id'] or UNKNOWN_DEVICE,
             "value": item['crash_count'],
             "unique_types": len(item['unique_crashes'])
         }
@@ -369,65 +576,57 @@ def get_device_crash_patterns(crashes_collection):
     return device_patterns
 
 
-def get_top_crashes_by_impact(crashes_collection):
+def get_top_crashes_by_impact(signatures):
     """
     Get top crashes ranked by impact (frequency + affected users)
 
     This prioritizes which crashes developers should fix first
     """
 
-    pipeline = [
-        {
-            "$addFields": {
-                "unique_users": {"$size": {"$setUnion": ["$occurrences.user_id"]}},
-                "impact_score": {"$multiply": ["$count", {"$size": {"$setUnion": ["$occurrences.user_id"]}}]}
-            }
-        },
-        {"$sort": {"impact_score": -1}},
-        {"$limit": 10}
-    ]
-
-    results = list(crashes_collection.aggregate(pipeline))
-
-    # Format for frontend
-    top_crashes = [
+    ranked = [
         {
-            "name": f"{item['error_type'][:30]}...",
-            "value": item['count'],
-            "users_affected": item['unique_users'],
-            "impact_score": item['impact_score']
+            "name": f"{signature['error_type'][:30]}...",
+            "value": signature['count'],
+            "users_affected": signature['users_affected'],
+            "impact_score": signature['count'] * signature['users_affected']
         }
-        for item in results
+        for signature in signatures
     ]
 
+    top_crashes = sorted(ranked, key=lambda item: item['impact_score'], reverse=True)[:10]
+
     print(f"🎯 Top crashes by impact: {len(top_crashes)} crashes ranked")
     return top_crashes
 
 
-def get_recent_crashes_formatted(crashes_collection):
-    """Get recent crashes formatted for table display with enhanced details"""
+def get_recent_crashes_formatted(recent_results, users_affected_by_crash):
+    """
+    Get recent crashes formatted for table display with enhanced details
 
-    top_crashes = list(crashes_collection.find({})
-                       .sort("last_seen", -1)
-                       .limit(10))
+    Args:
+        recent_results (list): The "recent" facet of get_crash_facets
+        users_affected_by_crash (dict): crash_signature -> number of unique users
+    """
 
     # Format for frontend display
     recent_crashes = []
-    for crash in top_crashes:
+    for result in recent_results:
+        if not result['crash']:
+            continue
+
+        crash = result['crash'][0]
+        crash_signature = result['_id']
+        occurrences = result['latest_bucket'][0].get('occurrences', []) if result['latest_bucket'] else []
+
         device_model = "Unknown"
         if crash.get('device_info') and crash['device_info'].get('model'):
             device_model = crash['device_info']['model']
-        elif crash.get('occurrences') and len(crash['occurrences']) > 0:
-            latest_occurrence = crash['occurrences'][-1]
+        elif occurrences:
+            latest_occurrence = occurrences[-1]
             if latest_occurrence.get('device_info') and latest_occurrence['device_info'].get('model'):
                 device_model = latest_occurrence['device_info']['model']
 
-        # Calculate users affected (unique user_ids in occurrences)
-        unique_users = set()
-        for occurrence in crash.get('occurrences', []):
-            if occurrence.get('user_id'):
-                unique_users.add(occurrence['user_id'])
-        users_affected = len(unique_users)
+        users_affected = users_affected_by_crash.get(crash_signature, 0)
 
         # Calculate impact score (frequency × unique users)
         impact_score = crash['count'] * users_affected
@@ -441,45 +640,26 @@ def get_recent_crashes_formatted(crashes_collection):
             "count": crash['count'],
             "lastSeen": format_time_ago(crash['last_seen']),
             "first_seen": crash['first_seen'].isoformat() if crash.get('first_seen') else None,
-            "trend": get_crash_trend_indicator(crash),
+            "trend": get_crash_trend_indicator(result['recent'], result['previous']),
             "crash_id": crash['_id'],
             "users_affected": users_affected,
             "impact_score": impact_score,
-            "occurrences": crash.get('occurrences', [])
+            "occurrences": occurrences
         })
 
     return recent_crashes
 
 
-def get_crash_trend_indicator(crash):
+
+def get_crash_trend_indicator(recent_count, previous_count):
     """
     Determine if crash is trending up, down, or stable
 
-    Analyzes recent occurrences to show trend direction
+    Compares occurrences in the last 7 days with the previous 7 days
     """
-    occurrences = crash.get('occurrences', [])
-
-    if len(occurrences) < 2:
+    if recent_count + previous_count < 2:
         return "stable"
 
-    # Look at recent occurrences (last 7 days vs previous 7 days)
-    now = datetime.now()
-    week_ago = now - timedelta(days=7)
-    two_weeks_ago = now - timedelta(days=14)
-
-    recent_count = 0
-    previous_count = 0
-
-    for occurrence in occurrences:
-        timestamp = occurrence.get('timestamp')
-        if isinstance(timestamp, str):
-            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-
-        if timestamp >= week_ago:
-            recent_count += 1
-        elif timestamp >= two_weeks_ago:
-            previous_count += 1
-
     if recent_count > previous_count:
         return "increasing"
     elif recent_count < previous_count:
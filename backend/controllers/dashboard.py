@@ -0,0 +1,141 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from response_cache import response_cache
+from time_series import parse_series_args
+from pagination import parse_page_args
+from controllers.events import build_event_stats, build_events_page
+from controllers.users import build_user_stats
+from controllers.sessions import build_session_stats
+from controllers.crashes import build_crash_stats
+from validation_utils import (
+    check_database_connection,
+    create_error_response
+)
+
+dashboard_blueprint = Blueprint('dashboard', __name__)
+
+# Sections are independent MongoDB reads - run them side by side on the shared client
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", "5"))
+dashboard_pool = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+
+# Recent events shown in the Recent Activity table
+RECENT_EVENTS_LIMIT = 50
+
+
+def _build_recent_events(db, package_name, args):
+    limit = args['events_limit']
+    return build_events_page(db, package_name, {}, limit)
+
+
+def _build_stats(build, supports_exact=False):
+    def build_section(db, package_name, args):
+        options = {"exact": args['exact']} if supports_exact else {}
+        return build(db, package_name, args['start'], args['end'], args['granularity'], args['timezone_name'],
+                     **options)
+    return build_section
+
+
+# Section name -> builder(db, package_name, args)
+DASHBOARD_SECTIONS = {
+    "event_stats": _build_stats(build_event_stats, supports_exact=True),
+    "events": _build_recent_events,
+    "user_stats": _build_stats(build_user_stats),
+    "session_stats": _build_stats(build_session_stats),
+    "crash_stats": _build_stats(build_crash_stats, supports_exact=True)
+}
+
+
+@dashboard_blueprint.route('/dashboard/<package_name>', methods=['GET'])
+@response_cache.cached("dashboard")
+def get_dashboard(package_name):
+    """
+    Get every dashboard section in one response, computed concurrently
+
+    Query parameters:
+        sections: Comma-separated subset of event_stats, events, user_stats,
+                  session_stats, crash_stats (default: all)
+        limit: Number of recent events (default 50)
+        periods, granularity, timezone: Chart range, as for the stats endpoints
+        exact: "true" for exact unique users in event_stats and crash_stats
+    """
+
+    print(f"📊 Building dashboard for: {package_name}")
+
+    try:
+        sections = [name.strip() for name in request.args.get('sections', '').split(',') if name.strip()]
+        sections = sections or list(DASHBOARD_SECTIONS)
+
+        unknown_sections = [name for name in sections if name not in DASHBOARD_SECTIONS]
+        if unknown_sections:
+            return create_error_response(
+                f"Unknown sections: {', '.join(unknown_sections)}. "
+                f"Available: {', '.join(DASHBOARD_SECTIONS)}",
+                400
+            )
+
+        try:
+            start, end, granularity, timezone_name = parse_series_args(request.args)
+            events_limit, _ = parse_page_args(request.args, default_limit=RECENT_EVENTS_LIMIT)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+
+        db = AnalyticsConnectionHolder.get_db()
+
+        # Database connection check (once for every section)
+        is_connected, error_response = check_database_connection(db)
+        if not is_connected:
+            return error_response
+
+        args = {
+            "start": start,
+            "end": end,
+            "granularity": granularity,
+            "timezone_name": timezone_name,
+            "events_limit": events_limit,
+            "exact": request.args.get('exact', 'false').lower() == 'true'
+        }
+
+        def run_section(name):
+            started = time.perf_counter()
+            try:
+                return DASHBOARD_SECTIONS[name](db, package_name, args), None, time.perf_counter() - started
+            except Exception as e:
+                return None, str(e), time.perf_counter() - started
+
+        started = time.perf_counter()
+        futures = {name: dashboard_pool.submit(run_section, name) for name in dict.fromkeys(sections)}
+
+        payload = {"package_name": package_name}
+        timings = {}
+        errors = {}
+        for name, future in futures.items():
+            result, error, elapsed = future.result()
+            timings[name] = round(elapsed * 1000, 1)
+            if error is None:
+                payload[name] = result
+            else:
+                errors[name] = error
+
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        slowest = max(timings, key=timings.get)
+        print(f"✅ Dashboard built in {total_ms} ms (slowest: {slowest} {timings[slowest]} ms)")
+
+        payload["timings_ms"] = {**timings, "total": total_ms}
+
+        if errors:
+            if len(errors) == len(futures):
+                return create_error_response(f"Failed to build dashboard: {'; '.join(errors.values())}")
+
+            # Keep the sections that worked, but don't cache a partial dashboard
+            payload["errors"] = errors
+            response = jsonify(payload)
+            response.cache_control.no_store = True
+            return response, 200
+
+        return jsonify(payload), 200
+
+    except Exception as e:
+        return create_error_response(f"Failed to build dashboard: {str(e)}")
@@ -2,11 +2,20 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime
 import uuid
 from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import index_manager, get_package_collection
+from event_buffer import event_buffer
+from event_display import build_display_fields
+from response_cache import response_cache
+from cohorts import cohort_tracker
+from rollups import RollupAccumulator, write_rollups, get_rollup_total, get_rollup_keys, get_rollup_time_series
+from hyperloglog import SketchAccumulator, write_sketches, get_unique_user_counts
+from heavy_hitters import top_event_tracker
+from time_series import parse_series_args
+from pagination import parse_page_args, paginate
 from validation_utils import (
     validate_required_fields,
     parse_timestamp,
     check_database_connection,
-    format_timestamps_in_document,
     create_success_response,
     create_error_response
 )
@@ -41,22 +50,33 @@ def log_event():
             return error_response
 
         # Create event document
-        event_doc = {
-            "_id": str(uuid.uuid4()),
-            "event_type": data['event_type'],
-            "user_id": data.get('user_id'),
-            "timestamp": timestamp,
-            "properties": data.get('properties', {}),
-            "session_id": data.get('session_id'),
-            "device_info": data.get('device_info', {}),
-            "created_at": datetime.now()
-        }
+        event_doc = build_event_document(data, timestamp)
 
         # Store in package-specific collection
         package_name = data['package_name']
-        events_collection = db[f"{package_name}_events"]
-        result = events_collection.insert_one(event_doc)
-        print(f"✅ Event stored successfully with ID: {event_doc['_id']}")
+        collection_name = f"{package_name}_events"
+        index_manager.ensure_indexes(db, collection_name)
+
+        if event_buffer.enabled:
+            # Buffered mode: queue for a bulk write instead of waiting on MongoDB
+            if not event_buffer.enqueue(collection_name, event_doc):
+                return create_error_response("Event buffer is full, please retry later", 503)
+            print(f"✅ Event queued with ID: {event_doc['_id']}")
+        else:
+            db[collection_name].insert_one(event_doc)
+            print(f"✅ Event stored successfully with ID: {event_doc['_id']}")
+
+            rollups = RollupAccumulator()
+            rollups.add_event(event_doc['event_type'], timestamp)
+            write_rollups(db, package_name, rollups)
+
+            sketches = SketchAccumulator()
+            sketches.add_event(event_doc['event_type'], event_doc['user_id'], timestamp)
+            write_sketches(db, package_name, sketches)
+            top_event_tracker.record(package_name, [event_doc['event_type']])
+
+            cohort_tracker.record_activity(db, package_name, [(event_doc['user_id'], timestamp)])
+            response_cache.invalidate_package(package_name)
 
         return create_success_response(
             "Event logged successfully",
@@ -71,6 +91,79 @@ def log_event():
         return create_error_response(f"Failed to log event: {str(e)}")
 
 
+def build_event_document(data, timestamp):
+    """Build the MongoDB document for an event payload"""
+    event_doc = {
+        "_id": str(uuid.uuid4()),
+        "event_type": data['event_type'],
+        "user_id": data.get('user_id'),
+        "timestamp": timestamp,
+        "properties": data.get('properties', {}),
+        "session_id": data.get('session_id'),
+        "device_info": data.get('device_info', {}),
+        "created_at": datetime.now()
+    }
+
+    # Precompute the Recent Activity display fields so reads don't format every event
+    event_doc.update(build_display_fields(event_doc))
+    return event_doc
+
+
+@events_blueprint.route('/events/buffer/metrics', methods=['GET'])
+def get_event_buffer_metrics():
+    """Get queue depth and flush latency for the buffered ingest mode"""
+    return jsonify(event_buffer.get_metrics()), 200
+
+
+@events_blueprint.route('/events/top/metrics', methods=['GET'])
+def get_top_events_metrics():
+    """Get snapshot counters of the streaming top event types"""
+    return jsonify(top_event_tracker.get_metrics()), 200
+
+
+@events_blueprint.route('/events/<package_name>/top', methods=['GET'])
+def get_top_events(package_name):
+    """
+    Get the most frequent event types from the streaming top-k summary
+
+    Query params:
+        k: Number of event types (default 10, at most the summary capacity)
+
+    Counts are upper bounds; the true count of each event type lies between
+    lower_bound and count.
+    """
+
+    try:
+        try:
+            k = int(request.args.get('k', 10))
+        except ValueError:
+            return create_error_response("k must be an integer", 400)
+
+        if not 1 <= k <= top_event_tracker.capacity:
+            return create_error_response(f"k must be between 1 and {top_event_tracker.capacity}", 400)
+
+        db = AnalyticsConnectionHolder.get_db()
+
+        # Database connection check
+        is_connected, error_response = check_database_connection(db)
+        if not is_connected:
+            return error_response
+
+        summary, snapshot_at = top_event_tracker.get_summary(db, package_name)
+
+        return jsonify({
+            "package_name": package_name,
+            "top_events": summary.top(k),
+            "total_events": summary.total,
+            "capacity": summary.capacity,
+            "max_error": summary.total // summary.capacity,
+            "snapshot_at": snapshot_at
+        }), 200
+
+    except Exception as e:
+        return create_error_response(f"Failed to get top events: {str(e)}")
+
+
 @events_blueprint.route('/events/<package_name>', methods=['GET'])
 def get_events(package_name):
     """Get all events for a specific package"""
@@ -85,8 +178,11 @@ def get_events(package_name):
         if not is_connected:
             return error_response
 
-        # Get query parameters for filtering
-        limit = int(request.args.get('limit', 100))
+        # Get query parameters for filtering (pass next_cursor back as ?cursor= for the next page)
+        try:
+            limit, cursor = parse_page_args(request.args)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
         event_type = request.args.get('event_type')
 
         # Build query filter
@@ -94,53 +190,23 @@ def get_events(package_name):
         if event_type:
             query_filter['event_type'] = event_type
 
-        # Get events from package-specific collection
-        events_collection = db[f"{package_name}_events"]
-        events = list(events_collection.find(query_filter)
-                      .sort("timestamp", -1)
-                      .limit(limit))
-
-        # Convert timestamps to ISO format AND add display formatting
-        timestamp_fields = ['timestamp', 'created_at']
-        for event in events:
-            format_timestamps_in_document(event, timestamp_fields)
-
-            # Add display formatting for Recent Activity table
-            if 'timestamp' in event:
-                timestamp_obj = datetime.fromisoformat(event['timestamp'].replace('Z', '+00:00'))
-                event['full_date'] = timestamp_obj.strftime('%Y-%m-%d')
-                event['time_only'] = timestamp_obj.strftime('%H:%M')
-
-            # Format user display (truncate long user IDs)
-            if event.get('user_id'):
-                user_id = event['user_id']
-                event['user_display'] = user_id[:8] + '...' if len(user_id) > 8 else user_id
-            else:
-                event['user_display'] = 'Anonymous'
-
-            # Create properties preview (first 2 properties)
-            props = event.get('properties', {})
-            if props and isinstance(props, dict):
-                # Get first 2 key-value pairs
-                prop_items = list(props.items())[:2]
-                prop_preview = ', '.join([f"{k}: {v}" for k, v in prop_items])
-                event['properties_preview'] = prop_preview[:40] + '...' if len(prop_preview) > 40 else prop_preview
-            else:
-                event['properties_preview'] = 'No properties'
+        events_page = build_events_page(db, package_name, query_filter, limit, cursor)
 
-        return jsonify({
-            "package_name": package_name,
-            "events": events,
-            "count": len(events)
-        }), 200
+        return jsonify({"package_name": package_name, **events_page}), 200
 
     except Exception as e:
         return create_error_response(f"Failed to retrieve events: {str(e)}")
 
 
 @events_blueprint.route('/events/<package_name>/stats', methods=['GET'])
+@response_cache.cached("event_stats")
 def get_event_stats(package_name):
-    """Get event statistics for dashboard"""
+    """
+    Get event statistics for dashboard
+
+    Unique users per event type are approximate (HyperLogLog sketches); pass
+    exact=true to count them exactly from the raw events, e.g. for audits.
+    """
 
     print(f"📈 Generating event statistics for: {package_name}")
 
@@ -152,50 +218,88 @@ def get_event_stats(package_name):
         if not is_connected:
             return error_response
 
-        events_collection = db[f"{package_name}_events"]
-
-        # Get total event count
-        total_events = events_collection.count_documents({})
-
-        # Get events by type (for top events chart)
-        event_type_pipeline = [
-            {"$group": {"_id": "$event_type", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 10}
-        ]
-        events_by_type = list(events_collection.aggregate(event_type_pipeline))
-
-        # Format for frontend charts
-        top_events = [
-            {"name": item['_id'], "value": item['count']}
-            for item in events_by_type
-        ]
+        # Chart range, e.g. ?periods=30&granularity=day&timezone=Europe/Berlin
+        try:
+            start, end, granularity, timezone_name = parse_series_args(request.args)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
 
-        # Get events by date (for time series chart)
-        daily_events_pipeline = [
-            {
-                "$group": {
-                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
-                    "count": {"$sum": 1}
-                }
-            },
-            {"$sort": {"_id": 1}},
-            {"$limit": 30}
-        ]
-        daily_events = list(events_collection.aggregate(daily_events_pipeline))
+        exact = request.args.get('exact', 'false').lower() == 'true'
 
-        # Format for frontend charts
-        daily_chart_data = [
-            {"date": item['_id'], "events": item['count']}
-            for item in daily_events
-        ]
+        event_stats = build_event_stats(db, package_name, start, end, granularity, timezone_name, exact)
 
-        return jsonify({
-            "package_name": package_name,
-            "total_events": total_events,
-            "top_events": top_events,
-            "daily_events": daily_chart_data
-        }), 200
+        return jsonify({"package_name": package_name, **event_stats}), 200
 
     except Exception as e:
-        return create_error_response(f"Failed to get event statistics: {str(e)}")
\ No newline at end of file
+        return create_error_response(f"Failed to get event statistics: {str(e)}")
+
+
+def build_events_page(db, package_name, query_filter, limit, cursor=None):
+    """Get one page of a package's events, newest first"""
+    events_collection = get_package_collection(db, package_name, "events")
+    events, next_cursor = paginate(events_collection, query_filter, "timestamp", limit, cursor)
+
+    # Display fields are stored at ingest; fill them in for events the backfill hasn't reached yet
+    for event in events:
+        if 'user_display' not in event:
+            event.update(build_display_fields(event))
+
+    return {
+        "events": events,
+        "count": len(events),
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    }
+
+
+def build_event_stats(db, package_name, start, end, granularity="day", timezone_name=None, exact=False):
+    """Build the event statistics payload for a chart range (unique users exact or from the sketches)"""
+    # Read the counters maintained at ingest time instead of scanning raw events
+    rollups_collection = get_package_collection(db, package_name, "rollups")
+
+    # Get total event count
+    total_events = get_rollup_total(rollups_collection, "events")
+
+    # Get events by type (for top events chart), with their unique users
+    event_type_counts = get_rollup_keys(rollups_collection, "event_type", limit=10)
+    event_types = [item['key'] for item in event_type_counts]
+
+    if exact:
+        events_collection = get_package_collection(db, package_name, "events")
+        users_by_type = get_exact_unique_users(events_collection, event_types)
+    else:
+        sketches_collection = get_package_collection(db, package_name, "user_sketches")
+        users_by_type = get_unique_user_counts(sketches_collection, "event_users", event_types)
+
+    top_events = [
+        {"name": item['key'], "value": item['count'], "unique_users": users_by_type.get(item['key'], 0)}
+        for item in event_type_counts
+    ]
+
+    # Get events by date (for time series chart)
+    daily_chart_data = [
+        {"date": item['period'], "events": item['count']}
+        for item in get_rollup_time_series(rollups_collection, "events", start, end, granularity, timezone_name)
+    ]
+
+    return {
+        "total_events": total_events,
+        "top_events": top_events,
+        "daily_events": daily_chart_data
+    }
+
+
+def get_exact_unique_users(events_collection, event_types):
+    """
+    Count the distinct users of each event type from the raw events
+
+    Returns:
+        dict: event_type -> number of unique users
+    """
+    pipeline = [
+        {"$match": {"event_type": {"$in": event_types}, "user_id": {"$ne": None}}},
+        {"$group": {"_id": {"event_type": "$event_type", "user_id": "$user_id"}}},
+        {"$group": {"_id": "$_id.event_type", "unique_users": {"$sum": 1}}}
+    ]
+
+    return {item['_id']: item['unique_users'] for item in events_collection.aggregate(pipeline, allowDiskUse=True)}
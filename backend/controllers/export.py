@@ -0,0 +1,179 @@
+import os
+from datetime import datetime
+from flask import Blueprint, request, jsonify, Response, send_file, stream_with_context
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from exports import EXPORT_TYPES, EXPORT_FORMATS, iter_export
+from columnar_export import (
+    COLUMNAR_TABLES,
+    FILE_EXTENSIONS,
+    export_package,
+    get_partition_path,
+    get_table_dir,
+    is_inside_export_dir
+)
+from validation_utils import (
+    check_database_connection,
+    convert_timestamp,
+    to_utc_naive,
+    create_error_response
+)
+
+export_blueprint = Blueprint('export', __name__)
+
+
+@export_blueprint.route('/export/<package_name>/<export_type>', methods=['GET'])
+def export_data(package_name, export_type):
+    """
+    Stream a package's raw events, sessions or crash occurrences
+
+    Query parameters:
+        start, end: ISO timestamps (required), end is exclusive
+        format: "ndjson" (default) or "csv"
+        gzip: "true" to gzip the download
+    """
+
+    print(f"📤 Exporting {export_type} for package: {package_name}")
+
+    try:
+        if export_type not in EXPORT_TYPES:
+            return create_error_response(f"Export type must be one of: {', '.join(EXPORT_TYPES)}", 400)
+
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in EXPORT_FORMATS:
+            return create_error_response(f"format must be one of: {', '.join(EXPORT_FORMATS)}", 400)
+
+        compress = request.args.get('gzip', 'false').lower() == 'true'
+
+        # A time range is required so an export can't accidentally scan everything
+        if not request.args.get('start') or not request.args.get('end'):
+            return create_error_response("start and end query parameters are required", 400)
+
+        try:
+            start = to_utc_naive(convert_timestamp(request.args['start']))
+            end = to_utc_naive(convert_timestamp(request.args['end']))
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+
+        if start >= end:
+            return create_error_response("start must be before end", 400)
+
+        db = AnalyticsConnectionHolder.get_db()
+
+        # Database connection check
+        is_connected, error_response = check_database_connection(db)
+        if not is_connected:
+            return error_response
+
+        chunks = iter_export(db, package_name, export_type, start, end, export_format, compress)
+
+        def generate():
+            try:
+                yield from chunks
+                print(f"✅ Export of {export_type} for {package_name} completed")
+            except Exception as e:
+                # Headers are already sent - abort so the client sees a truncated download
+                print(f"❌ Export of {export_type} for {package_name} failed: {str(e)}")
+                raise
+
+        filename = f"{package_name}_{export_type}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.{export_format}"
+        if compress:
+            filename += ".gz"
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="application/gzip" if compress else EXPORT_FORMATS[export_format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    except Exception as e:
+        return create_error_response(f"Failed to export {export_type}: {str(e)}")
+
+
+@export_blueprint.route('/export/<package_name>/columnar', methods=['POST'])
+def export_columnar(package_name):
+    """
+    Write Parquet / Arrow IPC day partitions of a package's events and sessions
+
+    Only days changed since the last run are written unless "full" is set.
+
+    JSON body (all optional):
+        tables: ["events", "sessions"]
+        format: "parquet" (default) or "arrow"
+        full: true to rewrite every partition
+        start, end: ISO dates limiting the days written (end exclusive)
+    """
+
+    print(f"🧱 Columnar export for package: {package_name}")
+
+    try:
+        data = request.get_json(silent=True) or {}
+
+        tables = data.get('tables') or list(COLUMNAR_TABLES)
+        if not isinstance(tables, list) or any(table not in COLUMNAR_TABLES for table in tables):
+            return create_error_response(f"tables must be a list of: {', '.join(COLUMNAR_TABLES)}", 400)
+
+        export_format = data.get('format', 'parquet')
+        if export_format not in FILE_EXTENSIONS:
+            return create_error_response(f"format must be one of: {', '.join(FILE_EXTENSIONS)}", 400)
+
+        if not all(is_inside_export_dir(get_table_dir(package_name, table)) for table in tables):
+            return create_error_response("Invalid package name", 400)
+
+        try:
+            start = to_utc_naive(convert_timestamp(data['start'])) if data.get('start') else None
+            end = to_utc_naive(convert_timestamp(data['end'])) if data.get('end') else None
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+
+        db = AnalyticsConnectionHolder.get_db()
+
+        # Database connection check
+        is_connected, error_response = check_database_connection(db)
+        if not is_connected:
+            return error_response
+
+        try:
+            results = export_package(db, package_name, tables, export_format, bool(data.get('full')), start, end)
+        except ImportError as e:
+            return create_error_response(str(e), 501)
+
+        return jsonify({
+            "package_name": package_name,
+            "format": export_format,
+            "tables": results
+        }), 200
+
+    except Exception as e:
+        return create_error_response(f"Failed to export columnar data: {str(e)}")
+
+
+@export_blueprint.route('/export/<package_name>/columnar/<table>/<date>', methods=['GET'])
+def download_columnar_partition(package_name, table, date):
+    """Download one day partition written by the columnar export (?format=parquet|arrow)"""
+
+    try:
+        export_format = request.args.get('format', 'parquet')
+        if table not in COLUMNAR_TABLES or export_format not in FILE_EXTENSIONS:
+            return create_error_response("Unknown table or format", 400)
+
+        try:
+            day = datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            return create_error_response("date must be formatted YYYY-MM-DD", 400)
+
+        path = os.path.abspath(get_partition_path(package_name, table, day, export_format))
+        if not is_inside_export_dir(path):
+            return create_error_response("Invalid package name", 400)
+        if not os.path.exists(path):
+            return create_error_response("Partition not exported yet", 404)
+
+        return send_file(
+            path,
+            mimetype="application/vnd.apache.parquet" if export_format == "parquet"
+            else "application/vnd.apache.arrow.file",
+            as_attachment=True,
+            download_name=f"{package_name}_{table}_{date}.{FILE_EXTENSIONS[export_format]}"
+        )
+
+    except Exception as e:
+        return create_error_response(f"Failed to download partition: {str(e)}")
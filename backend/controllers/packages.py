@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 
 from mongodb_connection_manager import AnalyticsConnectionHolder
+from response_cache import response_cache
 from validation_utils import create_error_response
 
 packages_blueprint = Blueprint('packages', __name__)
@@ -68,4 +69,10 @@ def get_package_summary(package_name):
         }), 200
 
     except Exception as e:
-        return create_error_response(f"Failed to get package summary: {str(e)}")
\ No newline at end of file
+        return create_error_response(f"Failed to get package summary: {str(e)}")
+
+
+@packages_blueprint.route('/stats/cache/metrics', methods=['GET'])
+def get_stats_cache_metrics():
+    """Get hit ratio and size of the stats response cache"""
+    return jsonify(response_cache.get_metrics()), 200
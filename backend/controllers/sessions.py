@@ -1,13 +1,27 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 import uuid
+from pymongo import ReturnDocument
 from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection
 from session_cleanup import session_cleanup_service
+from response_cache import response_cache
+from cohorts import cohort_tracker
+from rollups import (
+    RollupAccumulator,
+    write_rollups,
+    get_rollup_total,
+    get_rollup_keys,
+    get_rollup_time_series,
+    DURATION_BUCKETS
+)
+from time_series import parse_series_args
+from pagination import parse_page_args, paginate
 from validation_utils import (
     validate_required_fields,
     parse_timestamp,
     check_database_connection,
-    format_timestamps_in_document,
+    to_utc_naive,
     create_success_response,
     create_error_response
 )
@@ -45,25 +59,21 @@ def log_session():
         session_id = data['session_id']
         action = data['action']
 
-        sessions_collection = db[f"{package_name}_sessions"]
+        sessions_collection = get_package_collection(db, package_name, "sessions")
 
         if action == 'start':
             # Create new session document
-            session_doc = {
-                "_id": str(uuid.uuid4()),
-                "session_id": session_id,
-                "user_id": data.get('user_id'),
-                "start_time": timestamp,
-                "end_time": None,
-                "duration_seconds": None,
-                "device_info": data.get('device_info', {}),
-                "created_at": datetime.now(),
-                "updated_at": datetime.now()
-            }
+            session_doc = build_session_document(data, timestamp)
 
             sessions_collection.insert_one(session_doc)
             print(f"✅ Session started: {session_id}")
 
+            rollups = RollupAccumulator()
+            rollups.add_session_start(timestamp)
+            write_rollups(db, package_name, rollups)
+            cohort_tracker.record_activity(db, package_name, [(session_doc['user_id'], timestamp)])
+            response_cache.invalidate_package(package_name)
+
             return create_success_response(
                 "Session started successfully",
                 {"session_id": session_id, "action": "started"},
@@ -71,27 +81,26 @@ def log_session():
             )
 
         elif action == 'end':
-            # Find existing session and update with end time
-            existing_session = sessions_collection.find_one({"session_id": session_id})
+            # Close the session; duration is computed server-side from start_time.
+            # The pre-image tells us the previous duration so the rollups stay exact
+            # when an already-closed session is ended again.
+            previous_session = sessions_collection.find_one_and_update(
+                {"session_id": session_id},
+                build_session_end_update(timestamp),
+                projection={"start_time": 1, "duration_seconds": 1},
+                return_document=ReturnDocument.BEFORE
+            )
 
-            if not existing_session:
+            if not previous_session:
                 return create_error_response("Session not found", 404)
 
-            # Calculate duration
-            start_time = existing_session['start_time']
-            duration_seconds = int((timestamp - start_time).total_seconds())
+            # Same arithmetic as the pipeline update
+            duration_seconds = int((to_utc_naive(timestamp) - previous_session['start_time']).total_seconds())
 
-            # Update session
-            sessions_collection.update_one(
-                {"session_id": session_id},
-                {
-                    "$set": {
-                        "end_time": timestamp,
-                        "duration_seconds": duration_seconds,
-                        "updated_at": datetime.now()
-                    }
-                }
-            )
+            rollups = RollupAccumulator()
+            rollups.add_session_end(duration_seconds, previous_session.get('duration_seconds'))
+            write_rollups(db, package_name, rollups)
+            response_cache.invalidate_package(package_name)
 
             print(f"✅ Session ended: {session_id} (Duration: {duration_seconds}s)")
 
@@ -111,6 +120,47 @@ def log_session():
         return create_error_response(f"Failed to log session: {str(e)}")
 
 
+def build_session_document(data, timestamp):
+    """Build the MongoDB document for a session 'start' payload"""
+    return {
+        "_id": str(uuid.uuid4()),
+        "session_id": data['session_id'],
+        "user_id": data.get('user_id'),
+        "start_time": timestamp,
+        "end_time": None,
+        "duration_seconds": None,
+        "device_info": data.get('device_info', {}),
+        "created_at": datetime.now(),
+        "updated_at": datetime.now()
+    }
+
+
+def build_session_end_update(timestamp):
+    """
+    Build a pipeline update that closes a session
+
+    The duration is computed server-side from the stored start_time,
+    so no read is needed before the write.
+    """
+    return [
+        {
+            "$set": {
+                "end_time": timestamp,
+                "duration_seconds": {
+                    "$toInt": {"$divide": [{"$subtract": [timestamp, "$start_time"]}, 1000]}
+                },
+                "updated_at": datetime.now()
+            }
+        }
+    ]
+
+
+@sessions_blueprint.route('/sessions/cleanup/metrics', methods=['GET'])
+def get_session_cleanup_metrics():
+    """Get run counts and durations of the background session cleanup"""
+    return jsonify(session_cleanup_service.get_metrics()), 200
+
+
 @sessions_blueprint.route('/sessions/<package_name>', methods=['GET'])
 def get_sessions(package_name):
     """Get sessions for a specific package"""
@@ -125,8 +175,11 @@ def get_sessions(package_name):
         if not is_connected:
             return error_response
 
-        # Get query parameters
-        limit = int(request.args.get('limit', 100))
+        # Get query parameters (pass next_cursor back as ?cursor= for the next page)
+        try:
+            limit, cursor = parse_page_args(request.args)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
         completed_only = request.args.get('completed_only', 'false').lower() == 'true'
 
         # Build query filter
@@ -135,20 +188,15 @@ def get_sessions(package_name):
             query_filter['end_time'] = {"$ne": None}  # Only sessions that have ended
 
         # Get sessions from package-specific collection
-        sessions_collection = db[f"{package_name}_sessions"]
-        sessions = list(sessions_collection.find(query_filter)
-                        .sort("start_time", -1)
-                        .limit(limit))
-
-        # Convert timestamps to ISO format
-        timestamp_fields = ['start_time', 'end_time', 'created_at', 'updated_at']
-        for session in sessions:
-            format_timestamps_in_document(session, timestamp_fields)
+        sessions_collection = get_package_collection(db, package_name, "sessions")
+        sessions, next_cursor = paginate(sessions_collection, query_filter, "start_time", limit, cursor)
 
         return jsonify({
             "package_name": package_name,
             "sessions": sessions,
-            "count": len(sessions)
+            "count": len(sessions),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }), 200
 
     except Exception as e:
@@ -156,8 +204,9 @@ def get_sessions(package_name):
 
 
 @sessions_blueprint.route('/sessions/<package_name>/stats', methods=['GET'])
+@response_cache.cached("session_stats")
 def get_session_stats(package_name):
-    """Get session statistics for dashboard with automatic cleanup"""
+    """Get session statistics for dashboard (stale sessions are closed by the background cleanup)"""
 
     print(f"📈 Generating session statistics for: {package_name}")
 
@@ -169,57 +218,59 @@ def get_session_stats(package_name):
         if not is_connected:
             return error_response
 
-        # Run cleanup first to close any stale sessions
-        print(f"🧹 Running session cleanup for {package_name}...")
-        closed_sessions = session_cleanup_service.cleanup_stale_sessions(package_name)
+        # Chart range, e.g. ?periods=30&granularity=day&timezone=Europe/Berlin
+        try:
+            start, end, granularity, timezone_name = parse_series_args(request.args)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
 
-        if closed_sessions > 0:
-            print(f"✅ Cleanup completed: {closed_sessions} stale sessions auto-closed")
+        session_stats = build_session_stats(db, package_name, start, end, granularity, timezone_name)
 
-        sessions_collection = db[f"{package_name}_sessions"]
+        return jsonify({"package_name": package_name, **session_stats}), 200
 
-        # Get total session count
-        total_sessions = sessions_collection.count_documents({})
+    except Exception as e:
+        return create_error_response(f"Failed to get session statistics: {str(e)}")
 
-        # Get completed sessions (have end_time)
-        completed_sessions = sessions_collection.count_documents({"end_time": {"$ne": None}})
 
-        # Calculate average session duration
-        avg_duration_pipeline = [
-            {"$match": {"duration_seconds": {"$ne": None}}},
-            {"$group": {"_id": None, "avg_duration": {"$avg": "$duration_seconds"}}}
-        ]
-        avg_duration_result = list(sessions_collection.aggregate(avg_duration_pipeline))
-        avg_duration_seconds = avg_duration_result[0]['avg_duration'] if avg_duration_result else 0
+def build_session_stats(db, package_name, start, end, granularity="day", timezone_name=None):
+    """Build the session statistics payload for a chart range"""
+    # Read the counters maintained at ingest time instead of scanning raw sessions
+    rollups_collection = get_package_collection(db, package_name, "rollups")
 
-        avg_duration_formatted = format_duration(avg_duration_seconds)
+    # Get total session count
+    total_sessions = get_rollup_total(rollups_collection, "sessions")
 
-        # Get session duration distribution (for pie chart)
-        duration_distribution = get_duration_distribution(sessions_collection)
+    # Completed sessions and average duration come from the duration buckets
+    duration_buckets = {item['key']: item for item in get_rollup_keys(rollups_collection, "session_duration")}
+    completed_sessions = sum(item['count'] for item in duration_buckets.values())
+    total_duration_seconds = sum(item.get('total_seconds', 0) for item in duration_buckets.values())
+    avg_duration_seconds = total_duration_seconds / completed_sessions if completed_sessions > 0 else 0
 
-        # Get daily session counts (for line chart)
-        daily_sessions = get_daily_session_counts(sessions_collection)
+    avg_duration_formatted = format_duration(avg_duration_seconds)
 
-        # Get session completion rate
-        completion_rate = (completed_sessions / total_sessions * 100) if total_sessions > 0 else 0
+    # Get session duration distribution (for pie chart)
+    duration_distribution = get_duration_distribution(duration_buckets)
 
-        return jsonify({
-            "package_name": package_name,
-            "total_sessions": total_sessions,
-            "completed_sessions": completed_sessions,
-            "completion_rate": f"{completion_rate:.1f}%",
-            "average_session_duration": avg_duration_formatted,
-            "average_duration_seconds": avg_duration_seconds,
-            "session_duration_distribution": duration_distribution,
-            "daily_sessions": daily_sessions,
-            "cleanup_info": {
-                "stale_sessions_closed": closed_sessions,
-                "timeout_hours": session_cleanup_service.get_session_timeout_hours()
-            }
-        }), 200
+    # Get daily session counts (for line chart)
+    daily_sessions = get_daily_session_counts(rollups_collection, start, end, granularity, timezone_name)
 
-    except Exception as e:
-        return create_error_response(f"Failed to get session statistics: {str(e)}")
+    # Get session completion rate
+    completion_rate = (completed_sessions / total_sessions * 100) if total_sessions > 0 else 0
+
+    return {
+        "total_sessions": total_sessions,
+        "completed_sessions": completed_sessions,
+        "completion_rate": f"{completion_rate:.1f}%",
+        "average_session_duration": avg_duration_formatted,
+        "average_duration_seconds": avg_duration_seconds,
+        "session_duration_distribution": duration_distribution,
+        "daily_sessions": daily_sessions,
+        "cleanup_info": {
+            "stale_sessions_closed": session_cleanup_service.get_last_closed_count(package_name),
+            "timeout_hours": session_cleanup_service.get_session_timeout_hours(),
+            "last_run_at": session_cleanup_service.get_metrics()["last_run_at"]
+        }
+    }
 
 def format_duration(seconds):
     """Convert seconds to human-readable format (e.g., '5m 23s')"""
@@ -238,57 +289,31 @@ def format_duration(seconds):
         return f"{secs}s"
 
 
-def get_duration_distribution(sessions_collection):
+def get_duration_distribution(duration_buckets):
     """Get distribution of session durations for pie chart"""
 
-    pipeline = [
-        {"$match": {"duration_seconds": {"$ne": None}}},
-        {
-            "$bucket": {
-                "groupBy": "$duration_seconds",
-                "boundaries": [0, 60, 300, 900, 1800, float('inf')],  # 0-1min, 1-5min, 5-15min, 15-30min, 30min+
-                "default": "30min+",
-                "output": {"count": {"$sum": 1}}
-            }
-        }
-    ]
-
-    results = list(sessions_collection.aggregate(pipeline))
-
-    # Convert to frontend format
-    labels = ["<1 min", "1-5 mins", "5-15 mins", "15-30 mins", ">30 mins"]
+    # Convert to frontend format, in bucket order
     distribution = []
 
-    for i, result in enumerate(results):
-        if i < len(labels):
+    for _, label in DURATION_BUCKETS:
+        if label in duration_buckets:
             distribution.append({
-                "name": labels[i],
-                "value": result["count"]
+                "name": label,
+                "value": duration_buckets[label]["count"]
             })
 
     return distribution
 
 
-def get_daily_session_counts(sessions_collection):
-    """Get daily session counts for line chart"""
-
-    pipeline = [
-        {
-            "$group": {
-                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$start_time"}},
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"_id": 1}},
-        {"$limit": 30}  # Last 30 days
-    ]
+def get_daily_session_counts(rollups_collection, start, end, granularity="day", timezone_name=None):
+    """Get session counts per period for line chart"""
 
-    results = list(sessions_collection.aggregate(pipeline))
+    results = get_rollup_time_series(rollups_collection, "sessions", start, end, granularity, timezone_name)
 
     # Format for frontend charts
     daily_data = [
-        {"date": item['_id'], "sessions": item['count']}
+        {"date": item['period'], "sessions": item['count']}
         for item in results
     ]
 
-    return daily_data
\ No newline at end of file
+    return daily_data
@@ -1,19 +1,37 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection
+from response_cache import response_cache
+from cohorts import cohort_tracker, get_cohort_matrix, COHORT_DAYS
+from time_series import get_time_series, parse_series_args
+from pagination import parse_page_args, paginate
 from ip_geolocation import ip_geo_service
+from geo_enrichment import geo_enrichment_service, PENDING_COUNTRY
 from validation_utils import (
     validate_required_fields,
     parse_timestamp,
     check_database_connection,
-    format_timestamps_in_document,
     create_success_response,
     create_error_response
 )
 
 users_blueprint = Blueprint('users', __name__)
 
+# Retention periods shown on the dashboard
+RETENTION_PERIODS = [
+    {"name": "Day 1", "days": 1},
+    {"name": "Day 3", "days": 3},
+    {"name": "Day 7", "days": 7},
+    {"name": "Day 14", "days": 14},
+    {"name": "Day 30", "days": 30}
+]
+
+MILLISECONDS_PER_DAY = 24 * 60 * 60 * 1000
+
 
 @users_blueprint.route('/users', methods=['POST'])
 def register_user():
@@ -44,30 +62,35 @@ def register_user():
         package_name = data['package_name']
         user_id = data['user_id']
 
-        # Get country using hybrid approach (IP + locale fallback)
         client_country = data.get('country', 'Unknown')
-        location_result = ip_geo_service.get_country_with_fallback(client_country)
 
-        final_country = location_result['country']
-        detection_method = location_result['detection_method']
+        if geo_enrichment_service.enabled:
+            # Resolved later by the background workers
+            client_ip = ip_geo_service.get_client_ip()
+            location_fields = geo_enrichment_service.build_pending_location(client_ip, client_country)
+        else:
+            # Get country using hybrid approach (IP + locale fallback)
+            location_result = ip_geo_service.get_country_with_fallback(client_country)
+
+            print(f"👤 User {user_id} location: {location_result['country']} "
+                  f"(via {location_result['detection_method']})")
 
-        print(f"👤 User {user_id} location: {final_country} (via {detection_method})")
+            location_fields = build_location_fields(location_result)
 
-        # Check if user already exists
-        users_collection = db[f"{package_name}_users"]
-        existing_user = users_collection.find_one({"user_id": user_id})
+        # Update last_active, or create the user if it doesn't exist yet (one round trip)
+        users_collection = get_package_collection(db, package_name, "users")
+        user_update = build_user_update(data, timestamp, location_fields)
+
+        try:
+            existing_user = upsert_user(users_collection, user_id, user_update)
+        except DuplicateKeyError:
+            # A concurrent request created this user first - retrying now updates it
+            existing_user = upsert_user(users_collection, user_id, user_update)
+
+        cohort_tracker.record_activity(db, package_name, [(user_id, timestamp)])
+        response_cache.invalidate_package(package_name)
 
         if existing_user:
-            # Update existing user's last_active time
-            users_collection.update_one(
-                {"user_id": user_id},
-                {
-                    "$set": {
-                        "last_active": timestamp,
-                        "updated_at": datetime.now()
-                    }
-                }
-            )
             print(f"✅ Updated existing user: {user_id}")
 
             return create_success_response(
@@ -76,29 +99,11 @@ def register_user():
             )
 
         else:
-            # Create new user document
-            user_doc = {
-                "_id": str(uuid.uuid4()),
-                "user_id": user_id,
-                "first_seen": timestamp,
-                "last_active": timestamp,
-                "country": final_country,
-                "location_metadata": {
-                    "detection_method": detection_method,
-                    "confidence": location_result['confidence'],
-                    "ip_country": location_result.get('ip_country'),
-                    "client_country": location_result.get('client_country')
-                },
-                "device_info": data.get('device_info', {}),
-                "properties": data.get('properties', {}),
-                "created_at": datetime.now(),
-                "updated_at": datetime.now()
-            }
-
-            # Store in package-specific collection
-            users_collection.insert_one(user_doc)
             print(f"✅ Registered new user: {user_id}")
 
+            if geo_enrichment_service.enabled:
+                geo_enrichment_service.enqueue(package_name, user_id, client_ip, client_country)
+
             return create_success_response(
                 "User registered successfully",
                 {"user_id": user_id, "action": "created"},
@@ -110,6 +115,59 @@ def register_user():
         return create_error_response(f"Failed to register user: {str(e)}")
 
 
+def build_location_fields(location_result):
+    """Build the country fields stored on a user from a geolocation result"""
+    return {
+        "country": location_result['country'],
+        "location_metadata": {
+            "detection_method": location_result['detection_method'],
+            "confidence": location_result['confidence'],
+            "ip_country": location_result.get('ip_country'),
+            "client_country": location_result.get('client_country')
+        }
+    }
+
+
+def build_user_update(data, timestamp, location_fields):
+    """Build the upsert that updates last_active, or creates the user with its location"""
+    return {
+        "$set": {
+            "last_active": timestamp,
+            "updated_at": datetime.now()
+        },
+        "$setOnInsert": {
+            "_id": str(uuid.uuid4()),
+            "first_seen": timestamp,
+            **location_fields,
+            "device_info": data.get('device_info', {}),
+            "properties": data.get('properties', {}),
+            "created_at": datetime.now()
+        }
+    }
+
+
+def upsert_user(users_collection, user_id, user_update):
+    """
+    Apply a user upsert
+
+    Returns:
+        dict: The user as it was before the update, or None if it was just created
+    """
+    return users_collection.find_one_and_update(
+        {"user_id": user_id},
+        user_update,
+        projection={"_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+
+
+@users_blueprint.route('/geolocation/cache/stats', methods=['GET'])
+def get_geolocation_cache_stats():
+    """Get hit/miss counters for the IP geolocation cache"""
+    return jsonify(ip_geo_service.cache.get_stats()), 200
+
+
 @users_blueprint.route('/users/<package_name>', methods=['GET'])
 def get_users(package_name):
     """Get all users for a specific package"""
@@ -121,8 +179,11 @@ def get_users(package_name):
         if db is None:
             return jsonify({"error": "Could not connect to the database"}), 500
 
-        # Get query parameters
-        limit = int(request.args.get('limit', 100))
+        # Get query parameters (pass next_cursor back as ?cursor= for the next page)
+        try:
+            limit, cursor = parse_page_args(request.args)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
         active_only = request.args.get('active_only', 'false').lower() == 'true'
 
         # Build query filter
@@ -133,20 +194,15 @@ def get_users(package_name):
             query_filter['last_active'] = {"$gte": thirty_days_ago}
 
         # Get users from package-specific collection
-        users_collection = db[f"{package_name}_users"]
-        users = list(users_collection.find(query_filter)
-                     .sort("last_active", -1)
-                     .limit(limit))
-
-        # Convert timestamps to ISO format
-        timestamp_fields = ['first_seen', 'last_active', 'created_at', 'updated_at']
-        for user in users:
-            format_timestamps_in_document(user, timestamp_fields)
+        users_collection = get_package_collection(db, package_name, "users")
+        users, next_cursor = paginate(users_collection, query_filter, "last_active", limit, cursor)
 
         return jsonify({
             "package_name": package_name,
             "users": users,
-            "count": len(users)
+            "count": len(users),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }), 200
 
     except Exception as e:
@@ -154,6 +210,7 @@ def get_users(package_name):
 
 
 @users_blueprint.route('/users/<package_name>/stats', methods=['GET'])
+@response_cache.cached("user_stats")
 def get_user_stats(package_name):
     """Get comprehensive user statistics for dashboard"""
 
@@ -164,127 +221,182 @@ def get_user_stats(package_name):
         if db is None:
             return jsonify({"error": "Could not connect to the database"}), 500
 
-        users_collection = db[f"{package_name}_users"]
+        # Chart range, e.g. ?periods=30&granularity=day&timezone=Europe/Berlin
+        try:
+            start, end, granularity, timezone_name = parse_series_args(request.args)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
 
-        # Get total user count
-        total_users = users_collection.count_documents({})
+        user_stats = build_user_stats(db, package_name, start, end, granularity, timezone_name)
 
-        # Get active users (last 30 days)
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        active_users = users_collection.count_documents({
-            "last_active": {"$gte": thirty_days_ago}
-        })
+        return jsonify({"package_name": package_name, **user_stats}), 200
 
-        # Get new users today
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        new_users_today = users_collection.count_documents({
-            "first_seen": {"$gte": today_start}
-        })
+    except Exception as e:
+        return create_error_response(f"Failed to get user statistics: {str(e)}")
 
-        # Calculate user growth over time
-        user_growth = calculate_user_growth(users_collection)
 
-        # Calculate user retention rates
-        user_retention = calculate_user_retention(users_collection)
+def build_user_stats(db, package_name, start, end, granularity="day", timezone_name=None):
+    """Build the user statistics payload for a chart range"""
+    users_collection = get_package_collection(db, package_name, "users")
+
+    # Get total user count
+    total_users = users_collection.count_documents({})
+
+    # Get active users (last 30 days)
+    thirty_days_ago = datetime.now() - timedelta(days=30)
+    active_users = users_collection.count_documents({
+        "last_active": {"$gte": thirty_days_ago}
+    })
+
+    # Get new users today
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    new_users_today = users_collection.count_documents({
+        "first_seen": {"$gte": today_start}
+    })
+
+    # Calculate user growth over time
+    user_growth = calculate_user_growth(users_collection, start, end, granularity, timezone_name)
+
+    # Calculate user retention rates
+    user_retention = calculate_user_retention(users_collection)
+
+    # Get users by country (for geographic distribution)
+    geographic_distribution = get_geographic_distribution(users_collection)
+
+    # Users whose country is still being resolved in the background
+    pending_geolocation = users_collection.count_documents({"country": PENDING_COUNTRY})
+
+    return {
+        "total_users": total_users,
+        "active_users": active_users,
+        "new_users_today": new_users_today,
+        "user_growth": user_growth,
+        "user_retention": user_retention,
+        "geographic_distribution": geographic_distribution,
+        "pending_geolocation": pending_geolocation
+    }
+
+
+@users_blueprint.route('/users/<package_name>/cohorts', methods=['GET'])
+@response_cache.cached("user_cohorts")
+def get_user_cohorts(package_name):
+    """
+    Get the cohort retention matrix (signup day x days since signup)
+
+    Query params:
+        cohorts: Number of most recent signup days (default 30, max 365)
+    """
 
-        # Get users by country (for geographic distribution)
-        geographic_distribution = get_geographic_distribution(users_collection)
+    print(f"📊 Getting cohort retention for: {package_name}")
+
+    try:
+        db = AnalyticsConnectionHolder.get_db()
+
+        # Database connection check
+        is_connected, error_response = check_database_connection(db)
+        if not is_connected:
+            return error_response
+
+        try:
+            cohort_count = int(request.args.get('cohorts', 30))
+        except ValueError:
+            return create_error_response("cohorts must be an integer", 400)
+
+        if not 1 <= cohort_count <= 365:
+            return create_error_response("cohorts must be between 1 and 365", 400)
+
+        # Pre-aggregated at ingest time - reads at most `cohort_count` small documents
+        cohorts_collection = get_package_collection(db, package_name, "cohorts")
+        matrix = get_cohort_matrix(cohorts_collection, cohort_count)
 
         return jsonify({
             "package_name": package_name,
-            "total_users": total_users,
-            "active_users": active_users,
-            "new_users_today": new_users_today,
-            "user_growth": user_growth,
-            "user_retention": user_retention,
-            "geographic_distribution": geographic_distribution
+            "days_tracked": COHORT_DAYS,
+            "cohorts": matrix,
+            "count": len(matrix)
         }), 200
 
     except Exception as e:
-        return create_error_response(f"Failed to get user statistics: {str(e)}")
+        return create_error_response(f"Failed to get cohort retention: {str(e)}")
 
 
-def calculate_user_growth(users_collection):
+def calculate_user_growth(users_collection, start, end, granularity="day", timezone_name=None):
     """
-    Calculate user growth over the last 30 days
+    Calculate new users per period over the chart range (one aggregation on first_seen)
     """
-    growth_data = []
-
-    # Go back 30 days and count new users each day
-    for i in range(29, -1, -1):
-        date = datetime.now() - timedelta(days=i)
-        date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = date_start + timedelta(days=1)
-
-        # Count users who first registered on this specific day
-        daily_new_users = users_collection.count_documents({
-            "first_seen": {"$gte": date_start, "$lt": date_end}
-        })
-
-        growth_data.append({
-            "date": date.strftime("%Y-%m-%d"),
-            "users": daily_new_users,
-            "month": date.strftime("%b")
-        })
-
-    print(f"📈 Calculated growth for {len(growth_data)} days")
+    growth_series = get_time_series(users_collection, "first_seen", start, end, granularity, timezone_name)
+
+    growth_data = [
+        {
+            "date": item['period'],
+            "users": item['count'],
+            "month": item['period_start'].strftime("%b")
+        }
+        for item in growth_series
+    ]
+
+    print(f"📈 Calculated growth for {len(growth_data)} periods")
     return growth_data
 
 
 def calculate_user_retention(users_collection):
     """
     Calculate user retention rates
+
+    One $group over the cohort counts every retention period at once on the
+    database server; only the totals come back to the web worker.
     """
 
     thirty_days_ago = datetime.now() - timedelta(days=30)
 
-    # Find users who registered more than 30 days ago
-    cohort_users = list(users_collection.find({
-        "first_seen": {"$lt": thirty_days_ago}
-    }))
-
-    if len(cohort_users) == 0:
-        print("📊 Not enough historical data for retention analysis")
-        return []
-
-    retention_data = []
+    # Users who registered more than 30 days ago (index-bounded on first_seen)
+    retained_counters = {
+        f"day_{period['days']}": {
+            "$sum": {
+                "$cond": [
+                    # Active at least N days after first_seen (date difference is in ms)
+                    {"$gte": [{"$subtract": ["$last_active", "$first_seen"]}, period['days'] * MILLISECONDS_PER_DAY]},
+                    1,
+                    0
+                ]
+            }
+        }
+        for period in RETENTION_PERIODS
+    }
 
-    # Calculate for different time periods
-    retention_periods = [
-        {"name": "Day 1", "days": 1},
-        {"name": "Day 3", "days": 3},
-        {"name": "Day 7", "days": 7},
-        {"name": "Day 14", "days": 14},
-        {"name": "Day 30", "days": 30}
+    pipeline = [
+        {"$match": {"first_seen": {"$lt": thirty_days_ago}}},
+        {"$group": {"_id": None, "cohort_size": {"$sum": 1}, **retained_counters}}
     ]
 
-    for period in retention_periods:
-        retained_count = 0
-
-        for user in cohort_users:
-            first_seen = user['first_seen']
-            target_date = first_seen + timedelta(days=period['days'])
+    result = next(users_collection.aggregate(pipeline), None)
 
-            # Check if user was active after the target date
-            if user['last_active'] >= target_date:
-                retained_count += 1
+    if not result or result['cohort_size'] == 0:
+        print("📊 Not enough historical data for retention analysis")
+        return []
 
-        retention_rate = (retained_count / len(cohort_users)) * 100 if len(cohort_users) > 0 else 0
+    cohort_size = result['cohort_size']
 
-        retention_data.append({
+    retention_data = [
+        {
             "day": period['name'],
-            "retention": round(retention_rate, 1)
-        })
+            "retention": round(result[f"day_{period['days']}"] / cohort_size * 100, 1)
+        }
+        for period in RETENTION_PERIODS
+    ]
 
-    print(f"📊 Calculated retention for {len(cohort_users)} users")
+    print(f"📊 Calculated retention for {cohort_size} users")
     return retention_data
 
 
 def get_geographic_distribution(users_collection):
     """
     Get user distribution by country
+
+    Users still waiting for background geolocation are left out
     """
     country_pipeline = [
+        {"$match": {"country": {"$ne": PENDING_COUNTRY}}},
         {"$group": {"_id": "$country", "count": {"$sum": 1}}},
         {"$sort": {"count": -1}},
         {"$limit": 10}  # Top 10 countries
@@ -0,0 +1,179 @@
+"""
+Bucketed Crash Occurrence Storage for Analytics API
+
+Crash occurrences live in {package}_crash_occurrences, one document per
+crash signature per hour, instead of an ever-growing array on the crash
+document. Each bucket keeps its own counters (occurrence count, users,
+per-device counts) so the stats can be computed without unwinding every
+occurrence. A bucket is capped; once full, the next occurrence in the same
+hour starts a new bucket. Buckets also keep their latest occurrence time
+(last_seen), so readers never scan the occurrence arrays.
+
+Usage (move existing embedded occurrences into buckets):
+    python crash_occurrences.py migrate
+"""
+
+import sys
+import uuid
+from collections import defaultdict
+
+from pymongo import ReplaceOne
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection
+
+# Maximum occurrences stored in a single bucket document
+MAX_OCCURRENCES_PER_BUCKET = 200
+
+UNKNOWN_DEVICE = "Unknown Device"
+
+
+def get_bucket_start(timestamp):
+    """Start of the hourly bucket a timestamp falls into"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def get_device_key(device_info):
+    """Device model usable as a field name (MongoDB keys can't contain '.' or start with '$')"""
+    model = (device_info or {}).get('model')
+    if not model:
+        return UNKNOWN_DEVICE
+    return model.replace('.', '_').lstrip('$') or UNKNOWN_DEVICE
+
+
+def build_occurrence_bucket_upsert(crash_signature, error_type, occurrence):
+    """
+    Build the (filter, update) pair that records an occurrence in its hourly bucket
+
+    Args:
+        crash_signature (str): Signature of the parent crash
+        error_type (str): Error type of the parent crash
+        occurrence (dict): Occurrence entry (timestamp, user_id, session_id, device_info)
+
+    Returns:
+        tuple: (bucket_filter, bucket_update) for an upsert
+    """
+    bucket_filter = {
+        "crash_signature": crash_signature,
+        "bucket_start": get_bucket_start(occurrence['timestamp']),
+        "count": {"$lt": MAX_OCCURRENCES_PER_BUCKET}
+    }
+
+    bucket_update = {
+        "$inc": {
+            "count": 1,
+            f"device_counts.{get_device_key(occurrence.get('device_info'))}": 1
+        },
+        "$max": {"last_seen": occurrence['timestamp']},
+        "$push": {"occurrences": occurrence},
+        "$setOnInsert": {
+            "_id": str(uuid.uuid4()),
+            "error_type": error_type
+        }
+    }
+
+    if occurrence.get('user_id'):
+        bucket_update["$addToSet"] = {"user_ids": occurrence['user_id']}
+
+    return bucket_filter, bucket_update
+
+
+def build_buckets(crash_signature, error_type, occurrences, id_prefix=None):
+    """
+    Group a list of occurrences into bucket documents (used by the migration)
+
+    Args:
+        id_prefix (str): If given, bucket _ids are derived from it, the hour and
+                         the chunk index, so rebuilding the same occurrences
+                         yields the same _ids (otherwise random)
+    """
+    occurrences_by_hour = defaultdict(list)
+    for occurrence in occurrences:
+        if occurrence.get('timestamp'):
+            occurrences_by_hour[get_bucket_start(occurrence['timestamp'])].append(occurrence)
+
+    buckets = []
+    for bucket_start, hour_occurrences in sorted(occurrences_by_hour.items()):
+        for chunk_index, i in enumerate(range(0, len(hour_occurrences), MAX_OCCURRENCES_PER_BUCKET)):
+            chunk = hour_occurrences[i:i + MAX_OCCURRENCES_PER_BUCKET]
+
+            device_counts = defaultdict(int)
+            for occurrence in chunk:
+                device_counts[get_device_key(occurrence.get('device_info'))] += 1
+
+            if id_prefix is not None:
+                bucket_id = f"{id_prefix}:{bucket_start.strftime('%Y-%m-%dT%H')}:{chunk_index}"
+            else:
+                bucket_id = str(uuid.uuid4())
+
+            buckets.append({
+                "_id": bucket_id,
+                "crash_signature": crash_signature,
+                "error_type": error_type,
+                "bucket_start": bucket_start,
+                "count": len(chunk),
+                "last_seen": max(occurrence['timestamp'] for occurrence in chunk),
+                "occurrences": chunk,
+                "user_ids": sorted({occurrence['user_id'] for occurrence in chunk if occurrence.get('user_id')}),
+                "device_counts": dict(device_counts)
+            })
+
+    return buckets
+
+
+def migrate_embedded_occurrences():
+    """
+    Move occurrences embedded in crash documents into the bucket collections
+
+    Crash documents are processed one at a time; their occurrences array is
+    removed once its buckets are written. Bucket _ids are derived from the
+    crash _id and written as upserts, so re-running after an interruption
+    (even between the two steps) replaces the same buckets instead of
+    inserting the occurrences again.
+
+    Returns:
+        int: Number of crash documents migrated
+    """
+    db = AnalyticsConnectionHolder.get_db()
+    if db is None:
+        print("❌ Cannot connect to database for crash occurrence migration")
+        return 0
+
+    migrated = 0
+
+    for collection_name in db.list_collection_names():
+        if not collection_name.endswith('_crashes'):
+            continue
+
+        package_name = collection_name[:-len('_crashes')]
+        crashes_collection = db[collection_name]
+        occurrences_collection = get_package_collection(db, package_name, "crash_occurrences")
+
+        for crash in crashes_collection.find({"occurrences": {"$exists": True}}):
+            buckets = build_buckets(crash['crash_signature'], crash['error_type'], crash.get('occurrences', []),
+                                    id_prefix=f"migrated:{crash['_id']}")
+
+            if buckets:
+                occurrences_collection.bulk_write(
+                    [ReplaceOne({"_id": bucket['_id']}, bucket, upsert=True) for bucket in buckets],
+                    ordered=False
+                )
+
+            crashes_collection.update_one({"_id": crash['_id']}, {"$unset": {"occurrences": ""}})
+            migrated += 1
+
+        print(f"✅ Migrated crash occurrences for {package_name}")
+
+    return migrated
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2 and sys.argv[1] == 'migrate':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        count = migrate_embedded_occurrences()
+        print(f"✅ Migrated {count} crash documents to bucketed occurrences")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,297 @@
+"""
+Write-behind Event Buffer for Analytics API
+
+Optional buffered ingest mode: instead of one insert_one per request, event
+documents are queued in memory per package collection and written in bulk
+with insert_many by a background flusher thread.
+
+Enable with EVENT_BUFFER_ENABLED=true.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+from pymongo.errors import BulkWriteError
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from rollups import RollupAccumulator, write_rollups
+from hyperloglog import SketchAccumulator, write_sketches
+from heavy_hitters import top_event_tracker
+from cohorts import cohort_tracker
+from response_cache import response_cache
+
+
+class EventBuffer:
+    """Bounded in-memory queues of event documents, flushed in the background"""
+
+    def __init__(self):
+        self.enabled = os.getenv("EVENT_BUFFER_ENABLED", "false").lower() == "true"
+        self.max_queue_size = int(os.getenv("EVENT_BUFFER_MAX_QUEUE_SIZE", "10000"))  # Per collection
+        self.flush_batch_size = int(os.getenv("EVENT_BUFFER_FLUSH_SIZE", "500"))
+        self.flush_interval_seconds = float(os.getenv("EVENT_BUFFER_FLUSH_INTERVAL_SECONDS", "1.0"))
+        self.enqueue_timeout_seconds = float(os.getenv("EVENT_BUFFER_ENQUEUE_TIMEOUT_SECONDS", "0.5"))
+
+        self._queues = {}  # collection name -> deque of (enqueued_at, document)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._stop_registered = False
+
+        self._metrics = {
+            "enqueued": 0,
+            "flushed": 0,
+            "rejected": 0,
+            "flusher_restarts": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "total_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "last_flush_ms": 0.0
+        }
+
+        if self.enabled:
+            print(f"📥 Event buffer enabled (flush every {self.flush_batch_size} events "
+                  f"or {self.flush_interval_seconds}s, max {self.max_queue_size} queued per collection)")
+
+    def enqueue(self, collection_name, document):
+        """
+        Queue an event document for a bulk write
+
+        Blocks for up to enqueue_timeout_seconds if the collection's queue is full
+        (backpressure) and gives up after that.
+
+        Returns:
+            bool: True if the document was queued, False if the buffer is full
+        """
+        self._ensure_started()
+
+        deadline = time.monotonic() + self.enqueue_timeout_seconds
+
+        with self._condition:
+            queue = self._queues.setdefault(collection_name, deque())
+
+            while len(queue) >= self.max_queue_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics["rejected"] += 1
+                    return False
+
+                # Wake the flusher so it makes room, then wait for it
+                self._condition.notify_all()
+                self._condition.wait(remaining)
+
+            queue.append((time.monotonic(), document))
+            self._metrics["enqueued"] += 1
+
+            if len(queue) >= self.flush_batch_size:
+                self._condition.notify_all()
+
+        return True
+
+    def flush_all(self):
+        """Write out everything currently queued (used on shutdown)"""
+        with self._condition:
+            collection_names = list(self._queues.keys())
+
+        for collection_name in collection_names:
+            while self._flush_collection(collection_name, requeue_on_error=False):
+                pass
+
+    def stop(self):
+        """Stop the flusher thread and flush whatever is left"""
+        if self._thread is None:
+            return
+
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        self._thread.join(timeout=self.flush_interval_seconds * 5)
+        self._thread = None
+
+        self.flush_all()
+        print("🛑 Event buffer stopped and flushed")
+
+    def get_metrics(self):
+        """Get queue depth and flush latency metrics"""
+        with self._condition:
+            queue_depths = {name: len(queue) for name, queue in self._queues.items()}
+            metrics = dict(self._metrics)
+
+        flushes = metrics.pop("flushes")
+        total_flush_ms = metrics.pop("total_flush_ms")
+
+        return {
+            "enabled": self.enabled,
+            "queue_depth": sum(queue_depths.values()),
+            "queue_depth_by_collection": queue_depths,
+            "max_queue_size": self.max_queue_size,
+            "flushes": flushes,
+            "avg_flush_ms": round(total_flush_ms / flushes, 2) if flushes > 0 else 0,
+            "max_flush_ms": round(metrics.pop("max_flush_ms"), 2),
+            "last_flush_ms": round(metrics.pop("last_flush_ms"), 2),
+            **metrics
+        }
+
+    def _ensure_started(self):
+        """
+        Start the flusher thread on first use (so it is created after any fork),
+        or again if it died
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            if self._thread is not None:
+                print("⚠️ Event buffer flusher thread died - restarting it")
+                self._metrics["flusher_restarts"] += 1
+
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="event-buffer-flusher", daemon=True)
+            self._thread.start()
+
+            register_stop = not self._stop_registered
+            self._stop_registered = True
+
+        if register_stop:
+            atexit.register(self.stop)
+
+    def _run(self):
+        """Flusher loop: write out queues that are big enough or old enough"""
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+
+                due = self._get_due_collections()
+                if not due:
+                    self._condition.wait(self.flush_interval_seconds / 4)
+                    continue
+
+            for collection_name in due:
+                try:
+                    self._flush_collection(collection_name, requeue_on_error=True)
+                except Exception as e:
+                    # Keep the flusher alive - a dead flusher would leave every buffered request at 503
+                    print(f"❌ Unexpected error flushing {collection_name}: {str(e)}")
+                    time.sleep(self.flush_interval_seconds)
+
+    def _get_due_collections(self):
+        """Collections whose queue hit the size threshold or whose oldest event hit the age threshold"""
+        now = time.monotonic()
+        due = []
+
+        for collection_name, queue in self._queues.items():
+            if not queue:
+                continue
+
+            oldest_enqueued_at = queue[0][0]
+            if len(queue) >= self.flush_batch_size or now - oldest_enqueued_at >= self.flush_interval_seconds:
+                due.append(collection_name)
+
+        return due
+
+    def _flush_collection(self, collection_name, requeue_on_error):
+        """
+        Write one batch from a collection's queue with insert_many
+
+        Returns:
+            bool: True if a batch was written
+        """
+        with self._condition:
+            queue = self._queues.get(collection_name)
+            if not queue:
+                return False
+
+            batch = [queue.popleft() for _ in range(min(self.flush_batch_size, len(queue)))]
+
+            # Room was freed - wake any request waiting on backpressure
+            self._condition.notify_all()
+
+        started = time.perf_counter()
+
+        try:
+            db = AnalyticsConnectionHolder.get_db()
+            if db is None:
+                raise ConnectionError("Could not connect to the database")
+
+            documents = [document for _, document in batch]
+            db[collection_name].insert_many(documents, ordered=False)
+
+        except BulkWriteError as e:
+            # Document-level errors (e.g. duplicate _id after a retried batch) won't succeed on retry
+            inserted = e.details.get('nInserted', 0)
+            print(f"⚠️ Event buffer flush for {collection_name}: {len(batch) - inserted} events rejected by MongoDB")
+
+            rejected_indexes = {error['index'] for error in e.details.get('writeErrors', [])}
+            self._update_aggregates(db, collection_name,
+                                 [document for i, document in enumerate(documents) if i not in rejected_indexes])
+
+            with self._condition:
+                self._metrics["flushed"] += inserted
+                self._metrics["failed_flushes"] += 1
+            return True
+
+        except Exception as e:
+            print(f"❌ Event buffer flush failed for {collection_name} ({len(batch)} events): {str(e)}")
+
+            with self._condition:
+                self._metrics["failed_flushes"] += 1
+                if requeue_on_error:
+                    # Put the batch back at the front so it is retried on the next cycle
+                    self._queues[collection_name].extendleft(reversed(batch))
+
+            if requeue_on_error:
+                # Back off before the next attempt
+                time.sleep(self.flush_interval_seconds)
+            return False
+
+        self._update_aggregates(db, collection_name, documents)
+
+        flush_ms = (time.perf_counter() - started) * 1000
+
+        with self._condition:
+            self._metrics["flushed"] += len(batch)
+            self._metrics["flushes"] += 1
+            self._metrics["total_flush_ms"] += flush_ms
+            self._metrics["last_flush_ms"] = flush_ms
+            self._metrics["max_flush_ms"] = max(self._metrics["max_flush_ms"], flush_ms)
+
+        return True
+
+    def _update_aggregates(self, db, collection_name, documents):
+        """
+        Count a flushed batch in the package's rollups and user sketches (one bulk write each) and cohort activity
+
+        Failures are logged but never stop the flusher; the events are stored
+        and the rebuild commands repair the aggregates.
+        """
+        try:
+            self._write_aggregates(db, collection_name, documents)
+        except Exception as e:
+            print(f"⚠️ Failed to update aggregates for {collection_name}: {str(e)}")
+
+    def _write_aggregates(self, db, collection_name, documents):
+        accumulator = RollupAccumulator()
+        sketches = SketchAccumulator()
+        for document in documents:
+            accumulator.add_event(document['event_type'], document['timestamp'])
+            sketches.add_event(document['event_type'], document.get('user_id'), document['timestamp'])
+
+        package_name = collection_name[:-len('_events')]
+        write_rollups(db, package_name, accumulator)
+        write_sketches(db, package_name, sketches)
+        top_event_tracker.record(package_name, [document['event_type'] for document in documents])
+        cohort_tracker.record_activity(
+            db, package_name, [(document.get('user_id'), document['timestamp']) for document in documents]
+        )
+        response_cache.invalidate_package(package_name)
+
+
+event_buffer = EventBuffer()
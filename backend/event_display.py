@@ -0,0 +1,116 @@
+"""
+Event Display Fields for Analytics API
+
+The admin portal's Recent Activity table shows each event with a date, a
+time, a shortened user ID and a short preview of its properties. These are
+computed once when the event is stored, so get_events returns documents
+straight from the cursor instead of formatting every event on every poll.
+
+Events stored before the fields existed are filled in by the backfill.
+
+Usage (backfill existing events):
+    python event_display.py backfill [package_name]
+"""
+
+import sys
+
+from pymongo import UpdateOne
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection
+from validation_utils import to_utc_naive
+
+# Fields added to event documents (not part of the raw event, left out of exports)
+DISPLAY_FIELDS = ["full_date", "time_only", "user_display", "properties_preview"]
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def build_display_fields(event):
+    """
+    Build the Recent Activity display fields of an event
+
+    Args:
+        event (dict): Event document (needs timestamp, user_id and properties);
+                      the date and time are formatted in UTC
+
+    Returns:
+        dict: full_date, time_only, user_display and properties_preview
+    """
+    fields = {}
+
+    timestamp = event.get('timestamp')
+    if timestamp:
+        # Stored events read back as naive UTC: format new ones the same way, whatever offset the client sent
+        timestamp = to_utc_naive(timestamp)
+        fields['full_date'] = timestamp.strftime('%Y-%m-%d')
+        fields['time_only'] = timestamp.strftime('%H:%M')
+
+    # Format user display (truncate long user IDs)
+    user_id = event.get('user_id')
+    if user_id:
+        fields['user_display'] = user_id[:8] + '...' if len(user_id) > 8 else user_id
+    else:
+        fields['user_display'] = 'Anonymous'
+
+    # Create properties preview (first 2 properties)
+    props = event.get('properties', {})
+    if props and isinstance(props, dict):
+        prop_items = list(props.items())[:2]
+        prop_preview = ', '.join([f"{k}: {v}" for k, v in prop_items])
+        fields['properties_preview'] = prop_preview[:40] + '...' if len(prop_preview) > 40 else prop_preview
+    else:
+        fields['properties_preview'] = 'No properties'
+
+    return fields
+
+
+def backfill_package_events(db, package_name, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Add display fields to a package's events stored without them
+
+    Returns:
+        int: Number of events updated
+    """
+    events_collection = get_package_collection(db, package_name, "events")
+    cursor = events_collection.find(
+        {"user_display": {"$exists": False}},
+        {"timestamp": 1, "user_id": 1, "properties": 1}
+    ).batch_size(batch_size)
+
+    updated = 0
+    operations = []
+    for event in cursor:
+        operations.append(UpdateOne({"_id": event['_id']}, {"$set": build_display_fields(event)}))
+
+        if len(operations) >= batch_size:
+            updated += events_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+
+    if operations:
+        updated += events_collection.bulk_write(operations, ordered=False).modified_count
+
+    print(f"✅ Backfilled display fields for {updated} events in {package_name}")
+    return updated
+
+
+if __name__ == '__main__':
+    if len(sys.argv) in (2, 3) and sys.argv[1] == 'backfill':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        database = AnalyticsConnectionHolder.get_db()
+        if database is None:
+            sys.exit(1)
+
+        if len(sys.argv) == 3:
+            package_names = [sys.argv[2]]
+        else:
+            package_names = sorted(name[:-len('_events')] for name in database.list_collection_names()
+                                   if name.endswith('_events'))
+
+        for name in package_names:
+            backfill_package_events(database, name)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,202 @@
+"""
+Bulk Export for Analytics API
+
+Streams a package's raw events, sessions or crash occurrences for a time
+range as NDJSON or CSV, optionally gzip-compressed. Documents are read from
+a MongoDB cursor in batches of EXPORT_BATCH_SIZE and encoded one at a time
+into output chunks of about EXPORT_CHUNK_SIZE bytes, so memory stays flat
+however large the export is.
+
+Crash occurrences are stored in hourly buckets (see crash_occurrences.py);
+the export unwinds them into one row per occurrence.
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+
+from index_manager import get_package_collection
+from event_display import DISPLAY_FIELDS
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", str(64 * 1024)))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+# Collection, time field and CSV columns per export type
+EXPORT_TYPES = {
+    "events": {
+        "collection_type": "events",
+        "time_field": "timestamp",
+        "columns": ["_id", "event_type", "user_id", "session_id", "timestamp",
+                    "properties", "device_info", "created_at"]
+    },
+    "sessions": {
+        "collection_type": "sessions",
+        "time_field": "start_time",
+        "columns": ["_id", "session_id", "user_id", "start_time", "end_time", "duration_seconds",
+                    "device_info", "closed_by", "created_at", "updated_at"]
+    },
+    "crashes": {
+        "collection_type": "crash_occurrences",
+        "time_field": "timestamp",
+        "columns": ["crash_signature", "error_type", "timestamp", "user_id", "session_id", "device_info"]
+    }
+}
+
+
+def iter_export_documents(db, package_name, export_type, start, end, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Iterate over the documents of an export in time order
+
+    Args:
+        db: Database instance
+        package_name (str): App package name
+        export_type (str): "events", "sessions" or "crashes"
+        start (datetime): Range start (inclusive, naive UTC)
+        end (datetime): Range end (exclusive, naive UTC)
+        batch_size (int): Documents fetched per round trip
+
+    Returns:
+        Cursor: Documents of the range, fetched lazily
+    """
+    export = EXPORT_TYPES[export_type]
+    collection = get_package_collection(db, package_name, export["collection_type"])
+    time_field = export["time_field"]
+
+    if export_type == "crashes":
+        # Buckets are hourly, so bucket_start narrows the scan before the unwind
+        pipeline = [
+            {"$match": {"bucket_start": {"$gte": start.replace(minute=0, second=0, microsecond=0), "$lt": end}}},
+            {"$sort": {"bucket_start": 1}},
+            {"$unwind": "$occurrences"},
+            {"$match": {"occurrences.timestamp": {"$gte": start, "$lt": end}}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "crash_signature": 1,
+                    "error_type": 1,
+                    "timestamp": "$occurrences.timestamp",
+                    "user_id": "$occurrences.user_id",
+                    "session_id": "$occurrences.session_id",
+                    "device_info": "$occurrences.device_info"
+                }
+            }
+        ]
+        return collection.aggregate(pipeline, batchSize=batch_size, allowDiskUse=True)
+
+    # Events carry precomputed display fields for the admin portal; export only the raw event
+    projection = {field: 0 for field in DISPLAY_FIELDS} if export_type == "events" else None
+
+    return (collection.find({time_field: {"$gte": start, "$lt": end}}, projection)
+            .sort([(time_field, 1), ("_id", 1)])
+            .batch_size(batch_size))
+
+
+def serialize_value(value):
+    """JSON fallback for values the json module can't encode (datetimes as ISO format)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_ndjson_lines(documents):
+    """Encode documents as NDJSON, one line per document"""
+    for document in documents:
+        yield json.dumps(document, default=serialize_value) + "\n"
+
+
+def iter_csv_lines(documents, columns):
+    """Encode documents as CSV rows (header first); nested values become JSON"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take_row(row):
+        writer.writerow(row)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    yield take_row(columns)
+
+    for document in documents:
+        row = []
+        for column in columns:
+            value = document.get(column)
+            if value is None:
+                row.append("")
+            elif isinstance(value, (dict, list)):
+                row.append(json.dumps(value, default=serialize_value))
+            elif isinstance(value, datetime):
+                row.append(value.isoformat())
+            else:
+                row.append(value)
+        yield take_row(row)
+
+
+def iter_chunks(lines, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Join encoded lines into output chunks of about chunk_size bytes
+
+    Args:
+        lines (iterable): Encoded text lines
+        compress (bool): gzip the output stream
+        chunk_size (int): Target chunk size before compression
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+    pending = []
+    pending_size = 0
+
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        pending_size += len(data)
+
+        if pending_size >= chunk_size:
+            chunk = b"".join(pending)
+            pending = []
+            pending_size = 0
+
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = b"".join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def iter_export(db, package_name, export_type, start, end, export_format="ndjson", compress=False):
+    """
+    Stream an export as bytes
+
+    Args:
+        db: Database instance
+        package_name (str): App package name
+        export_type (str): "events", "sessions" or "crashes"
+        start (datetime): Range start (inclusive, naive UTC)
+        end (datetime): Range end (exclusive, naive UTC)
+        export_format (str): "ndjson" or "csv"
+        compress (bool): gzip the output
+
+    Returns:
+        generator: Output chunks
+    """
+    documents = iter_export_documents(db, package_name, export_type, start, end)
+
+    if export_format == "csv":
+        lines = iter_csv_lines(documents, EXPORT_TYPES[export_type]["columns"])
+    else:
+        lines = iter_ndjson_lines(documents)
+
+    return iter_chunks(lines, compress)
@@ -0,0 +1,227 @@
+"""
+Asynchronous Geolocation Enrichment for Analytics API
+
+Optional mode where register_user writes the user immediately with
+country "pending" and queues the client IP. A small pool of background
+workers resolves queued IPs in batches and patches the users' country and
+location_metadata with bulk updates.
+
+Users left pending - a failed batch, a full queue, a process that exited
+with users still queued - are re-queued by a recovery sweep that runs at
+startup and then every GEO_ENRICHMENT_SWEEP_INTERVAL_SECONDS.
+
+Enable with ASYNC_GEO_ENRICHMENT=true.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import index_manager
+from ip_geolocation import ip_geo_service
+from response_cache import response_cache
+
+PENDING_COUNTRY = "pending"
+
+
+class GeoEnrichmentService:
+    """Background worker pool that resolves queued user IPs to countries"""
+
+    def __init__(self):
+        self.enabled = os.getenv("ASYNC_GEO_ENRICHMENT", "false").lower() == "true"
+        self.worker_count = int(os.getenv("GEO_ENRICHMENT_WORKERS", "4"))
+        self.batch_size = int(os.getenv("GEO_ENRICHMENT_BATCH_SIZE", "100"))
+        self.batch_wait_seconds = float(os.getenv("GEO_ENRICHMENT_BATCH_WAIT_SECONDS", "0.5"))
+        self.sweep_interval_seconds = float(os.getenv("GEO_ENRICHMENT_SWEEP_INTERVAL_SECONDS", "300"))
+        # Users pending for less than this are assumed to still be queued
+        self.pending_grace_seconds = float(os.getenv("GEO_ENRICHMENT_PENDING_GRACE_SECONDS", "300"))
+
+        self._queue = queue.Queue(maxsize=int(os.getenv("GEO_ENRICHMENT_MAX_QUEUE_SIZE", "50000")))
+        self._workers = []
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            print(f"🌍 Async geolocation enrichment enabled ({self.worker_count} workers)")
+
+    def build_pending_location(self, ip_address, client_country):
+        """Placeholder location fields stored on the user until the IP is resolved"""
+        return {
+            "country": PENDING_COUNTRY,
+            "location_metadata": {
+                "detection_method": PENDING_COUNTRY,
+                "confidence": "none",
+                "ip_country": None,
+                "client_country": client_country,
+                "pending_ip": ip_address,  # Removed once resolved
+                "pending_since": datetime.now()
+            }
+        }
+
+    def enqueue(self, package_name, user_id, ip_address, client_country):
+        """
+        Queue a user for background geolocation
+
+        Returns:
+            bool: False if the queue is full (the user stays pending and is
+                  picked up again by the next recovery sweep)
+        """
+        self._ensure_started()
+
+        try:
+            self._queue.put_nowait((package_name, user_id, ip_address, client_country))
+            return True
+        except queue.Full:
+            print(f"⚠️ Geolocation queue full - user {user_id} left pending")
+            return False
+
+    def get_queue_size(self):
+        """Number of users waiting to be geolocated"""
+        return self._queue.qsize()
+
+    def requeue_pending_users(self, pending_before=None):
+        """
+        Re-queue users still marked pending (e.g. after a restart lost the in-memory queue)
+
+        Args:
+            pending_before (datetime): Only users pending since before this time
+                                       (None for every pending user)
+
+        Returns:
+            int: Number of users queued
+        """
+        db = AnalyticsConnectionHolder.get_db()
+        if db is None:
+            return 0
+
+        query = {"country": PENDING_COUNTRY}
+        if pending_before is not None:
+            # Users stored before pending_since existed have no timestamp
+            query["$or"] = [
+                {"location_metadata.pending_since": {"$lt": pending_before}},
+                {"location_metadata.pending_since": {"$exists": False}}
+            ]
+
+        queued = 0
+        for collection_name in db.list_collection_names():
+            if not collection_name.endswith('_users'):
+                continue
+
+            package_name = collection_name[:-len('_users')]
+            pending_users = db[collection_name].find(
+                query,
+                {"user_id": 1, "location_metadata.pending_ip": 1, "location_metadata.client_country": 1}
+            )
+
+            for user in pending_users:
+                metadata = user.get('location_metadata', {})
+                if not self.enqueue(package_name, user['user_id'], metadata.get('pending_ip'),
+                                    metadata.get('client_country')):
+                    # Queue full - the rest wait for the next sweep
+                    print(f"🌍 Re-queued {queued} users with pending geolocation (queue full)")
+                    return queued
+                queued += 1
+
+        if queued > 0:
+            print(f"🌍 Re-queued {queued} users with pending geolocation")
+        return queued
+
+    def _ensure_started(self):
+        """Start the worker pool on first use"""
+        if self._workers:
+            return
+
+        with self._lock:
+            if self._workers:
+                return
+
+            for i in range(self.worker_count):
+                worker = threading.Thread(target=self._run, name=f"geo-enrichment-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+        threading.Thread(target=self._sweep_forever, name="geo-enrichment-recovery", daemon=True).start()
+
+    def _sweep_forever(self):
+        """Recovery loop: re-queue every pending user at startup, then stale ones periodically"""
+        pending_before = None  # Startup: users left pending by a previous process
+
+        while True:
+            try:
+                self.requeue_pending_users(pending_before)
+            except Exception as e:
+                print(f"⚠️ Geolocation recovery sweep failed: {str(e)}")
+
+            time.sleep(self.sweep_interval_seconds)
+            pending_before = datetime.now() - timedelta(seconds=self.pending_grace_seconds)
+
+    def _run(self):
+        """Worker loop: take a batch off the queue, resolve it, write it back"""
+        while True:
+            batch = self._take_batch()
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                print(f"❌ Geolocation enrichment batch failed ({len(batch)} users): {str(e)}")
+
+    def _take_batch(self):
+        """Block for the first item, then collect more for up to batch_wait_seconds"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait_seconds
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _process_batch(self, batch):
+        """Resolve every distinct IP in the batch once and bulk-update the users"""
+        countries_by_ip = {}
+        for _, _, ip_address, _ in batch:
+            if ip_address and ip_address not in countries_by_ip:
+                countries_by_ip[ip_address] = ip_geo_service.get_country_from_ip(ip_address)
+
+        updates = defaultdict(list)
+        for package_name, user_id, ip_address, client_country in batch:
+            location_result = ip_geo_service.build_location_result(countries_by_ip.get(ip_address), client_country)
+
+            updates[f"{package_name}_users"].append(UpdateOne(
+                {"user_id": user_id, "country": PENDING_COUNTRY},
+                {
+                    "$set": {
+                        "country": location_result['country'],
+                        "location_metadata": {
+                            "detection_method": location_result['detection_method'],
+                            "confidence": location_result['confidence'],
+                            "ip_country": location_result.get('ip_country'),
+                            "client_country": location_result.get('client_country')
+                        },
+                        "updated_at": datetime.now()
+                    }
+                }
+            ))
+
+        db = AnalyticsConnectionHolder.get_db()
+        if db is None:
+            raise ConnectionError("Could not connect to the database")
+
+        for collection_name, operations in updates.items():
+            index_manager.ensure_indexes(db, collection_name)
+            db[collection_name].bulk_write(operations, ordered=False)
+            response_cache.invalidate_package(collection_name[:-len('_users')])
+
+        print(f"🌍 Geolocated {len(batch)} users ({len(countries_by_ip)} distinct IPs)")
+
+
+geo_enrichment_service = GeoEnrichmentService()
@@ -0,0 +1,294 @@
+"""
+Local GeoIP Database for Analytics API
+
+Offline IP -> country lookups, so user registration doesn't depend on
+external geolocation services.
+
+An IP-range CSV (IPv4 and IPv6) is compiled once into a compact binary file
+of sorted range arrays. The file is memory-mapped read-only, so every worker
+process shares the same pages, and lookups are a binary search over it.
+
+Supported CSV layouts (header row optional):
+    start_ip,end_ip,country                     (e.g. DB-IP lite)
+    start_ip,end_ip,country_code,country_name   (e.g. IP2Location LITE DB1)
+start/end may be dotted/colon IP strings or integers.
+
+MaxMind-style .mmdb files are also accepted if the optional `maxminddb`
+package is installed.
+
+Usage:
+    python geoip_database.py build <ranges.csv> <output.bin>
+    python geoip_database.py lookup <database> <ip>
+"""
+
+import csv
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+FILE_MAGIC = b"ITGEOIP1"
+HEADER_FORMAT = "<8sIII"  # magic, IPv4 range count, IPv6 range count, country table length
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+V4_KEY_SIZE = 4
+V6_KEY_SIZE = 16
+COUNTRY_INDEX_SIZE = 2
+
+
+def compile_csv(csv_path, output_path):
+    """
+    Compile an IP-range CSV into the binary lookup format
+
+    Args:
+        csv_path (str): Source CSV with start_ip, end_ip, country columns
+        output_path (str): Where to write the compiled database
+
+    Returns:
+        tuple: (ipv4_range_count, ipv6_range_count)
+    """
+    v4_ranges = []
+    v6_ranges = []
+    countries = []
+    country_indexes = {}
+
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+
+            try:
+                start, version = _parse_range_bound(row[0])
+                end, _ = _parse_range_bound(row[1])
+            except ValueError:
+                continue  # Header or malformed row
+
+            # IPv4-mapped IPv6 ranges (::ffff:a.b.c.d) are stored in the IPv4 table
+            if version == 6 and start >> 32 == 0xFFFF and end >> 32 == 0xFFFF:
+                start, end, version = start & 0xFFFFFFFF, end & 0xFFFFFFFF, 4
+
+            # Prefer the country name when the CSV provides both code and name
+            country = (row[3] if len(row) > 3 and row[3].strip() else row[2]).strip()
+            if not country or country == "-":
+                continue
+
+            if country not in country_indexes:
+                country_indexes[country] = len(countries)
+                countries.append(country)
+
+            ranges = v4_ranges if version == 4 else v6_ranges
+            ranges.append((start, end, country_indexes[country]))
+
+    v4_ranges.sort()
+    v6_ranges.sort()
+
+    country_table = json.dumps(countries).encode('utf-8')
+
+    # A temp file of its own: every worker process may compile the same CSV
+    # at startup, and each replaces the output with a complete file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)),
+                                     prefix=f"{os.path.basename(output_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(struct.pack(HEADER_FORMAT, FILE_MAGIC, len(v4_ranges), len(v6_ranges), len(country_table)))
+
+            for ranges, key_size in ((v4_ranges, V4_KEY_SIZE), (v6_ranges, V6_KEY_SIZE)):
+                # Column layout: all starts, then all ends, then all country indexes
+                out.write(b"".join(start.to_bytes(key_size, 'big') for start, _, _ in ranges))
+                out.write(b"".join(end.to_bytes(key_size, 'big') for _, end, _ in ranges))
+                out.write(b"".join(struct.pack("<H", country) for _, _, country in ranges))
+
+            out.write(country_table)
+
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, output_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    print(f"🗺️ Compiled GeoIP database: {len(v4_ranges)} IPv4 ranges, "
+          f"{len(v6_ranges)} IPv6 ranges, {len(countries)} countries -> {output_path}")
+    return len(v4_ranges), len(v6_ranges)
+
+
+def _parse_range_bound(value):
+    """
+    Parse a range bound given as an IP string or an integer
+
+    Returns:
+        tuple: (integer value, IP version)
+    """
+    value = value.strip().strip('"')
+    if value.isdigit():
+        number = int(value)
+        # Integer bounds are IPv4 unless they don't fit in 32 bits
+        return number, 4 if number <= 0xFFFFFFFF else 6
+
+    address = ipaddress.ip_address(value)
+    return int(address), address.version
+
+
+class _RangeTable:
+    """Sorted, non-overlapping IP ranges stored as columns in a memory-mapped buffer"""
+
+    def __init__(self, buffer, offset, count, key_size):
+        self.buffer = buffer
+        self.count = count
+        self.key_size = key_size
+        self.starts_offset = offset
+        self.ends_offset = offset + count * key_size
+        self.countries_offset = offset + 2 * count * key_size
+        self.end_offset = self.countries_offset + count * COUNTRY_INDEX_SIZE
+
+    def find(self, key):
+        """
+        Binary search for the range containing key (big-endian bytes)
+
+        Returns:
+            int: Country index, or None if no range contains the key
+        """
+        buffer = self.buffer
+        key_size = self.key_size
+        starts_offset = self.starts_offset
+
+        # Find the last range whose start <= key
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = starts_offset + middle * key_size
+            if buffer[position:position + key_size] <= key:
+                low = middle + 1
+            else:
+                high = middle
+
+        index = low - 1
+        if index < 0:
+            return None
+
+        end_position = self.ends_offset + index * key_size
+        if buffer[end_position:end_position + key_size] < key:
+            return None
+
+        return struct.unpack_from("<H", buffer, self.countries_offset + index * COUNTRY_INDEX_SIZE)[0]
+
+
+class LocalGeoIPDatabase:
+    """Memory-mapped IP -> country lookup table"""
+
+    def __init__(self, path):
+        """
+        Open a GeoIP database
+
+        Args:
+            path (str): Compiled .bin file, a source .csv (compiled next to it
+                        on first use) or a .mmdb file
+        """
+        self.path = path
+        self._mmdb_reader = None
+
+        if path.endswith('.mmdb'):
+            self._open_mmdb(path)
+            return
+
+        if path.endswith('.csv'):
+            compiled_path = f"{path}.bin"
+            if not os.path.exists(compiled_path) or os.path.getmtime(compiled_path) < os.path.getmtime(path):
+                compile_csv(path, compiled_path)
+            path = compiled_path
+
+        self._open_compiled(path)
+
+    def _open_compiled(self, path):
+        """Memory-map a compiled database file"""
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, v4_count, v6_count, country_table_size = struct.unpack_from(HEADER_FORMAT, self._buffer, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path} is not a compiled GeoIP database")
+
+        self._v4 = _RangeTable(self._buffer, HEADER_SIZE, v4_count, V4_KEY_SIZE)
+        self._v6 = _RangeTable(self._buffer, self._v4.end_offset, v6_count, V6_KEY_SIZE)
+
+        country_table_offset = self._v6.end_offset
+        self._countries = json.loads(self._buffer[country_table_offset:country_table_offset + country_table_size])
+
+        print(f"🗺️ Local GeoIP database loaded: {v4_count} IPv4 ranges, {v6_count} IPv6 ranges")
+
+    def _open_mmdb(self, path):
+        """Open a MaxMind-style database (requires the optional maxminddb package)"""
+        try:
+            import maxminddb
+        except ImportError:
+            raise ImportError("Reading .mmdb files requires the 'maxminddb' package (pip install maxminddb)")
+
+        self._mmdb_reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+        print(f"🗺️ Local GeoIP database loaded: {path}")
+
+    def lookup(self, ip_address):
+        """
+        Get the country for an IP address
+
+        Returns:
+            str: Country, or None if the IP is invalid or not in the database
+        """
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return None
+
+        if self._mmdb_reader is not None:
+            return self._lookup_mmdb(address)
+
+        # IPv4-mapped IPv6 addresses (::ffff:a.b.c.d) live in the IPv4 table
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+
+        if address.version == 4:
+            country_index = self._v4.find(address.packed)
+        else:
+            country_index = self._v6.find(address.packed)
+
+        return self._countries[country_index] if country_index is not None else None
+
+    def _lookup_mmdb(self, address):
+        """Look up an address in an .mmdb database"""
+        record = self._mmdb_reader.get(str(address))
+        if not record:
+            return None
+
+        country = record.get('country') or record.get('registered_country') or {}
+        names = country.get('names', {})
+        return names.get('en') or country.get('iso_code')
+
+    @staticmethod
+    def from_env():
+        """
+        Open the database configured with GEOIP_DATABASE_PATH
+
+        Returns:
+            LocalGeoIPDatabase: The database, or None if not configured or not loadable
+        """
+        path = os.getenv("GEOIP_DATABASE_PATH")
+        if not path:
+            return None
+
+        try:
+            return LocalGeoIPDatabase(path)
+        except Exception as e:
+            print(f"⚠️ Could not load local GeoIP database from {path}: {str(e)}")
+            return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'build':
+        compile_csv(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 4 and sys.argv[1] == 'lookup':
+        print(LocalGeoIPDatabase(sys.argv[2]).lookup(sys.argv[3]))
+    else:
+        print(__doc__)
+        sys.exit(1)
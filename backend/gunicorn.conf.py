@@ -0,0 +1,106 @@
+"""
+Production Server Configuration for Analytics API
+
+Serves the Flask app with gunicorn: a master process that forks
+GUNICORN_WORKERS worker processes, each handling GUNICORN_THREADS requests
+at a time (gthread workers). `python app.py` stays the development server.
+
+Each worker connects to MongoDB itself after the fork (a MongoClient must
+not be shared across fork), then warms up before it takes traffic:
+connects and pings, opens MONGO_MIN_POOL_SIZE pooled connections in the
+background and makes sure every existing package collection has its
+indexes. Background jobs still start on a worker's first request.
+
+On SIGTERM the master stops accepting connections and gives in-flight
+requests up to GUNICORN_GRACEFUL_TIMEOUT seconds to finish. Each worker
+then flushes the event buffer and the pending top event counts and closes
+its MongoDB connections before exiting.
+
+Every worker runs its own session cleanup scheduler and keeps its own
+response cache; with several workers, prefer SESSION_CLEANUP_IN_PROCESS=false
+and one `python session_cleanup.py` process.
+
+Configuration (environment):
+    GUNICORN_BIND              address to listen on (default 0.0.0.0:5001)
+    GUNICORN_WORKERS           worker processes (default 2 x CPU cores + 1)
+    GUNICORN_THREADS           request threads per worker (default 4)
+    GUNICORN_TIMEOUT           seconds before a stuck worker is restarted (default 30)
+    GUNICORN_GRACEFUL_TIMEOUT  seconds to drain in-flight requests on SIGTERM (default 30)
+    GUNICORN_MAX_REQUESTS      recycle a worker after this many requests (default 0 = never)
+    WORKER_WARMUP_INDEXES      check indexes on worker start (default true)
+    MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE   MongoDB connections per worker
+
+Throughput depends on the MongoDB deployment and the host, so measure it
+where the API is deployed: start the server and run the ingest load
+benchmark against it, e.g. with 4 workers x 8 threads:
+    GUNICORN_WORKERS=4 GUNICORN_THREADS=8 gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/ingest_load_benchmark.py --targets http://localhost:5001 --concurrency 256
+and compare with `python app.py` and the async ingestion server
+(async_ingest.py) under the same load.
+
+Usage (from the backend directory):
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recycling (with jitter so workers don't restart together) bounds memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+# The app is imported in each worker, so nothing from it is shared across fork
+preload_app = False
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG")  # e.g. "-" for stdout; off by default
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """Drop any MongoDB client inherited from the master (only possible with preload_app)"""
+    from mongodb_connection_manager import AnalyticsConnectionHolder
+
+    AnalyticsConnectionHolder.reset_after_fork()
+
+
+def post_worker_init(worker):
+    """Connect and check indexes before the worker accepts requests"""
+    from mongodb_connection_manager import AnalyticsConnectionHolder
+    from index_manager import index_manager
+
+    if not AnalyticsConnectionHolder.warm_up():
+        print(f"⚠️ Worker {worker.pid} started without a database connection - retrying on first request")
+        return
+
+    if os.getenv("WORKER_WARMUP_INDEXES", "true").lower() == "true":
+        collection_count = index_manager.ensure_all()
+        print(f"🔥 Worker {worker.pid} warmed up ({collection_count} package collections checked)")
+    else:
+        print(f"🔥 Worker {worker.pid} warmed up")
+
+
+def worker_exit(server, worker):
+    """Write out buffered data and close MongoDB once the worker has drained"""
+    from mongodb_connection_manager import AnalyticsConnectionHolder
+    from event_buffer import event_buffer
+    from heavy_hitters import top_event_tracker
+    from session_cleanup import session_cleanup_service
+
+    session_cleanup_service.stop()
+    event_buffer.stop()
+    top_event_tracker.stop()
+    AnalyticsConnectionHolder.close_connection()
+    print(f"🛑 Worker {worker.pid} stopped")
@@ -0,0 +1,303 @@
+"""
+Real-time Top Event Types for Analytics API
+
+Keeps the most frequent event types of each package in a Space-Saving
+summary: at most TOP_EVENTS_CAPACITY counters. Counting an event is a dict
+update for a tracked type and O(log capacity) (amortized) for a new one.
+Every event type that makes up more than 1/capacity of a package's events
+is guaranteed to be tracked, and each count overestimates the true count
+by at most its recorded error (never more than total / capacity).
+
+Each process counts the events it ingests in memory and a background thread
+merges those counts into {package}_heavy_hitters every
+TOP_EVENTS_SNAPSHOT_INTERVAL_SECONDS, so the summary survives restarts and
+combines the counts of every worker process. Space-Saving summaries are
+mergeable: the merged summary keeps the same error guarantee.
+
+Reads take the stored summary plus this process's pending counts - one
+document of at most `capacity` entries, whatever the event volume.
+"""
+
+import atexit
+import heapq
+import os
+import threading
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection
+
+TOP_EVENTS_CAPACITY = int(os.getenv("TOP_EVENTS_CAPACITY", "100"))
+
+SUMMARY_ID = "event_types"
+
+# Attempts at merging into the stored summary before the counts are kept for the next snapshot
+MAX_SNAPSHOT_ATTEMPTS = 5
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitter summary with a fixed number of counters"""
+
+    def __init__(self, capacity=TOP_EVENTS_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self._counters = {}  # item -> [count, error]
+
+        # Min-heap of (count, item) with lazy deletion: an entry is stale once
+        # its item's count has grown or the item was evicted. Increments don't
+        # touch the heap; stale entries are skipped (and re-pushed) when the
+        # smallest counter is needed.
+        self._heap = []
+
+    def add(self, item, count=1):
+        """Count an item, replacing the smallest counter if the summary is full"""
+        self.total += count
+
+        counter = self._counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+
+        if len(self._counters) < self.capacity:
+            self._counters[item] = [count, 0]
+            heapq.heappush(self._heap, (count, item))
+            return
+
+        # The new item inherits the smallest count as its possible overestimate
+        self._settle_min()
+        smallest_count, smallest_item = self._heap[0]
+        del self._counters[smallest_item]
+        self._counters[item] = [smallest_count + count, smallest_count]
+        heapq.heapreplace(self._heap, (smallest_count + count, item))
+
+    def min_count(self):
+        """Smallest count if the summary is full (the most an untracked item can have), else 0"""
+        if len(self._counters) < self.capacity:
+            return 0
+        self._settle_min()
+        return self._heap[0][0]
+
+    def _settle_min(self):
+        """Make the heap top the true smallest counter, refreshing stale entries on the way"""
+        while self._heap:
+            count, item = self._heap[0]
+            counter = self._counters.get(item)
+
+            if counter is None:
+                heapq.heappop(self._heap)  # Evicted
+            elif counter[0] != count:
+                heapq.heapreplace(self._heap, (counter[0], item))  # Grew since it was pushed
+            else:
+                return
+
+    def _rebuild_heap(self):
+        self._heap = [(counter[0], item) for item, counter in self._counters.items()]
+        heapq.heapify(self._heap)
+
+    def merge(self, other):
+        """
+        Merge another summary into this one
+
+        An item missing from a full summary may have been counted up to that
+        summary's smallest count, which is added to its count and error.
+        """
+        own_floor, other_floor = self.min_count(), other.min_count()
+
+        merged = {}
+        for item in self._counters.keys() | other._counters.keys():
+            own_count, own_error = self._counters.get(item, (own_floor, own_floor))
+            other_count, other_error = other._counters.get(item, (other_floor, other_floor))
+            merged[item] = [own_count + other_count, own_error + other_error]
+
+        largest = sorted(merged.items(), key=lambda entry: entry[1][0], reverse=True)[:self.capacity]
+        self._counters = {item: counter for item, counter in largest}
+        self._rebuild_heap()
+        self.total += other.total
+
+    def top(self, k):
+        """
+        Get the k largest counters with their error bounds
+
+        Returns:
+            list: {"name", "count", "error", "lower_bound", "guaranteed"} largest first.
+                  count is an upper bound of the true count, lower_bound = count - error;
+                  guaranteed means the item is certainly among the true top k.
+        """
+        ranked = sorted(self._counters.items(), key=lambda entry: entry[1][0], reverse=True)
+
+        # An item is certainly in the top k if its lower bound beats everything below it
+        next_count = ranked[k][1][0] if len(ranked) > k else self.min_count()
+
+        return [
+            {
+                "name": item,
+                "count": count,
+                "error": error,
+                "lower_bound": count - error,
+                "guaranteed": count - error >= next_count
+            }
+            for item, (count, error) in ranked[:k]
+        ]
+
+    def to_document(self):
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "counters": [{"item": item, "count": count, "error": error}
+                         for item, (count, error) in self._counters.items()]
+        }
+
+    @classmethod
+    def from_document(cls, document, capacity=TOP_EVENTS_CAPACITY):
+        summary = cls(capacity)
+        if document:
+            summary.total = document.get('total', 0)
+            counters = sorted(document.get('counters', []), key=lambda counter: counter['count'], reverse=True)
+            summary._counters = {counter['item']: [counter['count'], counter['error']]
+                                 for counter in counters[:capacity]}
+            summary._rebuild_heap()
+        return summary
+
+
+class TopEventTracker:
+    """Per-package event type counts of this process, merged into MongoDB in the background"""
+
+    def __init__(self):
+        self.capacity = TOP_EVENTS_CAPACITY
+        self.snapshot_interval_seconds = float(os.getenv("TOP_EVENTS_SNAPSHOT_INTERVAL_SECONDS", "30"))
+
+        self._pending = {}  # package_name -> SpaceSaving of counts not yet snapshotted
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        self._metrics = {
+            "snapshots": 0,
+            "failed_snapshots": 0,
+            "last_snapshot_at": None
+        }
+
+        atexit.register(self.snapshot)
+
+    def record(self, package_name, event_types):
+        """Count ingested event types (constant time per event)"""
+        with self._lock:
+            summary = self._pending.get(package_name)
+            if summary is None:
+                summary = self._pending[package_name] = SpaceSaving(self.capacity)
+
+            for event_type in event_types:
+                summary.add(event_type)
+
+    def ensure_started(self):
+        """Start the snapshot thread on first use (so it is created after any fork)"""
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="top-events-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the snapshot thread and write out the pending counts"""
+        self._stop_event.set()
+        self.snapshot()
+
+    def run_forever(self):
+        """Snapshot loop: wait for the next interval, then merge the pending counts"""
+        while not self._stop_event.wait(self.snapshot_interval_seconds):
+            self.snapshot()
+
+    def snapshot(self):
+        """Merge every package's pending counts into its stored summary"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        db = AnalyticsConnectionHolder.get_db()
+
+        for package_name, summary in pending.items():
+            merged = db is not None and self._merge_into_stored(db, package_name, summary)
+
+            if not merged:
+                # Keep the counts for the next snapshot
+                with self._lock:
+                    self._metrics["failed_snapshots"] += 1
+                    current = self._pending.get(package_name)
+                    if current is not None:
+                        summary.merge(current)
+                    self._pending[package_name] = summary
+
+        with self._lock:
+            self._metrics["snapshots"] += 1
+            self._metrics["last_snapshot_at"] = datetime.now().isoformat()
+
+    def _merge_into_stored(self, db, package_name, summary):
+        """
+        Merge counts into the stored summary (optimistic concurrency on a version field)
+
+        Returns:
+            bool: True if the counts were stored
+        """
+        collection = get_package_collection(db, package_name, "heavy_hitters")
+
+        try:
+            for _ in range(MAX_SNAPSHOT_ATTEMPTS):
+                stored = collection.find_one({"_id": SUMMARY_ID})
+                version = stored.get('version', 0) if stored else 0
+
+                merged = SpaceSaving.from_document(stored, self.capacity)
+                merged.merge(summary)
+                document = {**merged.to_document(), "version": version + 1, "updated_at": datetime.now()}
+
+                if stored is None:
+                    try:
+                        collection.insert_one({"_id": SUMMARY_ID, **document})
+                        return True
+                    except DuplicateKeyError:
+                        continue  # Another worker stored the first snapshot - merge into it
+
+                result = collection.replace_one({"_id": SUMMARY_ID, "version": version}, document)
+                if result.matched_count == 1:
+                    return True
+
+            print(f"⚠️ Top events snapshot for {package_name} kept losing to concurrent writers, retrying later")
+            return False
+
+        except Exception as e:
+            print(f"⚠️ Failed to snapshot top events for {package_name}: {str(e)}")
+            return False
+
+    def get_summary(self, db, package_name):
+        """Get the stored summary merged with this process's pending counts"""
+        stored = get_package_collection(db, package_name, "heavy_hitters").find_one({"_id": SUMMARY_ID})
+        summary = SpaceSaving.from_document(stored, self.capacity)
+
+        with self._lock:
+            pending = self._pending.get(package_name)
+            if pending is not None:
+                summary.merge(pending)
+
+        return summary, stored.get('updated_at') if stored else None
+
+    def get_metrics(self):
+        """Get snapshot counters for monitoring"""
+        with self._lock:
+            return {
+                "snapshot_running": self._thread is not None and self._thread.is_alive(),
+                "snapshot_interval_seconds": self.snapshot_interval_seconds,
+                "capacity": self.capacity,
+                "pending_packages": len(self._pending),
+                **self._metrics
+            }
+
+
+top_event_tracker = TopEventTracker()
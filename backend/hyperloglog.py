@@ -0,0 +1,274 @@
+"""
+HyperLogLog Unique-User Sketches for Analytics API
+
+Approximate distinct user counts kept per package in {package}_user_sketches
+and updated at ingest time, so the dashboard can show unique users per
+crash or event type without collecting every user ID again.
+
+A sketch is a HyperLogLog with 2^HLL_PRECISION registers (about 1.6%
+standard error at the default precision of 12). Registers are stored as a
+sparse sub-document {"<index>": rank} and updated with $max upserts, which
+are atomic, idempotent and commutative - so concurrent writers never lose
+an update, and sketches can be merged (register-wise max) across days.
+Changing HLL_PRECISION requires a rebuild of the stored sketches.
+
+Document layout (one document per sketch, keyed by _id):
+    crash_users:<signature>:total             users affected by a crash, all time
+    crash_users:<signature>:day:2024-05-01    ... on one day (UTC)
+    event_users:<event type>:total / :day:... users who sent an event type
+    active_users:total / active_users:day:... users who sent any event or crash
+
+Usage (rebuild sketches from raw data, e.g. for existing packages):
+    python hyperloglog.py rebuild [package_name]
+"""
+
+import hashlib
+import math
+import os
+import sys
+from collections import defaultdict
+from datetime import timedelta
+
+from pymongo import UpdateOne
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection, get_package_collection_async
+from validation_utils import to_utc_naive
+
+HLL_PRECISION = int(os.getenv("HLL_PRECISION", "12"))
+
+DAY_FORMAT = "%Y-%m-%d"
+
+
+class HyperLogLog:
+    """HyperLogLog cardinality estimator over a register array"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.registers = bytearray(self.register_count)
+
+    def add(self, value):
+        """Count a value (hashed as its string form)"""
+        index, rank = get_register_update(value, self.precision)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, registers):
+        """Merge sparse registers ({index: rank}) from a stored sketch"""
+        for index, rank in registers.items():
+            index = int(index)
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+
+    def count(self):
+        """Estimate the number of distinct values added"""
+        m = self.register_count
+        alpha = 0.7213 / (1 + 1.079 / m)
+
+        harmonic_sum = sum(2.0 ** -rank for rank in self.registers)
+        estimate = alpha * m * m / harmonic_sum
+
+        # Small cardinalities: linear counting over the empty registers is more accurate
+        empty_registers = self.registers.count(0)
+        if estimate <= 2.5 * m and empty_registers > 0:
+            estimate = m * math.log(m / empty_registers)
+
+        return int(round(estimate))
+
+
+def get_register_update(value, precision=HLL_PRECISION):
+    """
+    Get the register a value falls into and the rank it would set
+
+    The first `precision` bits of a 64-bit hash pick the register; the rank
+    is the position of the first 1 bit in the remaining bits.
+
+    Returns:
+        tuple: (register_index, rank)
+    """
+    hashed = int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+    remaining_bits = 64 - precision
+
+    index = hashed >> remaining_bits
+    rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+    return index, rank
+
+
+class SketchAccumulator:
+    """Collects register updates so they can be written in one bulk write"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self._registers = defaultdict(dict)  # sketch_id -> {index: rank}
+        self._fields = {}
+
+    def add(self, sketch_id, fields, user_id):
+        """Count a user in the sketch document sketch_id"""
+        index, rank = get_register_update(user_id, self.precision)
+        registers = self._registers[sketch_id]
+        if rank > registers.get(index, 0):
+            registers[index] = rank
+        self._fields[sketch_id] = fields
+
+    def add_user(self, metric, key, user_id, timestamp):
+        """Count a user in the all-time and daily sketches of a metric"""
+        if not user_id:
+            return
+
+        prefix = f"{metric}:{key}" if key is not None else metric
+        self.add(f"{prefix}:total", {"metric": metric, "key": key, "granularity": "total"}, user_id)
+
+        day = to_utc_naive(timestamp).strftime(DAY_FORMAT)
+        self.add(f"{prefix}:day:{day}", {"metric": metric, "key": key, "granularity": "day", "day": day}, user_id)
+
+    def add_event(self, event_type, user_id, timestamp):
+        self.add_user("event_users", event_type, user_id, timestamp)
+        self.add_user("active_users", None, user_id, timestamp)
+
+    def add_crash(self, crash_signature, user_id, timestamp):
+        self.add_user("crash_users", crash_signature, user_id, timestamp)
+        self.add_user("active_users", None, user_id, timestamp)
+
+    def operations(self):
+        """Build one $max upsert per sketch document"""
+        return [
+            UpdateOne(
+                {"_id": sketch_id},
+                {
+                    "$max": {f"registers.{index}": rank for index, rank in registers.items()},
+                    "$setOnInsert": {**self._fields[sketch_id], "precision": self.precision}
+                },
+                upsert=True
+            )
+            for sketch_id, registers in self._registers.items()
+        ]
+
+
+def write_sketches(db, package_name, accumulator):
+    """
+    Apply the accumulated register updates for a package
+
+    Failures are logged but never fail the ingest request; raw data stays the
+    source of truth and `python hyperloglog.py rebuild` repairs any gaps.
+    """
+    operations = accumulator.operations()
+    if not operations:
+        return
+
+    try:
+        get_package_collection(db, package_name, "user_sketches").bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"⚠️ Failed to update user sketches for {package_name}: {str(e)}")
+
+
+async def write_sketches_async(db, package_name, accumulator):
+    """Same as write_sketches, for an async (Motor) database"""
+    operations = accumulator.operations()
+    if not operations:
+        return
+
+    try:
+        collection = await get_package_collection_async(db, package_name, "user_sketches")
+        await collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"⚠️ Failed to update user sketches for {package_name}: {str(e)}")
+
+
+# ===== READ HELPERS =====
+
+def estimate_unique_users(sketches_collection, sketch_ids):
+    """Estimate the distinct users of several sketches merged together (e.g. a range of days)"""
+    sketch = HyperLogLog()
+    for document in sketches_collection.find({"_id": {"$in": list(sketch_ids)}}, {"registers": 1}):
+        sketch.merge(document.get('registers', {}))
+    return sketch.count()
+
+
+def get_unique_user_counts(sketches_collection, metric, keys):
+    """
+    Get the approximate all-time unique users of several keys of a metric
+
+    Returns:
+        dict: key -> estimated unique users (0 for keys without a sketch)
+    """
+    sketch_ids = {f"{metric}:{key}:total": key for key in keys}
+    counts = dict.fromkeys(keys, 0)
+
+    for document in sketches_collection.find({"_id": {"$in": list(sketch_ids)}}, {"registers": 1}):
+        sketch = HyperLogLog()
+        sketch.merge(document.get('registers', {}))
+        counts[sketch_ids[document['_id']]] = sketch.count()
+
+    return counts
+
+
+def get_unique_users_between(sketches_collection, metric, key, start, end):
+    """
+    Get the approximate unique users of a metric over a range of UTC days
+
+    Args:
+        start (datetime): First day (inclusive)
+        end (datetime): Last day (exclusive)
+    """
+    prefix = f"{metric}:{key}" if key is not None else metric
+    day = to_utc_naive(start).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = to_utc_naive(end)
+
+    sketch_ids = []
+    while day < end:
+        sketch_ids.append(f"{prefix}:day:{day.strftime(DAY_FORMAT)}")
+        day += timedelta(days=1)
+
+    return estimate_unique_users(sketches_collection, sketch_ids)
+
+
+# ===== REBUILD =====
+
+def rebuild_package_sketches(db, package_name):
+    """Recompute a package's user sketches from its raw events and crash occurrences"""
+    accumulator = SketchAccumulator()
+
+    events = db[f"{package_name}_events"].find({"user_id": {"$ne": None}}, {"event_type": 1, "user_id": 1, "timestamp": 1})
+    for event in events:
+        if event.get('timestamp'):
+            accumulator.add_event(event.get('event_type'), event['user_id'], event['timestamp'])
+
+    buckets = db[f"{package_name}_crash_occurrences"].find(
+        {}, {"crash_signature": 1, "occurrences.user_id": 1, "occurrences.timestamp": 1}
+    )
+    for bucket in buckets:
+        for occurrence in bucket.get('occurrences', []):
+            if occurrence.get('timestamp'):
+                accumulator.add_crash(bucket['crash_signature'], occurrence.get('user_id'), occurrence['timestamp'])
+
+    sketches_collection = get_package_collection(db, package_name, "user_sketches")
+    sketches_collection.delete_many({})
+
+    operations = accumulator.operations()
+    for i in range(0, len(operations), 1000):
+        sketches_collection.bulk_write(operations[i:i + 1000], ordered=False)
+
+    print(f"✅ Rebuilt {len(operations)} user sketches for {package_name}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) in (2, 3) and sys.argv[1] == 'rebuild':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        database = AnalyticsConnectionHolder.get_db()
+        if database is None:
+            sys.exit(1)
+
+        if len(sys.argv) == 3:
+            package_names = [sys.argv[2]]
+        else:
+            package_names = sorted(name[:-len('_events')] for name in database.list_collection_names()
+                                   if name.endswith('_events'))
+
+        for name in package_names:
+            rebuild_package_sketches(database, name)
+    else:
+        print(__doc__)
+        sys.exit(1)
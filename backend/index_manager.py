@@ -0,0 +1,200 @@
+"""
+Index Manager for Analytics API
+
+Makes sure every per-package collection has the indexes its queries need.
+Indexes are created the first time a collection is touched in this process;
+after that the check is a set lookup, so the hot path pays nothing.
+
+Existing collections should be indexed ahead of time - by the CLI below or
+the gunicorn worker warm-up (gunicorn.conf.py) - so requests only build
+indexes for a brand-new package. Builds hold a per-collection lock: a slow
+build never stalls requests for other packages.
+
+Usage (build indexes for all existing packages):
+    python index_manager.py
+"""
+
+import threading
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+
+# Indexes per collection type, keyed by collection name suffix.
+# The list endpoints page by (sort field, _id), see pagination.py.
+PACKAGE_INDEXES = {
+    "_events": [
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id_desc"),
+        IndexModel([("event_type", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="event_type_timestamp_id"),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),  # incremental columnar export
+    ],
+    "_users": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("last_active", DESCENDING), ("_id", DESCENDING)], name="last_active_id_desc"),
+        IndexModel([("first_seen", ASCENDING)], name="first_seen"),
+        IndexModel([("country", ASCENDING)], name="country"),
+    ],
+    "_sessions": [
+        IndexModel([("session_id", ASCENDING)], name="session_id"),
+        IndexModel([("start_time", DESCENDING), ("_id", DESCENDING)], name="start_time_id_desc"),
+        IndexModel([("end_time", ASCENDING), ("start_time", ASCENDING)], name="end_time_start_time"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),  # incremental columnar export
+    ],
+    "_crashes": [
+        IndexModel([("crash_signature", ASCENDING)], name="crash_signature_unique", unique=True),
+        IndexModel([("last_seen", DESCENDING), ("_id", DESCENDING)], name="last_seen_id_desc"),
+        IndexModel([("count", DESCENDING), ("_id", DESCENDING)], name="count_id_desc"),
+        IndexModel([("first_seen", DESCENDING), ("_id", DESCENDING)], name="first_seen_id_desc"),
+    ],
+    "_crash_occurrences": [
+        IndexModel([("crash_signature", ASCENDING), ("bucket_start", DESCENDING)], name="crash_signature_bucket_start"),
+        IndexModel([("bucket_start", DESCENDING)], name="bucket_start_desc"),
+    ],
+    "_rollups": [
+        IndexModel([("metric", ASCENDING), ("granularity", ASCENDING), ("period_start", DESCENDING)],
+                   name="metric_granularity_period_start"),
+        IndexModel([("metric", ASCENDING), ("count", DESCENDING)], name="metric_count"),
+    ],
+    "_cohorts": [
+        IndexModel([("cohort_start", DESCENDING)], name="cohort_start_desc"),
+    ],
+}
+
+
+class IndexManager:
+    """Creates per-package indexes once per collection per process"""
+
+    def __init__(self):
+        self._ensured = set()
+        self._lock = threading.Lock()  # Guards _collection_locks only
+        self._collection_locks = {}  # collection name -> lock held while its indexes are built
+
+    def ensure_indexes(self, db, collection_name):
+        """
+        Create the indexes for a package collection if not done yet in this process
+
+        Args:
+            db: Database instance
+            collection_name (str): e.g. "com.example.app_events"
+        """
+        if collection_name in self._ensured:
+            return
+
+        suffix = self._get_suffix(collection_name)
+        if suffix is None:
+            return
+
+        # Per-collection lock: a slow build (e.g. a unique index on a large
+        # existing collection) only holds up requests for that collection
+        with self._get_collection_lock(collection_name):
+            if collection_name in self._ensured:
+                return
+
+            collection = db[collection_name]
+
+            for index in PACKAGE_INDEXES[suffix]:
+                try:
+                    collection.create_indexes([index])
+                except OperationFailure as e:
+                    # e.g. a unique index over data that already has duplicates
+                    print(f"⚠️ Could not create index {index.document['name']} on {collection_name}: {str(e)}")
+
+            self._ensured.add(collection_name)
+            print(f"🗂️ Indexes ensured for {collection_name}")
+
+        with self._lock:
+            self._collection_locks.pop(collection_name, None)
+
+    def _get_collection_lock(self, collection_name):
+        with self._lock:
+            return self._collection_locks.setdefault(collection_name, threading.Lock())
+
+    async def ensure_indexes_async(self, db, collection_name):
+        """
+        Same as ensure_indexes, for an async (Motor) database
+
+        No lock: concurrent first requests may both send create_indexes,
+        which is idempotent.
+        """
+        if collection_name in self._ensured:
+            return
+
+        suffix = self._get_suffix(collection_name)
+        if suffix is None:
+            return
+
+        collection = db[collection_name]
+
+        for index in PACKAGE_INDEXES[suffix]:
+            try:
+                await collection.create_indexes([index])
+            except OperationFailure as e:
+                print(f"⚠️ Could not create index {index.document['name']} on {collection_name}: {str(e)}")
+
+        self._ensured.add(collection_name)
+        print(f"🗂️ Indexes ensured for {collection_name}")
+
+    def ensure_all(self):
+        """
+        Create indexes for every existing package collection
+
+        Returns:
+            int: Number of collections processed
+        """
+        db = AnalyticsConnectionHolder.get_db()
+        if db is None:
+            print("❌ Cannot connect to database to build indexes")
+            return 0
+
+        collection_names = [name for name in db.list_collection_names() if self._get_suffix(name)]
+
+        for collection_name in sorted(collection_names):
+            self.ensure_indexes(db, collection_name)
+
+        return len(collection_names)
+
+    def _get_suffix(self, collection_name):
+        """Get the collection type suffix, or None for collections we don't manage"""
+        for suffix in PACKAGE_INDEXES:
+            if collection_name.endswith(suffix):
+                return suffix
+        return None
+
+
+index_manager = IndexManager()
+
+
+def get_package_collection(db, package_name, collection_type):
+    """
+    Get a package collection, making sure its indexes exist
+
+    Args:
+        db: Database instance
+        package_name (str): App package name
+        collection_type (str): "events", "users", "sessions", "crashes",
+                               "crash_occurrences", "rollups", "user_activity", "cohorts",
+                               "user_sketches" or "heavy_hitters"
+
+    Returns:
+        Collection: The package-specific collection
+    """
+    collection_name = f"{package_name}_{collection_type}"
+    index_manager.ensure_indexes(db, collection_name)
+    return db[collection_name]
+
+
+async def get_package_collection_async(db, package_name, collection_type):
+    """Same as get_package_collection, for an async (Motor) database"""
+    collection_name = f"{package_name}_{collection_type}"
+    await index_manager.ensure_indexes_async(db, collection_name)
+    return db[collection_name]
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    processed = index_manager.ensure_all()
+    print(f"✅ Indexes built for {processed} collections")
@@ -3,15 +3,189 @@ IP Geolocation Service for Analytics API
 Detects user country from IP address
 """
 
+import atexit
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
 import requests
 from flask import request
 import json
 
+from geoip_database import LocalGeoIPDatabase
+
+
+class GeolocationCache:
+    """
+    Thread-safe LRU cache of IP -> country lookups with a TTL
+
+    Failed lookups (None) are cached too, with a shorter TTL, so a flaky
+    IP is not retried against the external services on every request.
+    Optionally persisted to a JSON file so restarts don't begin cold.
+    """
+
+    def __init__(self, max_size=10000, ttl_seconds=86400, negative_ttl_seconds=300,
+                 persist_path=None, persist_every=50):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.persist_path = persist_path
+        self.persist_every = persist_every
+
+        self._entries = OrderedDict()  # ip -> (country, expires_at)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # One save at a time (lookups keep using _lock)
+        self._unsaved_changes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, ip_address):
+        """
+        Look up a cached result
+
+        Returns:
+            tuple: (found, country) - country may be None for a cached failure
+        """
+        with self._lock:
+            entry = self._entries.get(ip_address)
+
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[ip_address]
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(ip_address)
+            self.hits += 1
+            return True, entry[0]
+
+    def set(self, ip_address, country):
+        """Cache a lookup result (None means the lookup failed)"""
+        ttl = self.ttl_seconds if country else self.negative_ttl_seconds
+
+        with self._lock:
+            self._entries[ip_address] = (country, time.time() + ttl)
+            self._entries.move_to_end(ip_address)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+            self._unsaved_changes += 1
+            should_save = self.persist_path and self._unsaved_changes >= self.persist_every
+
+        if should_save:
+            self.save()
+
+    def get_stats(self):
+        """Get hit/miss counters for monitoring"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 3) if total > 0 else 0
+            }
+
+    def load(self):
+        """Load non-expired entries from the persistence file"""
+        try:
+            with open(self.persist_path, 'r') as f:
+                saved_entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load geolocation cache from {self.persist_path}: {str(e)}")
+            return
+
+        if not isinstance(saved_entries, dict):
+            print(f"⚠️ Ignoring geolocation cache {self.persist_path}: unexpected format")
+            return
+
+        now = time.time()
+        skipped = 0
+        with self._lock:
+            for ip_address, entry in saved_entries.items():
+                if not self._is_valid_entry(entry):
+                    skipped += 1
+                    continue
+
+                country, expires_at = entry
+                if expires_at > now:
+                    self._entries[ip_address] = (country, expires_at)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        if skipped:
+            print(f"⚠️ Skipped {skipped} malformed geolocation cache entries")
+        print(f"🌍 Loaded {len(self._entries)} cached geolocation entries")
+
+    @staticmethod
+    def _is_valid_entry(entry):
+        """A saved entry is [country or null, expires_at]"""
+        return (
+            isinstance(entry, list) and len(entry) == 2
+            and (entry[0] is None or isinstance(entry[0], str))
+            and isinstance(entry[1], (int, float)) and not isinstance(entry[1], bool)
+        )
+
+    def save(self):
+        """
+        Write the cache to the persistence file (atomically)
+
+        Each save writes its own temporary file, so concurrent saves from
+        other threads or worker processes never interleave; the last
+        os.replace wins with a complete file.
+        """
+        if not self.persist_path:
+            return
+
+        with self._save_lock:
+            with self._lock:
+                snapshot = dict(self._entries)
+                self._unsaved_changes = 0
+
+            temp_path = None
+            try:
+                with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(self.persist_path)),
+                                                 prefix=f"{os.path.basename(self.persist_path)}.",
+                                                 suffix=".tmp", delete=False) as f:
+                    temp_path = f.name
+                    json.dump(snapshot, f)
+                os.replace(temp_path, self.persist_path)
+            except OSError as e:
+                print(f"⚠️ Could not save geolocation cache to {self.persist_path}: {str(e)}")
+                if temp_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
+
 
 class IPGeolocationService:
     """Service to detect country from IP address"""
 
     def __init__(self):
+        # Offline lookups (GEOIP_DATABASE_PATH); the HTTP services become a fallback
+        self.local_db = LocalGeoIPDatabase.from_env()
+        self.http_fallback_enabled = os.getenv("GEOIP_HTTP_FALLBACK", "true").lower() == "true"
+
+        self.cache = GeolocationCache(
+            max_size=int(os.getenv("GEO_CACHE_MAX_SIZE", "10000")),
+            ttl_seconds=int(os.getenv("GEO_CACHE_TTL_SECONDS", "86400")),
+            negative_ttl_seconds=int(os.getenv("GEO_CACHE_NEGATIVE_TTL_SECONDS", "300")),
+            persist_path=os.getenv("GEO_CACHE_FILE")
+        )
+
         # Free IP geolocation APIs
         self.services = [
             {
@@ -28,15 +202,25 @@ class IPGeolocationService:
 
     def get_client_ip(self):
         """Get the real IP address of the client"""
+        return self.resolve_client_ip(request.headers, request.remote_addr)
+
+    def resolve_client_ip(self, headers, remote_addr):
+        """
+        Get the client IP from request headers and the peer address
+
+        Args:
+            headers: Case-insensitive request headers mapping
+            remote_addr (str): Address of the direct peer
+        """
         # Check for forwarded IP first
-        if request.headers.get('X-Forwarded-For'):
+        if headers.get('X-Forwarded-For'):
             # X-Forwarded-For can contain multiple IPs, take the first one
-            ip = request.headers.get('X-Forwarded-For').split(',')[0].strip()
-        elif request.headers.get('X-Real-IP'):
-            ip = request.headers.get('X-Real-IP')
+            ip = headers.get('X-Forwarded-For').split(',')[0].strip()
+        elif headers.get('X-Real-IP'):
+            ip = headers.get('X-Real-IP')
         else:
             # Direct connection
-            ip = request.remote_addr
+            ip = remote_addr
 
         # Handle localhost/development cases
         if ip in ['127.0.0.1', 'localhost', '::1']:
@@ -58,6 +242,41 @@ class IPGeolocationService:
         if ip_address is None:
             ip_address = self.get_client_ip()
 
+        if self.local_db is not None:
+            country = self.local_db.lookup(ip_address)
+            if country or not self.http_fallback_enabled:
+                return country
+
+        found, country = self.cache.get(ip_address)
+        if found:
+            return country
+
+        country = self._lookup_ip(ip_address)
+        self.cache.set(ip_address, country)
+        return country
+
+    async def get_country_from_ip_async(self, ip_address, http_client):
+        """
+        Same as get_country_from_ip, with the external services queried
+        through an async HTTP client (e.g. httpx.AsyncClient)
+
+        Local database and cache lookups stay synchronous - they never block.
+        """
+        if self.local_db is not None:
+            country = self.local_db.lookup(ip_address)
+            if country or not self.http_fallback_enabled:
+                return country
+
+        found, country = self.cache.get(ip_address)
+        if found:
+            return country
+
+        country = await self._lookup_ip_async(ip_address, http_client)
+        self.cache.set(ip_address, country)
+        return country
+
+    def _lookup_ip(self, ip_address):
+        """Query the external services in order until one returns a country"""
         print(f"🌍 Looking up country for IP: {ip_address}")
 
         for service in self.services:
@@ -90,6 +309,40 @@ class IPGeolocationService:
 
         return None
 
+    async def _lookup_ip_async(self, ip_address, http_client):
+        """Async version of _lookup_ip"""
+        print(f"🌍 Looking up country for IP: {ip_address}")
+
+        for service in self.services:
+            try:
+                country = await self._try_service_async(service, ip_address, http_client)
+                if country:
+                    print(f"✅ IP geolocation successful via {service['name']}: {country}")
+                    return country
+
+            except Exception as e:
+                print(f"⚠️ IP service {service['name']} failed: {str(e)}")
+                continue
+
+        print("❌ All IP geolocation services failed")
+        return None
+
+    async def _try_service_async(self, service, ip_address, http_client):
+        """Async version of _try_service"""
+        url = service["url"].format(ip=ip_address)
+
+        response = await http_client.get(url, timeout=3)
+
+        if response.status_code == 200:
+            data = response.json()
+
+            country = data.get(service["country_field"])
+
+            if country and country != "Unknown" and len(country) > 1:
+                return country
+
+        return None
+
     def get_country_with_fallback(self, client_country=None):
         """
         Get country using hybrid approach: IP geolocation + client fallback
@@ -104,6 +357,19 @@ class IPGeolocationService:
         # Try IP geolocation first
         ip_country = self.get_country_from_ip()
 
+        return self.build_location_result(ip_country, client_country)
+
+    def build_location_result(self, ip_country, client_country=None):
+        """
+        Combine an IP lookup result with the client's locale country
+
+        Args:
+            ip_country: Country from IP geolocation (None if it failed)
+            client_country: Country detected by client (from locale)
+
+        Returns:
+            dict: Contains country, detection_method, and confidence
+        """
         if ip_country:
             result = {
                 "country": ip_country,
@@ -0,0 +1,93 @@
+"""
+Fast JSON Responses for Analytics API
+
+A Flask JSON provider that serializes responses with orjson, which encodes
+datetimes (as ISO 8601, like datetime.isoformat()) and strings natively
+in Rust, so controllers can hand MongoDB documents to jsonify as they are.
+
+The output is byte-for-byte what Flask's default provider produces for the
+same data (sorted keys, compact separators, ASCII-only with \\uXXXX
+escapes, trailing newline), except that datetimes are ISO 8601 instead of
+RFC 822 and NaN/Infinity become null. Payloads orjson formats differently -
+floats written in exponent notation, integers beyond 64 bits - fall back to
+the standard library encoder.
+
+orjson is optional: without it (or with FAST_JSON_ENABLED=false) the
+standard library encoder is used for everything, with the same datetime
+format. Debug mode keeps Flask's pretty-printed output.
+"""
+
+import os
+import re
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "true").lower() == "true"
+
+# Characters the standard encoder escapes but orjson writes as-is (DEL and non-ASCII)
+NON_ASCII_PATTERN = re.compile(r"[^\x00-\x7e]")
+
+# Floats orjson writes differently: exponents ("1e-7") and small decimals ("0.00001").
+# A number follows ":", "," or "[" in compact output; a match inside a string
+# only costs a fallback.
+FLOAT_MISMATCH_PATTERN = re.compile(rb"(?:^|[:,\[])-?(?:[0-9]+(?:\.[0-9]+)?e|0\.0000)")
+
+
+def _escape_character(match):
+    """Escape one character the way json.dumps(ensure_ascii=True) does"""
+    code_point = ord(match.group())
+    if code_point > 0xFFFF:
+        code_point -= 0x10000
+        return "\\u{0:04x}\\u{1:04x}".format(0xD800 | (code_point >> 10), 0xDC00 | (code_point & 0x3FF))
+    return "\\u{0:04x}".format(code_point)
+
+
+def _default_with_iso_dates(value):
+    """Flask's fallback encoder, with datetimes as ISO 8601 (same as orjson)"""
+    if isinstance(value, date):
+        return value.isoformat()
+    return _default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that serializes responses with orjson when it can"""
+
+    default = staticmethod(_default_with_iso_dates)
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.fast_enabled = FAST_JSON_ENABLED and orjson is not None
+
+        if self.fast_enabled:
+            print("⚡ Fast JSON responses enabled (orjson)")
+
+    def response(self, *args, **kwargs):
+        """Build a JSON response (same signature as Flask's jsonify)"""
+        obj = self._prepare_response_obj(args, kwargs)
+
+        if self._app.debug or not self.fast_enabled:
+            return super().response(obj)
+
+        return self._app.response_class(f"{self.dumps_compact(obj)}\n", mimetype=self.mimetype)
+
+    def dumps_compact(self, obj):
+        """Serialize like the default provider does for responses, with orjson when possible"""
+        if self.fast_enabled:
+            try:
+                data = orjson.dumps(obj, default=_default, option=orjson.OPT_SORT_KEYS)
+            except orjson.JSONEncodeError:
+                data = None
+
+            if data is not None and not FLOAT_MISMATCH_PATTERN.search(data):
+                text = data.decode("utf-8")
+                if not text.isascii() or "\x7f" in text:
+                    text = NON_ASCII_PATTERN.sub(_escape_character, text)
+                return text
+
+        return self.dumps(obj, separators=(",", ":"))
@@ -1,15 +1,34 @@
 import os
+import threading
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 
 
 class AnalyticsConnectionHolder:
-    """Singleton class to manage MongoDB connection for Analytics API"""
+    """
+    Singleton class to manage MongoDB connection for Analytics API
+
+    The client belongs to the process that created it: a forked worker
+    (e.g. under gunicorn) that inherits one drops it and connects again on
+    first use, since a MongoClient is not safe to use across fork.
+
+    Creating, replacing and closing the client happens under a lock, so
+    concurrent request threads never build more than one client.
+    """
     __db = None
+    __pid = None
+    __lock = threading.Lock()
 
     @staticmethod
     def initialize_db():
         """Initialize database connection with error handling"""
+        with AnalyticsConnectionHolder.__lock:
+            return AnalyticsConnectionHolder._initialize_locked()
+
+    @staticmethod
+    def _initialize_locked():
+        AnalyticsConnectionHolder._discard_if_forked()
+
         if AnalyticsConnectionHolder.__db is None:
             try:
                 # Get connection details from environment variables
@@ -22,7 +41,12 @@ class AnalyticsConnectionHolder:
                 print("🔗 Connecting to MongoDB...")
 
                 # Create MongoDB client with connection string
-                client = MongoClient(connection_string, server_api=ServerApi('1'))
+                client = MongoClient(
+                    connection_string,
+                    server_api=ServerApi('1'),
+                    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+                    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+                )
 
                 # Test connection
                 client.admin.command('ping')
@@ -30,6 +54,7 @@ class AnalyticsConnectionHolder:
 
                 # Set the database instance
                 AnalyticsConnectionHolder.__db = client[db_name]
+                AnalyticsConnectionHolder.__pid = os.getpid()
 
             except Exception as e:
                 print(f"❌ Database connection error: {e}")
@@ -40,14 +65,61 @@ class AnalyticsConnectionHolder:
     @staticmethod
     def get_db():
         """Get database instance, initialize if needed"""
-        if AnalyticsConnectionHolder.__db is None:
-            AnalyticsConnectionHolder.initialize_db()
-        return AnalyticsConnectionHolder.__db
+        db = AnalyticsConnectionHolder.__db
+        if db is not None and AnalyticsConnectionHolder.__pid == os.getpid():
+            return db
+
+        # Checked again under the lock: another thread may have connected meanwhile
+        return AnalyticsConnectionHolder.initialize_db()
+
+    @staticmethod
+    def reset_after_fork():
+        """Forget a client inherited from the parent process (runs in the child after every fork)"""
+        # The parent's lock may have been held by another thread at fork time
+        AnalyticsConnectionHolder.__lock = threading.Lock()
+        AnalyticsConnectionHolder._discard_if_forked()
+
+    @staticmethod
+    def warm_up():
+        """
+        Connect now instead of on the first request
+
+        With MONGO_MIN_POOL_SIZE set, the driver also opens that many pooled
+        connections in the background.
+
+        Returns:
+            bool: True if the database is reachable
+        """
+        db = AnalyticsConnectionHolder.get_db()
+        if db is None:
+            return False
+
+        try:
+            db.command('ping')
+            return True
+        except Exception as e:
+            print(f"❌ Database warm-up failed: {e}")
+            return False
 
     @staticmethod
     def close_connection():
         """Close database connection (for cleanup)"""
-        if AnalyticsConnectionHolder.__db is not None:
-            AnalyticsConnectionHolder.__db.client.close()
+        with AnalyticsConnectionHolder.__lock:
+            AnalyticsConnectionHolder._discard_if_forked()
+
+            if AnalyticsConnectionHolder.__db is not None:
+                AnalyticsConnectionHolder.__db.client.close()
+                AnalyticsConnectionHolder.__db = None
+                print("🔒 Database connection closed")
+
+    @staticmethod
+    def _discard_if_forked():
+        """Drop the client if it was created by another (parent) process"""
+        if AnalyticsConnectionHolder.__db is not None and AnalyticsConnectionHolder.__pid != os.getpid():
+            # Not closed: its sockets are shared with the parent, which still uses them
             AnalyticsConnectionHolder.__db = None
-            print("🔒 Database connection closed")
\ No newline at end of file
+            AnalyticsConnectionHolder.__pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=AnalyticsConnectionHolder.reset_after_fork)
@@ -0,0 +1,143 @@
+"""
+Keyset Pagination for Analytics API
+
+The list endpoints page with a cursor instead of skip/offset: results are
+sorted by (sort field, _id) descending, and the next page starts strictly
+after the last document returned. Every page is an index range scan on a
+compound (sort field, _id) index, so page 1000 costs the same as page 1.
+
+The cursor is opaque to clients: the sort value and _id of the last
+document, as extended JSON, base64url-encoded. Clients pass back the
+`next_cursor` of a response to get the following page; it is null on the
+last page.
+
+Documents without a value for the sort field sort last.
+"""
+
+import base64
+import binascii
+import os
+from datetime import datetime
+
+from bson import ObjectId, json_util
+from bson.errors import BSONError
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "500"))
+
+# Types a cursor may carry - anything else (e.g. a {"$ne": ...} document) would
+# be an operator inside the keyset filter
+SORT_VALUE_TYPES = (str, int, float, datetime, type(None))
+DOCUMENT_ID_TYPES = (str, ObjectId)
+
+
+def parse_page_args(args, default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Read the limit and cursor query parameters
+
+    Limits above MAX_PAGE_SIZE are capped.
+
+    Returns:
+        tuple: (limit, cursor) - cursor is None for the first page
+
+    Raises:
+        ValueError: If the limit or cursor is invalid
+    """
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+
+    cursor = args.get('cursor')
+    return min(limit, MAX_PAGE_SIZE), decode_cursor(cursor) if cursor else None
+
+
+def encode_cursor(sort_value, document_id):
+    """Build the opaque cursor for the position after a document"""
+    payload = json_util.dumps([sort_value, document_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Read a cursor built by encode_cursor
+
+    Returns:
+        tuple: (sort_value, document_id)
+
+    Raises:
+        ValueError: If the cursor is malformed or holds values a cursor can't contain
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        decoded = json_util.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, BSONError):
+        # BSONError: e.g. InvalidId for a malformed {"$oid": ...}
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(decoded, list) or len(decoded) != 2:
+        raise ValueError("Invalid cursor")
+
+    sort_value, document_id = decoded
+    if not isinstance(sort_value, SORT_VALUE_TYPES) or not isinstance(document_id, DOCUMENT_ID_TYPES):
+        raise ValueError("Invalid cursor")
+
+    return sort_value, document_id
+
+
+def build_keyset_filter(sort_field, cursor):
+    """
+    Build the condition for documents after the cursor in descending order
+
+    Args:
+        sort_field (str): Field the page is sorted by
+        cursor (tuple): (sort_value, document_id) of the last document seen
+    """
+    sort_value, document_id = cursor
+
+    if sort_value is None:
+        # Already in the trailing documents without a sort value
+        return {sort_field: None, "_id": {"$lt": document_id}}
+
+    return {
+        "$or": [
+            {sort_field: {"$lt": sort_value}},
+            {sort_field: sort_value, "_id": {"$lt": document_id}},
+            {sort_field: None}
+        ]
+    }
+
+
+def paginate(collection, query_filter, sort_field, limit, cursor=None, projection=None):
+    """
+    Fetch one page of a collection in (sort_field, _id) descending order
+
+    Args:
+        collection: Collection to read
+        query_filter (dict): Filter applied before paging
+        sort_field (str): Field to sort by (needs a (sort_field, _id) index)
+        limit (int): Page size
+        cursor (tuple): Decoded cursor from parse_page_args, None for the first page
+        projection (dict): Optional projection
+
+    Returns:
+        tuple: (documents, next_cursor) - next_cursor is None on the last page
+    """
+    if cursor is not None:
+        keyset_filter = build_keyset_filter(sort_field, cursor)
+        query_filter = {"$and": [query_filter, keyset_filter]} if query_filter else keyset_filter
+
+    # One extra document tells us whether there is a next page
+    documents = list(collection.find(query_filter, projection)
+                     .sort([(sort_field, -1), ("_id", -1)])
+                     .limit(limit + 1))
+
+    if len(documents) <= limit:
+        return documents, None
+
+    documents = documents[:limit]
+    last_document = documents[-1]
+    return documents, encode_cursor(last_document.get(sort_field), last_document['_id'])
@@ -0,0 +1,160 @@
+"""
+Response Cache for Analytics API
+
+In-process cache for the dashboard stats endpoints. The admin portal polls
+the same stats from every open tab, so identical requests are answered from
+memory instead of hitting MongoDB again.
+
+Entries are keyed by package, endpoint and query params, expire after a TTL
+and are evicted least-recently-used when the cache is full. Every ingest
+write bumps the package's generation counter; an entry computed under an
+older generation is treated as a miss, so new data shows up immediately.
+The cache and its generations live in each process; with several workers,
+a write handled by another worker becomes visible once the TTL expires.
+
+Send the header "X-Cache-Bypass: true" to skip the cache for a request.
+
+Configure with STATS_CACHE_ENABLED, STATS_CACHE_TTL_SECONDS and
+STATS_CACHE_MAX_ENTRIES.
+"""
+
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, make_response, request
+
+BYPASS_HEADER = "X-Cache-Bypass"
+STATUS_HEADER = "X-Cache"
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of stats responses with TTL and per-package generations"""
+
+    def __init__(self, max_entries=1000, ttl_seconds=30, enabled=True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+
+        self._entries = OrderedDict()  # key -> (generation, expires_at, body, mimetype)
+        # package_name -> generation; only written by invalidate_package, so
+        # requests for unknown package names never add entries
+        self._generations = {}
+        self._lock = threading.Lock()
+
+        self._metrics = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "expired": 0,
+            "bypassed": 0,
+            "evictions": 0
+        }
+
+    def invalidate_package(self, package_name):
+        """Mark every cached response for a package as stale (called after ingest writes)"""
+        with self._lock:
+            self._generations[package_name] = self._generations.get(package_name, 0) + 1
+
+    def cached(self, endpoint):
+        """
+        Decorator caching a stats view that takes package_name
+
+        Args:
+            endpoint (str): Name used in the cache key, e.g. "event_stats"
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(package_name, *args, **kwargs):
+                if not self.enabled:
+                    return view(package_name, *args, **kwargs)
+
+                key = (package_name, endpoint, tuple(sorted(request.args.items(multi=True))))
+                bypass = request.headers.get(BYPASS_HEADER, "").lower() in ("1", "true", "yes")
+
+                # Read the generation before computing, so a write that lands
+                # while the view runs leaves the new entry already stale
+                with self._lock:
+                    generation = self._generations.get(package_name, 0)
+
+                if bypass:
+                    with self._lock:
+                        self._metrics["bypassed"] += 1
+                else:
+                    cached_entry = self._get(key, generation)
+                    if cached_entry is not None:
+                        body, mimetype = cached_entry
+                        response = current_app.response_class(body, status=200, mimetype=mimetype)
+                        response.headers[STATUS_HEADER] = "HIT"
+                        return response
+
+                response = make_response(view(package_name, *args, **kwargs))
+
+                # Only successful responses are cached (views mark partial results no-store)
+                if response.status_code == 200 and not response.cache_control.no_store:
+                    self._set(key, generation, response.get_data(), response.mimetype)
+
+                response.headers[STATUS_HEADER] = "BYPASS" if bypass else "MISS"
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def _get(self, key, generation):
+        """Get (body, mimetype) for a fresh entry, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self._metrics["misses"] += 1
+                return None
+
+            entry_generation, expires_at, body, mimetype = entry
+
+            if entry_generation != generation or expires_at <= time.time():
+                del self._entries[key]
+                self._metrics["stale" if entry_generation != generation else "expired"] += 1
+                self._metrics["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._metrics["hits"] += 1
+            return body, mimetype
+
+    def _set(self, key, generation, body, mimetype):
+        """Store a response, evicting the least recently used entries if full"""
+        with self._lock:
+            self._entries[key] = (generation, time.time() + self.ttl_seconds, body, mimetype)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics["evictions"] += 1
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self):
+        """Get hit ratio and eviction counters for monitoring"""
+        with self._lock:
+            lookups = self._metrics["hits"] + self._metrics["misses"]
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_ratio": round(self._metrics["hits"] / lookups, 3) if lookups > 0 else 0,
+                **self._metrics
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("STATS_CACHE_MAX_ENTRIES", "1000")),
+    ttl_seconds=float(os.getenv("STATS_CACHE_TTL_SECONDS", "30")),
+    enabled=os.getenv("STATS_CACHE_ENABLED", "true").lower() == "true"
+)
@@ -0,0 +1,241 @@
+"""
+Rollup Collections for Analytics API
+
+Small pre-aggregated counters kept per package in {package}_rollups and
+updated at ingest time with $inc upserts, so the dashboard stats read a
+handful of tiny documents instead of scanning raw data.
+
+Document layout (one document per counter, keyed by _id):
+    events:total                      total events
+    events:day:2024-05-01             events per day (also :hour:2024-05-01T13)
+    event_type:<type>                 events per event type
+    sessions:total / sessions:day:... sessions started
+    session_duration:<bucket label>   ended sessions per duration bucket (+ total_seconds)
+    crashes:total / crashes:day:...   crash occurrences
+    crash_signature:<signature>       occurrences per crash signature
+
+Usage (rebuild rollups from raw data, e.g. for existing packages):
+    python rollups.py rebuild [package_name]
+"""
+
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import get_package_collection, get_package_collection_async
+from validation_utils import to_utc_naive
+from time_series import get_time_series, get_zone
+
+# (upper bound in seconds, label) - same buckets as the session duration pie chart
+DURATION_BUCKETS = [
+    (60, "<1 min"),
+    (300, "1-5 mins"),
+    (900, "5-15 mins"),
+    (1800, "15-30 mins"),
+    (None, ">30 mins")
+]
+
+GRANULARITY_FORMATS = {
+    "hour": "%Y-%m-%dT%H",
+    "day": "%Y-%m-%d"
+}
+
+
+def get_duration_label(duration_seconds):
+    """Get the duration bucket label for a session length"""
+    for upper_bound, label in DURATION_BUCKETS:
+        if upper_bound is None or duration_seconds < upper_bound:
+            return label
+
+
+class RollupAccumulator:
+    """Collects counter increments so they can be written in one bulk write"""
+
+    def __init__(self):
+        self._increments = defaultdict(lambda: defaultdict(int))
+        self._fields = {}
+
+    def add(self, rollup_id, fields, **increments):
+        """Add increments to the counter document rollup_id"""
+        self._fields[rollup_id] = fields
+        for field, amount in increments.items():
+            self._increments[rollup_id][field] += amount
+
+    def add_time_series(self, metric, timestamp, count=1):
+        """Count something in the total, hourly and daily counters of a metric"""
+        timestamp = to_utc_naive(timestamp)
+
+        self.add(f"{metric}:total", {"metric": metric, "granularity": "total"}, count=count)
+
+        for granularity, period_format in GRANULARITY_FORMATS.items():
+            period = timestamp.strftime(period_format)
+            period_start = datetime.strptime(period, period_format)
+            self.add(
+                f"{metric}:{granularity}:{period}",
+                {"metric": metric, "granularity": granularity, "period": period, "period_start": period_start},
+                count=count
+            )
+
+    def add_keyed(self, metric, key, **increments):
+        """Count something under a named key (event type, crash signature, ...)"""
+        self.add(f"{metric}:{key}", {"metric": metric, "key": key}, **increments)
+
+    def add_event(self, event_type, timestamp):
+        self.add_time_series("events", timestamp)
+        self.add_keyed("event_type", event_type, count=1)
+
+    def add_session_start(self, timestamp):
+        self.add_time_series("sessions", timestamp)
+
+    def add_session_end(self, duration_seconds, previous_duration_seconds=None):
+        """Count an ended session (moving it out of its old bucket if it was ended before)"""
+        if previous_duration_seconds is not None:
+            self.add_keyed("session_duration", get_duration_label(previous_duration_seconds),
+                           count=-1, total_seconds=-previous_duration_seconds)
+
+        self.add_keyed("session_duration", get_duration_label(duration_seconds),
+                       count=1, total_seconds=duration_seconds)
+
+    def add_crash(self, crash_signature, timestamp):
+        self.add_time_series("crashes", timestamp)
+        self.add_keyed("crash_signature", crash_signature, count=1)
+
+    def operations(self):
+        """Build one $inc upsert per counter document"""
+        return [
+            UpdateOne(
+                {"_id": rollup_id},
+                {"$inc": dict(increments), "$setOnInsert": self._fields[rollup_id]},
+                upsert=True
+            )
+            for rollup_id, increments in self._increments.items()
+        ]
+
+
+def write_rollups(db, package_name, accumulator):
+    """
+    Apply the accumulated increments for a package
+
+    Failures are logged but never fail the ingest request; raw data stays the
+    source of truth and `python rollups.py rebuild` repairs any drift.
+    """
+    operations = accumulator.operations()
+    if not operations:
+        return
+
+    try:
+        get_package_collection(db, package_name, "rollups").bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"⚠️ Failed to update rollups for {package_name}: {str(e)}")
+
+
+async def write_rollups_async(db, package_name, accumulator):
+    """Same as write_rollups, for an async (Motor) database"""
+    operations = accumulator.operations()
+    if not operations:
+        return
+
+    try:
+        collection = await get_package_collection_async(db, package_name, "rollups")
+        await collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"⚠️ Failed to update rollups for {package_name}: {str(e)}")
+
+
+# ===== READ HELPERS =====
+
+def get_rollup_total(rollups_collection, metric):
+    """Get the all-time count of a metric"""
+    document = rollups_collection.find_one({"_id": f"{metric}:total"}, {"count": 1})
+    return document['count'] if document else 0
+
+
+def get_rollup_totals(rollups_collection, metrics):
+    """Get the all-time counts of several metrics in one read"""
+    documents = rollups_collection.find({"_id": {"$in": [f"{metric}:total" for metric in metrics]}}, {"count": 1})
+    counts = {document['_id']: document.get('count', 0) for document in documents}
+    return {metric: counts.get(f"{metric}:total", 0) for metric in metrics}
+
+
+def get_rollup_time_series(rollups_collection, metric, start, end, granularity="day", timezone_name=None):
+    """
+    Get a gap-filled series of a metric from its rollup counters
+
+    Daily counters are used for UTC day/week charts; otherwise the hourly
+    counters are summed into periods of the requested timezone.
+
+    Returns:
+        list: Same format as time_series.get_time_series
+    """
+    use_daily = granularity != "hour" and get_zone(timezone_name).key == "UTC"
+
+    return get_time_series(
+        rollups_collection, "period_start", start, end, granularity, timezone_name,
+        value_field="count",
+        match={"metric": metric, "granularity": "day" if use_daily else "hour"}
+    )
+
+
+def get_rollup_keys(rollups_collection, metric, limit=0):
+    """Get keyed counters of a metric, largest first"""
+    return list(rollups_collection.find(
+        {"metric": metric, "count": {"$gt": 0}},
+        {"key": 1, "count": 1, "total_seconds": 1}
+    ).sort("count", -1).limit(limit))
+
+
+# ===== REBUILD =====
+
+def rebuild_package_rollups(db, package_name):
+    """Recompute a package's rollups from its raw collections"""
+    accumulator = RollupAccumulator()
+
+    for event in db[f"{package_name}_events"].find({}, {"event_type": 1, "timestamp": 1}):
+        if event.get('timestamp'):
+            accumulator.add_event(event.get('event_type'), event['timestamp'])
+
+    sessions = db[f"{package_name}_sessions"].find({}, {"start_time": 1, "duration_seconds": 1})
+    for session in sessions:
+        if session.get('start_time'):
+            accumulator.add_session_start(session['start_time'])
+        if session.get('duration_seconds') is not None:
+            accumulator.add_session_end(session['duration_seconds'])
+
+    occurrences = db[f"{package_name}_crash_occurrences"].find({}, {"crash_signature": 1, "occurrences.timestamp": 1})
+    for bucket in occurrences:
+        for occurrence in bucket.get('occurrences', []):
+            accumulator.add_crash(bucket['crash_signature'], occurrence['timestamp'])
+
+    rollups_collection = get_package_collection(db, package_name, "rollups")
+    rollups_collection.delete_many({})
+
+    operations = accumulator.operations()
+    for i in range(0, len(operations), 1000):
+        rollups_collection.bulk_write(operations[i:i + 1000], ordered=False)
+
+    print(f"✅ Rebuilt {len(operations)} rollup counters for {package_name}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) in (2, 3) and sys.argv[1] == 'rebuild':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        database = AnalyticsConnectionHolder.get_db()
+        if database is None:
+            sys.exit(1)
+
+        if len(sys.argv) == 3:
+            package_names = [sys.argv[2]]
+        else:
+            package_names = sorted(name[:-len('_events')] for name in database.list_collection_names()
+                                   if name.endswith('_events'))
+
+        for name in package_names:
+            rebuild_package_rollups(database, name)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -9,6 +9,9 @@ def register_routes(app):
     from controllers.sessions import sessions_blueprint
     from controllers.crashes import crashes_blueprint
     from controllers.packages import packages_blueprint
+    from controllers.batch import batch_blueprint
+    from controllers.export import export_blueprint
+    from controllers.dashboard import dashboard_blueprint
 
     # Register blueprints with URL prefixes
     app.register_blueprint(events_blueprint, url_prefix='/analytics')
@@ -16,6 +19,9 @@ def register_routes(app):
     app.register_blueprint(sessions_blueprint, url_prefix='/analytics')
     app.register_blueprint(crashes_blueprint, url_prefix='/analytics')
     app.register_blueprint(packages_blueprint, url_prefix='/analytics')
+    app.register_blueprint(batch_blueprint, url_prefix='/analytics')
+    app.register_blueprint(export_blueprint, url_prefix='/analytics')
+    app.register_blueprint(dashboard_blueprint, url_prefix='/analytics')
 
     print("✅ All API routes registered!")
 
@@ -31,6 +37,9 @@ def register_routes(app):
                 "sessions": "/analytics/sessions",
                 "crashes": "/analytics/crashes",
                 "packages": "/analytics/packages",
+                "batch": "/analytics/batch",
+                "export": "/analytics/export",
+                "dashboard": "/analytics/dashboard",
                 "health": "/health"
             }
         }, 200
\ No newline at end of file
@@ -3,10 +3,28 @@ Session Cleanup Service for Analytics API
 
 Automatically closes sessions that have been open too long.
 This handles cases where the app was killed and couldn't send a session end event.
+
+Cleanup runs on a background scheduler, never on the request path. Each
+package's stale sessions are closed with a single update_many (the duration
+is computed server-side), and packages are processed concurrently.
+
+By default the scheduler runs inside the API process, started on the first
+request. To run it as its own process instead, set
+SESSION_CLEANUP_IN_PROCESS=false for the API and run:
+    python session_cleanup.py
 """
 
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+
 from mongodb_connection_manager import AnalyticsConnectionHolder
+from index_manager import index_manager
+from rollups import RollupAccumulator, write_rollups, DURATION_BUCKETS
+from response_cache import response_cache
 
 
 class SessionCleanupService:
@@ -14,21 +32,71 @@ class SessionCleanupService:
 
     def __init__(self):
         self.session_timeout_hours = 2  # Close sessions after 2 hours of inactivity
+        self.in_process = os.getenv("SESSION_CLEANUP_IN_PROCESS", "true").lower() == "true"
+        self.interval_seconds = float(os.getenv("SESSION_CLEANUP_INTERVAL_SECONDS", "300"))
+        self.worker_count = int(os.getenv("SESSION_CLEANUP_WORKERS", "4"))
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+        self._metrics = {
+            "runs": 0,
+            "failed_runs": 0,
+            "sessions_closed": 0,
+            "last_run_at": None,
+            "last_run_ms": 0.0,
+            "max_run_ms": 0.0,
+            "total_run_ms": 0.0,
+            "last_run_closed": 0,
+            "last_run_packages": 0
+        }
+        self._last_closed_by_package = {}
+
         print(f"🧹 Session cleanup service initialized (timeout: {self.session_timeout_hours} hours)")
 
+    def ensure_started(self):
+        """Start the scheduler thread on first use (so it is created after any fork)"""
+        if self._thread is not None or not self.in_process:
+            return
+
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="session-cleanup", daemon=True)
+            self._thread.start()
+
+        print(f"🧹 Session cleanup scheduler started (every {self.interval_seconds:.0f}s)")
+
+    def stop(self):
+        """Stop the scheduler after the current run"""
+        self._stop_event.set()
+
+    def run_forever(self):
+        """Scheduler loop: run a cleanup, then wait for the next interval"""
+        while not self._stop_event.is_set():
+            self.cleanup_stale_sessions()
+            self._stop_event.wait(self.interval_seconds)
+
     def cleanup_stale_sessions(self, package_name=None):
         """
         Find and close sessions that have been open too long
 
         Args:
             package_name: Specific package to clean up, or None for all packages
+
+        Returns:
+            int: Number of sessions closed
         """
+        started = time.perf_counter()
 
         try:
             db = AnalyticsConnectionHolder.get_db()
             if db is None:
                 print("❌ Cannot connect to database for session cleanup")
-                return
+                return 0
 
             cutoff_time = datetime.now() - timedelta(hours=self.session_timeout_hours)
 
@@ -40,65 +108,147 @@ class SessionCleanupService:
             if package_name:
                 session_collections = [f"{package_name}_sessions"]
 
-            total_closed = 0
+            # Packages are independent - close them out concurrently
+            with ThreadPoolExecutor(max_workers=self.worker_count, thread_name_prefix="session-cleanup") as pool:
+                closed_counts = list(pool.map(
+                    lambda collection_name: self._cleanup_sessions_for_collection(db, collection_name, cutoff_time),
+                    session_collections
+                ))
 
-            for collection_name in session_collections:
-                closed_count = self._cleanup_sessions_for_collection(db, collection_name, cutoff_time)
-                total_closed += closed_count
+            total_closed = sum(closed_counts)
+            self._record_run(started, dict(zip(session_collections, closed_counts)))
 
             if total_closed > 0:
-                print(f"✅ Session cleanup completed: {total_closed} stale sessions closed")
-            else:
-                print("✅ Session cleanup completed: no stale sessions found")
+                print(f"✅ Session cleanup completed: {total_closed} stale sessions closed "
+                      f"across {len(session_collections)} packages")
 
             return total_closed
 
         except Exception as e:
             print(f"❌ Error during session cleanup: {str(e)}")
+            with self._lock:
+                self._metrics["failed_runs"] += 1
             return 0
 
     def _cleanup_sessions_for_collection(self, db, collection_name, cutoff_time):
-        """Clean up sessions for a specific package collection"""
+        """Close all stale sessions of one package collection with a single update_many"""
 
         try:
+            index_manager.ensure_indexes(db, collection_name)
             sessions_collection = db[collection_name]
 
-            # Find sessions that are still open (no end_time) and started more than 2 hours ago
-            stale_sessions = sessions_collection.find({
-                "end_time": None,
-                "start_time": {"$lt": cutoff_time}
-            })
-
-            closed_count = 0
-
-            for session in stale_sessions:
-                # Calculate duration from start to cutoff time
-                start_time = session['start_time']
-                duration_seconds = int((cutoff_time - start_time).total_seconds())
+            # Tag the sessions closed by this run so their durations can be counted afterwards
+            run_id = str(uuid.uuid4())
 
-                # Close the session
-                sessions_collection.update_one(
-                    {"_id": session['_id']},
+            # Sessions that are still open (no end_time) and started before the cutoff;
+            # the duration from start to cutoff is computed server-side
+            result = sessions_collection.update_many(
+                {
+                    "end_time": None,
+                    "start_time": {"$lt": cutoff_time}
+                },
+                [
                     {
                         "$set": {
                             "end_time": cutoff_time,
-                            "duration_seconds": duration_seconds,
+                            "duration_seconds": {
+                                "$toInt": {"$divide": [{"$subtract": [cutoff_time, "$start_time"]}, 1000]}
+                            },
                             "updated_at": datetime.now(),
                             "closed_by": "auto_cleanup",
+                            "cleanup_run_id": run_id,
                             "reason": f"Session timeout after {self.session_timeout_hours} hours"
                         }
                     }
-                )
+                ]
+            )
 
-                closed_count += 1
-                print(f"🧹 Auto-closed stale session: {session['session_id']} (duration: {duration_seconds}s)")
+            closed_count = result.modified_count
+            if closed_count == 0:
+                return 0
 
+            package_name = collection_name[:-len('_sessions')]
+            write_rollups(db, package_name, self._count_closed_durations(sessions_collection, cutoff_time, run_id))
+            response_cache.invalidate_package(package_name)
+
+            print(f"🧹 Auto-closed {closed_count} stale sessions in {collection_name}")
             return closed_count
 
         except Exception as e:
             print(f"❌ Error cleaning up sessions for {collection_name}: {str(e)}")
             return 0
 
+    def _count_closed_durations(self, sessions_collection, cutoff_time, run_id):
+        """Group the sessions closed by a run into the rollup duration buckets"""
+        bucket_label = {
+            "$switch": {
+                "branches": [
+                    {"case": {"$lt": ["$duration_seconds", upper_bound]}, "then": label}
+                    for upper_bound, label in DURATION_BUCKETS if upper_bound is not None
+                ],
+                "default": DURATION_BUCKETS[-1][1]
+            }
+        }
+
+        pipeline = [
+            {"$match": {"end_time": cutoff_time, "cleanup_run_id": run_id}},
+            {
+                "$group": {
+                    "_id": bucket_label,
+                    "count": {"$sum": 1},
+                    "total_seconds": {"$sum": "$duration_seconds"}
+                }
+            }
+        ]
+
+        rollups = RollupAccumulator()
+        for bucket in sessions_collection.aggregate(pipeline):
+            rollups.add_keyed("session_duration", bucket['_id'],
+                              count=bucket['count'], total_seconds=bucket['total_seconds'])
+
+        return rollups
+
+    def _record_run(self, started, closed_by_collection):
+        """Update the run-duration metrics"""
+        run_ms = (time.perf_counter() - started) * 1000
+        total_closed = sum(closed_by_collection.values())
+
+        with self._lock:
+            self._metrics["runs"] += 1
+            self._metrics["sessions_closed"] += total_closed
+            self._metrics["last_run_at"] = datetime.now().isoformat()
+            self._metrics["last_run_ms"] = run_ms
+            self._metrics["max_run_ms"] = max(self._metrics["max_run_ms"], run_ms)
+            self._metrics["total_run_ms"] += run_ms
+            self._metrics["last_run_closed"] = total_closed
+            self._metrics["last_run_packages"] = len(closed_by_collection)
+
+            for collection_name, closed_count in closed_by_collection.items():
+                self._last_closed_by_package[collection_name[:-len('_sessions')]] = closed_count
+
+    def get_metrics(self):
+        """Get run counts and run-duration metrics"""
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        runs = metrics["runs"]
+        total_run_ms = metrics.pop("total_run_ms")
+
+        return {
+            "scheduler_running": self._thread is not None and self._thread.is_alive(),
+            "interval_seconds": self.interval_seconds,
+            "timeout_hours": self.session_timeout_hours,
+            "avg_run_ms": round(total_run_ms / runs, 2) if runs > 0 else 0,
+            **metrics,
+            "last_run_ms": round(metrics["last_run_ms"], 2),
+            "max_run_ms": round(metrics["max_run_ms"], 2)
+        }
+
+    def get_last_closed_count(self, package_name):
+        """Stale sessions closed for a package by the most recent run in this process"""
+        with self._lock:
+            return self._last_closed_by_package.get(package_name, 0)
+
     def get_session_timeout_hours(self):
         """Get the current session timeout setting"""
         return self.session_timeout_hours
@@ -109,4 +259,19 @@ class SessionCleanupService:
         print(f"🔧 Session timeout updated to {hours} hours")
 
 
-session_cleanup_service = SessionCleanupService()
\ No newline at end of file
+session_cleanup_service = SessionCleanupService()
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    # Re-create the service so settings from .env apply
+    scheduler = SessionCleanupService()
+    print(f"🧹 Running session cleanup every {scheduler.interval_seconds:.0f}s (Ctrl+C to stop)")
+
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("🛑 Session cleanup stopped")
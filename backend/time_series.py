@@ -0,0 +1,181 @@
+"""
+Time Series Helpers for Analytics API
+
+Shared by every dashboard chart. A series is built from ONE aggregation:
+the $match is bounded by the time range (so it runs on the time-field
+index), $dateTrunc groups documents into hour/day/week periods in the
+requested timezone, and periods without data are filled with zeros here.
+
+Stored datetimes are treated as UTC, the way MongoDB stores them.
+Weeks start on Monday.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from validation_utils import to_utc_naive
+
+GRANULARITIES = ("hour", "day", "week")
+
+DEFAULT_TIMEZONE = os.getenv("ANALYTICS_TIMEZONE", "UTC")
+DEFAULT_PERIODS = 30
+MAX_PERIODS = 1000
+
+LABEL_FORMATS = {
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+    "week": "%Y-%m-%d"  # Monday of the week
+}
+
+
+def get_zone(timezone_name=None):
+    """
+    Get a timezone by IANA name (e.g. "Europe/Berlin")
+
+    Raises:
+        ValueError: If the timezone is unknown
+    """
+    try:
+        return ZoneInfo(timezone_name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {timezone_name}")
+
+
+def truncate(moment, granularity):
+    """Start of the period (in moment's timezone) that moment falls into"""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    day_start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day_start
+
+    return day_start - timedelta(days=day_start.weekday())
+
+
+def shift_period(period_start, granularity, steps=1):
+    """Move a period start by a number of periods"""
+    zone = period_start.tzinfo
+
+    if granularity == "hour":
+        # In UTC, so DST changes don't produce missing or repeated hours
+        return (period_start.astimezone(timezone.utc) + timedelta(hours=steps)).astimezone(zone)
+
+    days = steps if granularity == "day" else steps * 7
+    # Wall-clock arithmetic, so a day is always midnight to midnight local time
+    return (period_start.replace(tzinfo=None) + timedelta(days=days)).replace(tzinfo=zone)
+
+
+def get_recent_range(periods=DEFAULT_PERIODS, granularity="day", timezone_name=None):
+    """
+    Get the range covering the last `periods` periods, including the current one
+
+    Returns:
+        tuple: (start, end) timezone-aware datetimes, end exclusive
+    """
+    current = truncate(datetime.now(get_zone(timezone_name)), granularity)
+    return shift_period(current, granularity, -(periods - 1)), shift_period(current, granularity, 1)
+
+
+def parse_series_args(args):
+    """
+    Read the chart range options from query params
+
+    Supported params: periods (default 30), granularity (hour/day/week,
+    default day) and timezone (IANA name, default ANALYTICS_TIMEZONE).
+
+    Returns:
+        tuple: (start, end, granularity, timezone_name)
+
+    Raises:
+        ValueError: If a param is invalid
+    """
+    granularity = args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError("Invalid granularity. Must be 'hour', 'day' or 'week'")
+
+    try:
+        periods = int(args.get('periods', DEFAULT_PERIODS))
+    except ValueError:
+        raise ValueError("periods must be an integer")
+
+    if not 1 <= periods <= MAX_PERIODS:
+        raise ValueError(f"periods must be between 1 and {MAX_PERIODS}")
+
+    timezone_name = args.get('timezone') or DEFAULT_TIMEZONE
+    start, end = get_recent_range(periods, granularity, timezone_name)
+
+    return start, end, granularity, timezone_name
+
+
+def get_time_series(collection, time_field, start, end, granularity="day", timezone_name=None,
+                    value_field=None, match=None):
+    """
+    Count documents per period over a time range, with empty periods filled in
+
+    Args:
+        collection: Collection to aggregate
+        time_field (str): Datetime field to bucket on (should be indexed)
+        start (datetime): Range start (timezone-aware; truncated to its period)
+        end (datetime): Range end, exclusive (timezone-aware)
+        granularity (str): "hour", "day" or "week"
+        timezone_name (str): IANA timezone the periods are aligned to
+        value_field (str): Sum this field instead of counting documents
+        match (dict): Extra filter conditions
+
+    Returns:
+        list: [{"period": "2024-05-01", "period_start": datetime, "count": int}, ...]
+              oldest first, one entry per period
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError("Invalid granularity. Must be 'hour', 'day' or 'week'")
+
+    zone = get_zone(timezone_name)
+    start = truncate(start.astimezone(zone), granularity)
+    end = end.astimezone(zone)
+
+    query = dict(match or {})
+    query[time_field] = {"$gte": to_utc_naive(start), "$lt": to_utc_naive(end)}
+
+    date_trunc = {"date": f"${time_field}", "unit": granularity, "timezone": zone.key}
+    if granularity == "week":
+        date_trunc["startOfWeek"] = "monday"
+
+    pipeline = [
+        {"$match": query},
+        {
+            "$group": {
+                "_id": {"$dateTrunc": date_trunc},
+                "count": {"$sum": f"${value_field}" if value_field else 1}
+            }
+        }
+    ]
+
+    counts = {item['_id']: item['count'] for item in collection.aggregate(pipeline)}
+
+    return fill_series(counts, start, end, granularity)
+
+
+def fill_series(counts, start, end, granularity):
+    """
+    Turn {period start (naive UTC): count} into a gap-free series
+
+    Args:
+        counts (dict): Counts keyed by period start as MongoDB returns it
+        start (datetime): First period start (timezone-aware)
+        end (datetime): Range end, exclusive
+        granularity (str): "hour", "day" or "week"
+    """
+    series = []
+    period_start = start
+
+    while period_start < end:
+        series.append({
+            "period": period_start.strftime(LABEL_FORMATS[granularity]),
+            "period_start": period_start,
+            "count": counts.get(to_utc_naive(period_start), 0)
+        })
+        period_start = shift_period(period_start, granularity)
+
+    return series
@@ -4,7 +4,7 @@ Prevents code duplication across controllers
 """
 
 from flask import jsonify
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 def validate_required_fields(data, required_fields):
@@ -20,7 +20,7 @@ def validate_required_fields(data, required_fields):
                is_valid is True if all fields present, False otherwise
                error_response is the JSON response to return if invalid
     """
-    missing_fields = [field for field in required_fields if field not in data]
+    missing_fields = get_missing_fields(data, required_fields)
 
     if missing_fields:
         error_response = jsonify({
@@ -31,39 +31,83 @@ def validate_required_fields(data, required_fields):
     return True, None
 
 
-def parse_timestamp(timestamp_data):
+def get_missing_fields(data, required_fields):
     """
-    Parse timestamp from various formats into datetime object
+    List the required fields that are absent from the request data
+
+    Args:
+        data (dict): The request JSON data
+        required_fields (list): List of required field names
+
+    Returns:
+        list: Names of the missing fields (empty if all are present)
+    """
+    return [field for field in required_fields if field not in data]
+
+
+def convert_timestamp(timestamp_data):
+    """
+    Convert a timestamp from various formats into a datetime object
 
     Args:
         timestamp_data: Can be int/float (milliseconds), string (ISO), or None
 
     Returns:
-        tuple: (datetime_object, error_response)
-               datetime_object is the parsed datetime
-               error_response is JSON response if parsing failed
+        datetime: The parsed datetime
+
+    Raises:
+        ValueError: If the timestamp cannot be parsed
     """
     if timestamp_data is None:
-        return datetime.now(), None
+        return datetime.now()
 
     try:
         # Handle millisecond timestamps (from mobile apps)
         if isinstance(timestamp_data, (int, float)):
-            return datetime.fromtimestamp(timestamp_data / 1000), None
+            return datetime.fromtimestamp(timestamp_data / 1000)
 
         # Handle ISO string timestamps
         elif isinstance(timestamp_data, str):
-            return datetime.fromisoformat(timestamp_data.replace('Z', '+00:00')), None
+            return datetime.fromisoformat(timestamp_data.replace('Z', '+00:00'))
+
+    except (ValueError, TypeError, OverflowError, OSError) as e:
+        # OverflowError/OSError: millisecond values outside the platform's date range
+        raise ValueError(f"Invalid timestamp format: {str(e)}")
+
+    raise ValueError("Invalid timestamp format")
+
+
+def parse_timestamp(timestamp_data):
+    """
+    Parse timestamp from various formats into datetime object
 
-        else:
-            error_response = jsonify({"error": "Invalid timestamp format"}), 400
-            return None, error_response
+    Args:
+        timestamp_data: Can be int/float (milliseconds), string (ISO), or None
+
+    Returns:
+        tuple: (datetime_object, error_response)
+               datetime_object is the parsed datetime
+               error_response is JSON response if parsing failed
+    """
+    try:
+        return convert_timestamp(timestamp_data), None
 
-    except (ValueError, TypeError) as e:
-        error_response = jsonify({"error": f"Invalid timestamp format: {str(e)}"}), 400
+    except ValueError as e:
+        error_response = jsonify({"error": str(e)}), 400
         return None, error_response
 
 
+def to_utc_naive(timestamp):
+    """
+    Convert a timezone-aware datetime to naive UTC (the way MongoDB stores it)
+
+    Naive datetimes are returned unchanged.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 def check_database_connection(db):
     """
     Check if database connection is available
@@ -83,24 +127,6 @@ def check_database_connection(db):
     return True, None
 
 
-def format_timestamps_in_document(document, timestamp_fields):
-    """
-    Convert datetime objects to ISO format strings in a document
-
-    Args:
-        document (dict): The document to format
-        timestamp_fields (list): List of field names that contain timestamps
-
-    Returns:
-        dict: The document with formatted timestamps
-    """
-    for field in timestamp_fields:
-        if field in document and document[field]:
-            document[field] = document[field].isoformat()
-
-    return document
-
-
 def create_success_response(message, data=None, status_code=200):
     """
     Create a standardized success response